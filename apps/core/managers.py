@@ -1,20 +1,28 @@
 """
-Thread-local tenant context and custom manager for automatic tenant scoping.
+Context-local tenant context and custom manager for automatic tenant scoping.
+
+The current tenant lives in a ContextVar, so it is isolated per thread (WSGI)
+and per task/coroutine (ASGI, async views) alike.
 """
-from threading import local
+from contextvars import ContextVar
 from django.db import models
 
-_thread_locals = local()
+_current_tenant = ContextVar('current_tenant', default=None)
 
 
 def set_current_tenant(tenant):
-    """Set the current tenant in thread-local storage."""
-    _thread_locals.tenant = tenant
+    """Set the current tenant for this context. Returns a token for reset_current_tenant()."""
+    return _current_tenant.set(tenant)
+
+
+def reset_current_tenant(token):
+    """Restore the tenant that was current before set_current_tenant() returned token."""
+    _current_tenant.reset(token)
 
 
 def get_current_tenant():
-    """Get the current tenant from thread-local storage."""
-    return getattr(_thread_locals, 'tenant', None)
+    """Get the current tenant for this context."""
+    return _current_tenant.get()
 
 
 class TenantManager(models.Manager):
@@ -1,52 +1,209 @@
 """
-TenantMiddleware — resolves tenant from subdomain or header and sets thread-local context.
+TenantMiddleware — resolves tenant from subdomain or header and sets the tenant context.
+Works under both WSGI and ASGI (sync and async middleware chains).
 """
-from apps.core.managers import set_current_tenant
+import threading
+import time
+from collections import OrderedDict
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
 
-class TenantMiddleware:
+from apps.core.managers import reset_current_tenant, set_current_tenant
+
+_MISSING = object()
+
+VERSION_KEY = 'pos:tenants:version'
+
+
+class TenantResolver:
     """
-    Resolves the current tenant from the request and sets it in thread-local storage.
-    Resolution order:
-      1. Subdomain (e.g. tienda1.nutripet.cl)
-      2. X-Tenant-ID header (for API/development)
-      3. Default tenant (first active tenant, for single-tenant setups)
+    Resolves (host, X-Tenant-ID) → Tenant with a per-process TTL cache.
+
+    Cached hits cost zero queries. The cache is an LRU bounded by
+    POS_TENANT_CACHE_MAX_ENTRIES, keyed by subdomain and the header parsed as
+    a tenant id (malformed headers share the "no header" entry). Saving or
+    deleting a Tenant bumps a version number in Django's cache (see
+    apps.tenants.apps), so every process drops its entries on the next
+    request; POS_TENANT_CACHE_TTL only bounds staleness if that cache is lost.
     """
 
-    def __init__(self, get_response):
-        self.get_response = get_response
+    def __init__(self, ttl=None, max_entries=None):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, version, tenant)
+        self.hits = 0
+        self.misses = 0
 
-    def __call__(self, request):
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'POS_TENANT_CACHE_TTL', 60)
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'POS_TENANT_CACHE_MAX_ENTRIES', 1024)
+
+    @staticmethod
+    def parse_tenant_id(value):
+        """X-Tenant-ID as a positive int, or None when missing or malformed."""
+        value = (value or '').strip()
+        if not (value.isascii() and value.isdigit()) or len(value) > 18:
+            return None
+        return int(value) or None
+
+    @classmethod
+    def cache_key(cls, host, tenant_header):
+        parts = host.split('.')
+        subdomain = parts[0] if len(parts) > 2 else None
+        return (subdomain, cls.parse_tenant_id(tenant_header))
+
+    def _cached(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic() and entry[1] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return _MISSING
+
+    def _store(self, key, version, tenant):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, tenant)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def resolve(self, host, tenant_header=None):
+        key = self.cache_key(host, tenant_header)
+        version = cache.get(VERSION_KEY, 0)
+        tenant = self._cached(key, version)
+        if tenant is _MISSING:
+            tenant = self._lookup(*key)
+            self._store(key, version, tenant)
+        return tenant
+
+    async def aresolve(self, host, tenant_header=None):
+        key = self.cache_key(host, tenant_header)
+        version = await cache.aget(VERSION_KEY, 0)
+        tenant = self._cached(key, version)
+        if tenant is _MISSING:
+            tenant = await self._alookup(*key)
+            self._store(key, version, tenant)
+        return tenant
+
+    @staticmethod
+    def _lookup(subdomain, tenant_header):
         from apps.tenants.models import Tenant
 
         tenant = None
 
         # 1. Try subdomain resolution
-        host = request.get_host().split(':')[0]  # Remove port
-        parts = host.split('.')
-        if len(parts) > 2:
-            subdomain = parts[0]
+        if subdomain:
             tenant = Tenant.objects.filter(
                 subdomain=subdomain, is_active=True
             ).first()
 
         # 2. Fallback: X-Tenant-ID header
-        if tenant is None:
-            tenant_id = request.headers.get('X-Tenant-ID')
-            if tenant_id:
-                tenant = Tenant.objects.filter(
-                    id=tenant_id, is_active=True
-                ).first()
+        if tenant is None and tenant_header:
+            tenant = Tenant.objects.filter(
+                id=tenant_header, is_active=True
+            ).first()
 
         # 3. Fallback: default tenant (first active)
         if tenant is None:
             tenant = Tenant.objects.filter(is_active=True).first()
 
+        return tenant
+
+    @staticmethod
+    async def _alookup(subdomain, tenant_header):
+        from apps.tenants.models import Tenant
+
+        tenant = None
+        if subdomain:
+            tenant = await Tenant.objects.filter(
+                subdomain=subdomain, is_active=True
+            ).afirst()
+        if tenant is None and tenant_header:
+            tenant = await Tenant.objects.filter(
+                id=tenant_header, is_active=True
+            ).afirst()
+        if tenant is None:
+            tenant = await Tenant.objects.filter(is_active=True).afirst()
+        return tenant
+
+    def invalidate(self):
+        """Drops the cached tenants here and, via the version key, in every other process."""
+        with self._lock:
+            self._entries.clear()
+        if not cache.add(VERSION_KEY, 1, timeout=None):
+            try:
+                cache.incr(VERSION_KEY)
+            except ValueError:
+                cache.set(VERSION_KEY, 1, timeout=None)
+
+    def stats(self):
+        with self._lock:
+            hits, misses, entries = self.hits, self.misses, len(self._entries)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 3) if total else 0,
+            'entries': entries,
+        }
+
+
+tenant_resolver = TenantResolver()
+
+
+class TenantMiddleware:
+    """
+    Resolves the current tenant from the request and sets it in the tenant context.
+    Resolution order:
+      1. Subdomain (e.g. tienda1.nutripet.cl)
+      2. X-Tenant-ID header (for API/development)
+      3. Default tenant (first active tenant, for single-tenant setups)
+    Results are cached per (subdomain, header) by TenantResolver.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        host = request.get_host().split(':')[0]  # Remove port
+        tenant = tenant_resolver.resolve(host, request.headers.get('X-Tenant-ID'))
+
         request.tenant = tenant
-        set_current_tenant(tenant)
+        token = set_current_tenant(tenant)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_current_tenant(token)
 
-        response = self.get_response(request)
+    async def __acall__(self, request):
+        host = request.get_host().split(':')[0]  # Remove port
+        tenant = await tenant_resolver.aresolve(host, request.headers.get('X-Tenant-ID'))
 
-        # Clean up thread-local
-        set_current_tenant(None)
-        return response
+        request.tenant = tenant
+        token = set_current_tenant(tenant)
+        try:
+            return await self.get_response(request)
+        finally:
+            reset_current_tenant(token)
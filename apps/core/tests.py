@@ -1,3 +1,56 @@
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from apps.tenants.models import Tenant
+
+from .middleware import TenantResolver
+
+
+class TenantResolverTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Tienda Test', rut_empresa='11111111-1', subdomain='test')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_header_is_normalised_before_caching(self):
+        resolver = TenantResolver()
+        self.assertEqual(resolver.cache_key('localhost', f' {self.tenant.id} '), (None, self.tenant.id))
+        for header in ('', 'abc', '-1', '0', '1e3', '٣', '9' * 40):
+            with self.subTest(header=header):
+                self.assertEqual(resolver.cache_key('localhost', header), (None, None))
+
+        self.assertEqual(resolver.resolve('localhost', str(self.tenant.id)), self.tenant)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.resolve('localhost', f'{self.tenant.id} '), self.tenant)
+
+    def test_entries_are_bounded(self):
+        resolver = TenantResolver(max_entries=2)
+        for host in ('a.pos.cl', 'b.pos.cl', 'c.pos.cl'):
+            resolver.resolve(host)
+        self.assertEqual(resolver.stats()['entries'], 2)
+        self.assertEqual(list(resolver._entries), [('b', None), ('c', None)])
+
+    def test_invalidation_reaches_other_resolvers(self):
+        """Otro proceso (otra instancia) deja de usar su entrada tras invalidate()."""
+        resolver, other = TenantResolver(), TenantResolver()
+        header = str(self.tenant.id)
+        self.assertEqual(other.resolve('localhost', header), self.tenant)
+
+        Tenant.objects.filter(pk=self.tenant.pk).update(name='Renombrada')
+        resolver.invalidate()
+        self.assertEqual(other.resolve('localhost', header).name, 'Renombrada')
+        self.assertEqual(other.stats()['misses'], 2)
+
+    def test_tenant_save_invalidates_on_commit(self):
+        resolver = TenantResolver()
+        header = str(self.tenant.id)
+        resolver.resolve('localhost', header)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tenant.objects.get(pk=self.tenant.pk).save()
+            resolver.resolve('localhost', header)
+            self.assertEqual(resolver.stats()['misses'], 1)
+        resolver.resolve('localhost', header)
+        self.assertEqual(resolver.stats()['misses'], 2)
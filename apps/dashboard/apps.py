@@ -5,3 +5,10 @@ class DashboardConfig(AppConfig):
     name = 'apps.dashboard'
     label = 'dashboard'
     verbose_name = 'Dashboard & Reportes'
+
+    def ready(self):
+        from apps.inventory.models import Product
+        from apps.inventory.signals import products_bulk_changed
+        from .cache import invalidate_tenant
+
+        products_bulk_changed.connect(invalidate_tenant, sender=Product, dispatch_uid='dashboard_cache_bulk')
@@ -0,0 +1,90 @@
+"""
+Cache de bloques del dashboard (KPIs, alertas, gráficos).
+
+Cada bloque se guarda en el cache de Django bajo una clave
+(tenant, versión, sucursal, bloque, ventana) con TTL corto
+(POS_DASHBOARD_CACHE_TTL). Checkout, anulaciones, ediciones de productos
+(save_with_movement) y traspasos entre sucursales llaman a
+invalidate_dashboard() al confirmar la transacción, lo que sube la versión
+del tenant y deja obsoletas todas sus claves de una vez; las importaciones y
+los cambios masivos de precio lo hacen vía la señal products_bulk_changed.
+
+Si varios supervisores refrescan a la vez, sólo uno calcula el bloque para
+el cache: los demás no esperan, reciben la última copia calculada del bloque
+(aunque sea de una versión anterior) o, si no hay, lo calculan ellos mismos
+(ver get_or_compute).
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'dashboard:version:{tenant_id}'
+LOCK_TIMEOUT = 10  # seconds a computing request holds the block lock
+STALE_TTL = 60 * 60  # last computed copy, served while another request recomputes
+
+_MISSING = object()
+
+
+def invalidate_dashboard(tenant_id):
+    """Descarta todos los bloques cacheados del tenant."""
+    key = VERSION_KEY.format(tenant_id=tenant_id)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def invalidate_tenant(sender, tenant_id, **kwargs):
+    """Receiver de products_bulk_changed (cambios masivos sin post_save)."""
+    invalidate_dashboard(tenant_id)
+
+
+class DashboardCache:
+    """Bloques cacheados de un tenant (y sucursal)."""
+
+    def __init__(self, tenant, branch=None, ttl=None):
+        self.tenant = tenant
+        self.branch = branch
+        self.ttl = ttl if ttl is not None else getattr(settings, 'POS_DASHBOARD_CACHE_TTL', 60)
+        self._version = None
+
+    @property
+    def version(self):
+        if self._version is None:
+            self._version = cache.get(VERSION_KEY.format(tenant_id=self.tenant.id), 0)
+        return self._version
+
+    def key(self, block, window=''):
+        branch = self.branch.id if self.branch else 'all'
+        return f'dashboard:{self.tenant.id}:{self.version}:{branch}:{block}:{window}'
+
+    def stale_key(self, block, window=''):
+        """Clave sin versión: la última copia calculada sobrevive a invalidate_dashboard."""
+        branch = self.branch.id if self.branch else 'all'
+        return f'dashboard:{self.tenant.id}:stale:{branch}:{block}:{window}'
+
+    def get_or_compute(self, block, window, compute):
+        """
+        Returns: (valor, hit) — hit=True si vino del cache (también la copia
+        anterior que se sirve mientras otro request recalcula el bloque).
+        """
+        key = self.key(block, window)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value, True
+
+        lock_key = f'{key}:lock'
+        if not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+            # Someone else is computing this block: don't wait for it
+            value = cache.get(self.stale_key(block, window), _MISSING)
+            if value is not _MISSING:
+                return value, True
+            return compute(), False
+
+        try:
+            value = compute()
+            cache.set(key, value, self.ttl)
+            cache.set(self.stale_key(block, window), value, STALE_TTL)
+        finally:
+            cache.delete(lock_key)
+        return value, False
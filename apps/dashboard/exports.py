@@ -0,0 +1,307 @@
+"""
+Exportación de ventas e inventario en CSV o XLSX, en streaming.
+
+Cada conjunto (ventas, líneas, pagos, productos, lotes) es un values_list
+recorrido con .iterator(): en PostgreSQL usa un cursor del lado del servidor,
+así que ni la base ni Django materializan el resultado completo. Las filas se
+formatean y se entregan en bloques a medida que llegan, por lo que la memoria
+del proceso no depende de la cantidad de filas (ver bench_export).
+
+El XLSX se arma sin dependencias: un .xlsx es un zip con XML, y zipfile sabe
+escribir en un stream no posicionable; la hoja se escribe fila a fila con
+celdas de texto en línea (sin tabla de strings compartidos, que obligaría a
+mantener todos los textos en memoria).
+
+    rows = export_rows(tenant, 'orders', start=date(2026, 1, 1), end=date(2026, 2, 1))
+    for chunk in render_csv(rows): ...
+"""
+import csv
+import zipfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from apps.inventory.models import Batch, Product
+from apps.sales.models import Order, OrderItem, Payment
+
+CHUNK_ROWS = 1000
+ITERATOR_CHUNK = 2000
+
+
+class ExportDataset:
+    """Columnas (encabezado, campo) y queryset base de un conjunto exportable."""
+
+    def __init__(self, name, label, columns, queryset, date_field=None):
+        self.name = name
+        self.label = label
+        self.columns = columns
+        self._queryset = queryset
+        self.date_field = date_field  # filtro por rango de fechas (None: sin rango)
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def queryset(self, tenant, start=None, end=None):
+        qs = self._queryset(tenant)
+        if self.date_field:
+            if start is not None:
+                qs = qs.filter(**{f'{self.date_field}__gte': _local_midnight(tenant, start)})
+            if end is not None:
+                qs = qs.filter(**{f'{self.date_field}__lt': _local_midnight(tenant, end + timedelta(days=1))})
+        return qs.order_by('id').values_list(*[field for _, field in self.columns])
+
+
+def _local_midnight(tenant, day):
+    return timezone.make_aware(datetime.combine(day, time.min), tenant.tzinfo)
+
+
+def _orders(tenant):
+    return Order.all_objects.filter(tenant=tenant)
+
+
+def _order_items(tenant):
+    return OrderItem.objects.filter(order__tenant=tenant)
+
+
+def _payments(tenant):
+    return Payment.all_objects.filter(tenant=tenant)
+
+
+def _products(tenant):
+    return Product.all_objects.filter(tenant=tenant)
+
+
+def _batches(tenant):
+    return Batch.all_objects.filter(tenant=tenant)
+
+
+DATASETS = {dataset.name: dataset for dataset in [
+    ExportDataset('orders', 'Ventas', [
+        ('ID', 'id'),
+        ('Fecha', 'date'),
+        ('Nro. Boleta', 'order_number'),
+        ('Sucursal', 'branch__name'),
+        ('Caja', 'shift__register__name'),
+        ('Cajero', 'cashier__username'),
+        ('RUT Cliente', 'customer__rut'),
+        ('Neto', 'net_amount'),
+        ('IVA', 'iva_amount'),
+        ('Total', 'total_clp'),
+        ('Pagada', 'is_paid'),
+        ('Anulada', 'is_voided'),
+        ('Razón Anulación', 'void_reason'),
+    ], _orders, date_field='date'),
+    ExportDataset('order_items', 'Líneas de venta', [
+        ('ID', 'id'),
+        ('Venta', 'order_id'),
+        ('Fecha', 'order__date'),
+        ('SKU', 'product__sku'),
+        ('Producto', 'product__name'),
+        ('Cantidad', 'quantity'),
+        ('Precio Unitario', 'unit_price_clp'),
+        ('Costo Unitario', 'cost_at_sale'),
+        ('Total Línea', 'line_total_clp'),
+        ('Anulada', 'order__is_voided'),
+    ], _order_items, date_field='order__date'),
+    ExportDataset('payments', 'Pagos', [
+        ('ID', 'id'),
+        ('Venta', 'order_id'),
+        ('Fecha', 'created_at'),
+        ('Medio', 'method'),
+        ('Monto', 'amount_clp'),
+        ('Nro. Operación', 'transaction_id'),
+        ('Tarjeta', 'card_last_4'),
+    ], _payments, date_field='created_at'),
+    ExportDataset('products', 'Productos', [
+        ('ID', 'id'),
+        ('SKU', 'sku'),
+        ('Código de Barras', 'barcode'),
+        ('Nombre', 'name'),
+        ('Marca', 'brand__name'),
+        ('Categoría', 'category__name'),
+        ('Especie', 'species'),
+        ('Precio', 'price_clp'),
+        ('Costo', 'cost_clp'),
+        ('Stock', 'stock'),
+        ('Stock Mínimo', 'min_stock_alert'),
+    ], _products),
+    ExportDataset('batches', 'Lotes', [
+        ('ID', 'id'),
+        ('SKU', 'product__sku'),
+        ('Producto', 'product__name'),
+        ('Lote', 'batch_number'),
+        ('Vencimiento', 'expiration_date'),
+        ('Cantidad Inicial', 'quantity'),
+        ('Cantidad Actual', 'current_quantity'),
+    ], _batches),
+]}
+
+
+def export_rows(tenant, dataset, start=None, end=None):
+    """
+    Encabezado y filas (tuplas, fechas en hora local del tenant) del conjunto,
+    leídas por bloques con un cursor del servidor.
+    """
+    spec = DATASETS[dataset]
+    yield spec.headers
+    tz = tenant.tzinfo
+    qs = spec.queryset(tenant, start, end)
+    for row in qs.iterator(chunk_size=ITERATOR_CHUNK):
+        yield tuple(
+            timezone.localtime(value, tz).replace(tzinfo=None) if isinstance(value, datetime) else value
+            for value in row
+        )
+
+
+# ──────────── CSV ────────────
+
+class _Buffer:
+    """Destino de escritura que acumula lo escrito hasta que se vacía."""
+
+    def __init__(self, empty=''):
+        self.parts = []
+        self.empty = empty
+
+    def write(self, data):
+        self.parts.append(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = self.empty.join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'Sí' if value else 'No'
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def render_csv(rows):
+    """Bloques de texto CSV (UTF-8 con BOM para Excel), de CHUNK_ROWS filas."""
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % CHUNK_ROWS == 0:
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+# ──────────── XLSX ────────────
+
+_XLSX_STATIC = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+# XML 1.0 forbids most control characters, even escaped
+_XML_ILLEGAL = dict.fromkeys(c for c in range(32) if c not in (9, 10, 13))
+
+
+def _xlsx_cell(value):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, bool):
+        value = 'Sí' if value else 'No'
+    elif isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    elif isinstance(value, datetime):
+        value = value.strftime('%Y-%m-%d %H:%M:%S')
+    elif isinstance(value, date):
+        value = value.isoformat()
+    text = escape(str(value).translate(_XML_ILLEGAL))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def render_xlsx(rows, sheet_name='Datos'):
+    """Bloques binarios de un .xlsx de una hoja, escrito a medida que llegan las filas."""
+    buffer = _Buffer(b'')
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for path, content in _XLSX_STATIC.items():
+            archive.writestr(path, content)
+        archive.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name[:31])))
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetData>'
+            )
+            lines = []
+            for count, row in enumerate(rows, 1):
+                lines.append('<row>' + ''.join(_xlsx_cell(value) for value in row) + '</row>')
+                if count % CHUNK_ROWS == 0:
+                    sheet.write(''.join(lines).encode())
+                    lines.clear()
+                    yield buffer.drain()
+            sheet.write(''.join(lines).encode() + b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+
+FORMATS = {
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (render_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+def render(tenant, dataset, fmt, start=None, end=None):
+    """Bloques del archivo completo (str para CSV, bytes para XLSX)."""
+    renderer, _ = FORMATS[fmt]
+    rows = export_rows(tenant, dataset, start, end)
+    if fmt == 'xlsx':
+        return renderer(rows, sheet_name=DATASETS[dataset].label)
+    return renderer(rows)
+
+
+def filename(tenant, dataset, fmt, start=None, end=None):
+    parts = [tenant.subdomain or str(tenant.id), dataset]
+    if start:
+        parts.append(start.isoformat())
+    if end:
+        parts.append(end.isoformat())
+    return '_'.join(parts) + '.' + fmt
@@ -0,0 +1,95 @@
+"""
+Benchmark de la exportación en streaming: genera ventas de prueba en
+cantidades crecientes y mide, para CSV y XLSX, el tiempo y el pico de memoria
+(tracemalloc) y el RSS del proceso durante la exportación. El pico no debe
+crecer con la cantidad de filas.
+
+Todo se ejecuta dentro de una transacción que se revierte al final, por lo
+que no deja datos en la base.
+"""
+import os
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+# Peak memory may vary a little between runs; anything beyond this is growth
+TOLERANCE_BYTES = 1024 * 1024
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _rss_bytes():
+    """RSS actual del proceso (Linux), o None si no se puede leer."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Mide memoria y tiempo de la exportación CSV/XLSX según la cantidad de filas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, nargs='+', default=[10_000, 50_000, 200_000],
+            help='Cantidades de ventas a exportar (default: 10000 50000 200000)',
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['rows'])
+        try:
+            with transaction.atomic():
+                results = self._run(sizes)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{'formato':<8}{'filas':>10}{'MB salida':>11}{'pico KB':>10}{'RSS MB':>9}{'s':>8}")
+        for fmt, rows, size, peak, rss, seconds in results:
+            rss_mb = f"{rss / 2**20:.1f}" if rss is not None else '-'
+            self.stdout.write(
+                f"{fmt:<8}{rows:>10}{size / 2**20:>11.1f}{peak // 1024:>10}{rss_mb:>9}{seconds:>8.2f}"
+            )
+
+        for fmt in ('csv', 'xlsx'):
+            peaks = [peak for f, _, _, peak, _, _ in results if f == fmt]
+            if peaks[-1] > peaks[0] + TOLERANCE_BYTES:
+                raise CommandError(
+                    f"{fmt}: el pico de memoria crece con las filas ({peaks[0]} → {peaks[-1]} bytes)"
+                )
+        self.stdout.write(self.style.SUCCESS(
+            "OK: memoria constante sin importar la cantidad de filas"
+        ))
+
+    def _run(self, sizes):
+        from apps.dashboard.exports import render
+        from apps.sales.models import Order
+        from apps.tenants.models import Tenant
+
+        tenant = Tenant.objects.create(name='Bench', rut_empresa='bench-0', subdomain='bench-export')
+        results = []
+        created = 0
+        for rows in sizes:
+            while created < rows:
+                batch = min(5000, rows - created)
+                Order.all_objects.bulk_create([
+                    Order(tenant=tenant, total_clp=1990, net_amount=1672, iva_amount=318, is_paid=True)
+                    for _ in range(batch)
+                ])
+                created += batch
+            for fmt in ('csv', 'xlsx'):
+                tracemalloc.start()
+                started = time.perf_counter()
+                size = 0
+                for chunk in render(tenant, 'orders', fmt):
+                    size += len(chunk)
+                seconds = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                results.append((fmt, rows, size, peak, _rss_bytes(), seconds))
+        return results
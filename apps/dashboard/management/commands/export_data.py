@@ -0,0 +1,44 @@
+"""
+Exporta ventas, líneas, pagos, productos o lotes de un tenant en CSV o XLSX,
+escribiendo a medida que se leen las filas (memoria constante).
+
+    python manage.py export_data orders --tenant 3 --start 2026-01-01 --end 2026-01-31 -o ventas.csv
+    python manage.py export_data order_items --tenant 3 --format xlsx -o lineas.xlsx
+"""
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Exporta datos de un tenant a CSV/XLSX en streaming'
+
+    def add_arguments(self, parser):
+        from apps.dashboard.exports import DATASETS, FORMATS
+
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--tenant', type=int, required=True, help='ID del tenant')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--start', type=date.fromisoformat, help='Desde (YYYY-MM-DD, hora local)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Hasta, inclusive (YYYY-MM-DD)')
+        parser.add_argument('-o', '--output', help='Archivo de salida (default: stdout)')
+
+    def handle(self, *args, **options):
+        from apps.dashboard.exports import render
+        from apps.tenants.models import Tenant
+
+        tenant = Tenant.objects.filter(id=options['tenant']).first()
+        if tenant is None:
+            raise CommandError(f"Tenant {options['tenant']} no existe.")
+
+        chunks = render(tenant, options['dataset'], options['format'], options['start'], options['end'])
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        finally:
+            if options['output']:
+                output.close()
+        if options['output']:
+            self.stderr.write(self.style.SUCCESS(f"Exportado a {options['output']}"))
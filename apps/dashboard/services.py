@@ -2,21 +2,31 @@
 MetricsService — Calcula métricas para el dashboard administrativo.
 Toda la lógica de reportes se centraliza aquí, fuera de las views.
 """
-from datetime import date, timedelta
+import logging
+from time import perf_counter
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
-from django.db.models import Sum, Count, F, Q
+from django.db.models import DateField, DateTimeField, Sum, Count, F, Q
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth, TruncWeek
 from django.utils import timezone
 
-from apps.sales.models import Order, OrderItem, Payment, Shift
+from apps.sales.models import DailySalesRollup, Order, Shift
 from apps.inventory.models import Product, Batch
+from apps.inventory.pricing import list_margin, price_changes, prices_at
+
+from .cache import DashboardCache
+
+logger = logging.getLogger(__name__)
 
 
 class MetricsService:
     """Calcula métricas de ventas, inventario y operaciones."""
 
-    def __init__(self, tenant, branch=None):
+    def __init__(self, tenant, branch=None, use_cache=True):
         self.tenant = tenant
         self.branch = branch
+        self.cache = DashboardCache(tenant, branch) if use_cache else None
+        self.timings = {}  # {block: {'ms': float, 'cached': bool}}
 
     def _base_orders(self):
         qs = Order.all_objects.filter(
@@ -26,92 +36,239 @@ class MetricsService:
             qs = qs.filter(branch=self.branch)
         return qs
 
-    # ──────────── Sales metrics ────────────
+    def _rollups(self):
+        """Filas de DailySalesRollup del tenant (y sucursal, si aplica)."""
+        qs = DailySalesRollup.all_objects.filter(tenant=self.tenant)
+        if self.branch:
+            qs = qs.filter(branch=self.branch)
+        return qs
 
-    def sales_today(self):
-        today = timezone.now().date()
-        qs = self._base_orders().filter(date__date=today)
-        result = qs.aggregate(total=Sum('total_clp'), count=Count('id'))
+    # ──────────── Time series ────────────
+
+    GRANULARITIES = {
+        'hour': TruncHour,
+        'day': TruncDay,
+        'week': TruncWeek,
+        'month': TruncMonth,
+    }
+    LABEL_FORMATS = {
+        'hour': '%H:%M',
+        'day': '%a %d',
+        'week': 'Sem %d/%m',
+        'month': '%m/%Y',
+    }
+
+    @property
+    def tz(self):
+        return self.tenant.tzinfo
+
+    def today(self):
+        """Fecha actual en la zona horaria del tenant."""
+        return timezone.localdate(timezone=self.tz)
+
+    def _as_local_datetime(self, value):
+        """date → medianoche local; datetime naive → hora local; aware se respeta."""
+        if not isinstance(value, datetime):
+            value = datetime.combine(value, time.min)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value, self.tz)
+        return value
+
+    @staticmethod
+    def _floor(value, granularity):
+        """Inicio del bucket (naive, hora local) que contiene value."""
+        if granularity == 'hour':
+            return value.replace(minute=0, second=0, microsecond=0)
+        value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+        if granularity == 'week':
+            return value - timedelta(days=value.weekday())
+        if granularity == 'month':
+            return value.replace(day=1)
+        return value
+
+    @staticmethod
+    def _next(value, granularity):
+        if granularity == 'hour':
+            return value + timedelta(hours=1)
+        if granularity == 'day':
+            return value + timedelta(days=1)
+        if granularity == 'week':
+            return value + timedelta(weeks=1)
+        if value.month == 12:
+            return value.replace(year=value.year + 1, month=1)
+        return value.replace(month=value.month + 1)
+
+    def sales_series(self, start, end, granularity='day'):
+        """
+        Ventas agrupadas por hora, día, semana o mes en [start, end).
+
+        start/end pueden ser date (medianoche local del tenant) o datetime.
+        Una sola consulta agrupada: con fechas y granularidad day/week/month
+        sobre DailySalesRollup; si no, sobre Order truncando en la zona
+        horaria del tenant. Los buckets sin ventas se rellenan con cero. Cada bucket:
+        {'start', 'label', 'total', 'count'}, donde start es date para
+        day/week/month y datetime naive (hora local) para hour. Con week y
+        month el primer y último bucket sólo cuentan la parte dentro del rango.
+        """
+        if granularity not in self.GRANULARITIES:
+            raise ValueError(f"Granularidad no soportada: {granularity}")
+        if granularity != 'hour' and not isinstance(start, datetime) and not isinstance(end, datetime):
+            found = self._buckets_from_rollup(start, end, granularity)
+        else:
+            found = self._buckets_from_orders(start, end, granularity)
+        start = self._as_local_datetime(start)
+        end = self._as_local_datetime(end)
+        as_date = granularity != 'hour'
+
+        series = []
+        cursor = self._floor(timezone.localtime(start, self.tz).replace(tzinfo=None), granularity)
+        stop = timezone.localtime(end, self.tz).replace(tzinfo=None)
+        label = self.LABEL_FORMATS[granularity]
+        while cursor < stop:
+            key = cursor.date() if as_date else cursor
+            total, count = found.get(key, (0, 0))
+            series.append({
+                'start': key,
+                'label': cursor.strftime(label),
+                'total': total,
+                'count': count,
+            })
+            cursor = self._next(cursor, granularity)
+        return series
+
+    def _buckets_from_rollup(self, start, end, granularity):
+        """Rangos de días completos: lee las filas de órdenes de DailySalesRollup."""
+        rows = self._rollups().filter(
+            product__isnull=True, day__gte=start, day__lt=end,
+        ).values('day').annotate(
+            total=Sum('total_clp'), count=Sum('orders'),
+        ).order_by()
+        found = {}
+        for row in rows:
+            key = self._floor(datetime.combine(row['day'], time.min), granularity).date()
+            total, count = found.get(key, (0, 0))
+            found[key] = (total + (row['total'] or 0), count + (row['count'] or 0))
+        return found
+
+    def _buckets_from_orders(self, start, end, granularity):
+        """Rangos con hora (o granularidad hour): agrupa Order truncando en SQL."""
+        as_date = granularity != 'hour'
+        trunc = self.GRANULARITIES[granularity](
+            'date', tzinfo=self.tz,
+            output_field=DateField() if as_date else DateTimeField(),
+        )
+        rows = (
+            self._base_orders()
+            .filter(date__gte=self._as_local_datetime(start), date__lt=self._as_local_datetime(end))
+            .annotate(bucket=trunc)
+            .values('bucket')
+            .annotate(total=Sum('total_clp'), count=Count('id'))
+            .order_by('bucket')
+        )
+        found = {}
+        for row in rows:
+            key = row['bucket']
+            if not as_date:
+                key = timezone.localtime(key, self.tz).replace(tzinfo=None)
+            # Repeated local hours (DST fall-back) collapse into one bucket
+            total, count = found.get(key, (0, 0))
+            found[key] = (total + (row['total'] or 0), count + row['count'])
+        return found
+
+    @staticmethod
+    def _sum_buckets(buckets):
         return {
-            'total': result['total'] or 0,
-            'count': result['count'] or 0,
+            'total': sum(b['total'] for b in buckets),
+            'count': sum(b['count'] for b in buckets),
         }
 
+    # ──────────── Sales metrics ────────────
+
+    def sales_today(self):
+        today = self.today()
+        return self._sum_buckets(self.sales_series(today, today + timedelta(days=1)))
+
     def sales_this_week(self):
-        today = timezone.now().date()
+        today = self.today()
         start = today - timedelta(days=today.weekday())  # Monday
-        qs = self._base_orders().filter(date__date__gte=start)
-        result = qs.aggregate(total=Sum('total_clp'), count=Count('id'))
-        return {
-            'total': result['total'] or 0,
-            'count': result['count'] or 0,
-        }
+        return self._sum_buckets(self.sales_series(start, today + timedelta(days=1)))
 
     def sales_this_month(self):
-        today = timezone.now()
-        qs = self._base_orders().filter(
-            date__year=today.year, date__month=today.month,
+        today = self.today()
+        return self._sum_buckets(
+            self.sales_series(today.replace(day=1), today + timedelta(days=1))
         )
-        result = qs.aggregate(total=Sum('total_clp'), count=Count('id'))
-        return {
-            'total': result['total'] or 0,
-            'count': result['count'] or 0,
-        }
 
     def sales_last_7_days(self):
         """Daily sales for the last 7 days (for chart)."""
-        today = timezone.now().date()
-        days = []
-        for i in range(6, -1, -1):
-            d = today - timedelta(days=i)
-            qs = self._base_orders().filter(date__date=d)
-            agg = qs.aggregate(total=Sum('total_clp'), count=Count('id'))
-            days.append({
-                'date': d,
-                'label': d.strftime('%a %d'),
-                'total': agg['total'] or 0,
-                'count': agg['count'] or 0,
-            })
-        return days
+        today = self.today()
+        return self.sales_series(today - timedelta(days=6), today + timedelta(days=1))
+
+    def sales_periods(self):
+        """
+        Hoy, semana, mes y últimos 7 días a partir de una sola serie diaria
+        (desde el primero entre inicio de mes y hace 6 días, hasta hoy).
+        """
+        today = self.today()
+        week_start = today - timedelta(days=today.weekday())
+        month_start = today.replace(day=1)
+        seven_start = today - timedelta(days=6)
+        days = self.sales_series(
+            min(month_start, seven_start), today + timedelta(days=1),
+        )
+        return {
+            'today': self._sum_buckets(days[-1:]),
+            'week': self._sum_buckets([d for d in days if d['start'] >= week_start]),
+            'month': self._sum_buckets([d for d in days if d['start'] >= month_start]),
+            'last_7_days': days[-7:],
+        }
 
     def sales_by_payment_method(self):
         """Breakdown by payment method (for pie chart)."""
-        qs = Payment.all_objects.filter(
-            order__tenant=self.tenant,
-            order__is_paid=True,
-            order__is_voided=False,
-            order__date__date=timezone.now().date(),
-        )
-        return list(qs.values('method').annotate(
-            total=Sum('amount_clp'), count=Count('id'),
-        ).order_by('-total'))
+        return list(self._rollups().filter(
+            product__isnull=True, day=self.today(),
+        ).values(method=F('payment_method')).annotate(
+            total=Sum('total_clp'), count=Sum('orders'),
+        ).filter(count__gt=0).order_by('-total'))
 
     # ──────────── Product metrics ────────────
 
     def top_products(self, limit=10, days=30):
         """Top products by revenue in the last N days."""
-        cutoff = timezone.now() - timedelta(days=days)
-        return list(OrderItem.objects.filter(
-            order__tenant=self.tenant,
-            order__is_paid=True,
-            order__is_voided=False,
-            order__date__gte=cutoff,
+        cutoff = self.today() - timedelta(days=days)
+        return list(self._rollups().filter(
+            product__isnull=False, day__gte=cutoff,
         ).values(
             'product__name', 'product__sku',
         ).annotate(
             total_sold=Sum('quantity'),
-            total_revenue=Sum('line_total_clp'),
-        ).order_by('-total_revenue')[:limit])
+            total_revenue=Sum('revenue_clp'),
+        ).filter(total_sold__gt=0).order_by('-total_revenue')[:limit])
 
     # ──────────── Inventory alerts ────────────
 
     def low_stock_alerts(self):
-        """Products below their minimum stock threshold."""
+        """
+        Products below their minimum stock threshold: tenant-wide (Product.stock)
+        or, with a branch, on that branch's BranchStock (annotated as branch_stock).
+        """
+        if self.branch:
+            return Product.all_objects.filter(
+                tenant=self.tenant,
+                branch_stocks__branch=self.branch,
+                branch_stocks__stock__lte=F('min_stock_alert'),
+            ).annotate(branch_stock=F('branch_stocks__stock')).order_by('branch_stock')
         return Product.all_objects.filter(
             tenant=self.tenant,
             stock__lte=F('min_stock_alert'),
         ).order_by('stock')
 
+    def low_margin_alerts(self):
+        """Products selling below their minimum margin (margin computed in SQL)."""
+        return Product.all_objects.filter(
+            tenant=self.tenant,
+        ).below_min_margin(iva_rate=self.tenant.iva_rate).order_by('margin')
+
     def expiration_alerts(self, days=30):
         """Batches expiring within N days."""
         cutoff = date.today() + timedelta(days=days)
@@ -133,17 +290,14 @@ class MetricsService:
 
     def margin_report(self, days=30):
         """Revenue vs cost by product."""
-        cutoff = timezone.now() - timedelta(days=days)
-        items = list(OrderItem.objects.filter(
-            order__tenant=self.tenant,
-            order__is_paid=True,
-            order__is_voided=False,
-            order__date__gte=cutoff,
+        cutoff = self.today() - timedelta(days=days)
+        items = list(self._rollups().filter(
+            product__isnull=False, day__gte=cutoff,
         ).values('product__name', 'product__sku').annotate(
-            revenue=Sum('line_total_clp'),
-            cost=Sum(F('cost_at_sale') * F('quantity')),
+            revenue=Sum('revenue_clp'),
+            cost=Sum('cost_clp'),
             qty=Sum('quantity'),
-        ).order_by('-revenue'))
+        ).filter(qty__gt=0).order_by('-revenue'))
 
         for item in items:
             cost = item['cost'] or 0
@@ -154,18 +308,98 @@ class MetricsService:
             )
         return items
 
+    def margin_series(self, start, end, granularity='week', category=None):
+        """
+        Margen de lista del catálogo (precio y costo vigentes, no ventas) al
+        cierre de cada día, semana o mes de [start, end), leído del historial
+        de precios: una consulta para los precios vigentes al inicio y otra
+        para los cambios del rango, sin recorrer OrderItem. Cada bucket:
+        {'start', 'label', 'avg_margin', 'below_min', 'products'}, con
+        avg_margin (promedio simple sobre productos con costo; None si no hay)
+        y below_min (productos bajo su min_margin_pct actual).
+        """
+        if granularity not in ('day', 'week', 'month'):
+            raise ValueError(f"Granularidad no soportada: {granularity}")
+        products = Product.all_objects.filter(tenant=self.tenant)
+        if category:
+            products = products.filter(category=category)
+        minimums = {pk: float(value) for pk, value in products.values_list('id', 'min_margin_pct')}
+        start = self._as_local_datetime(start)
+        end = self._as_local_datetime(end)
+
+        state = prices_at(self.tenant.id, start, products)
+        changes = price_changes(self.tenant.id, start, end, products).iterator(chunk_size=2000)
+        pending = next(changes, None)
+
+        series = []
+        cursor = self._floor(timezone.localtime(start, self.tz).replace(tzinfo=None), granularity)
+        stop = timezone.localtime(end, self.tz).replace(tzinfo=None)
+        label = self.LABEL_FORMATS[granularity]
+        while cursor < stop:
+            boundary = timezone.make_aware(min(self._next(cursor, granularity), stop), self.tz)
+            while pending is not None and pending[1] < boundary:
+                product_id, _, price, cost = pending
+                state[product_id] = (price, cost)
+                pending = next(changes, None)
+
+            margins = {
+                product_id: list_margin(price, cost, self.tenant.iva_rate)
+                for product_id, (price, cost) in state.items()
+            }
+            margins = {product_id: m for product_id, m in margins.items() if m is not None}
+            series.append({
+                'start': cursor.date(),
+                'label': cursor.strftime(label),
+                'avg_margin': round(sum(margins.values()) / len(margins), 1) if margins else None,
+                'below_min': sum(1 for pid, m in margins.items() if m < minimums.get(pid, 0)),
+                'products': len(state),
+            })
+            cursor = self._next(cursor, granularity)
+        return series
+
     # ──────────── Summary dict (for dashboard) ────────────
 
+    def _block(self, name, window, compute):
+        """Calcula (o lee del cache) un bloque y registra su tiempo en self.timings."""
+        started = perf_counter()
+        if self.cache is not None:
+            value, cached = self.cache.get_or_compute(name, window, compute)
+        else:
+            value, cached = compute(), False
+        ms = (perf_counter() - started) * 1000
+        self.timings[name] = {'ms': round(ms, 2), 'cached': cached}
+        logger.debug("dashboard block %s: %.1f ms (%s)", name, ms, 'cache' if cached else 'db')
+        return value
+
     def dashboard_summary(self):
-        """Returns all KPIs for the main dashboard view."""
+        """Returns all KPIs for the main dashboard view (cacheado por bloque)."""
+        today = self.today().isoformat()
+        return self._block('summary', today, lambda: self._compute_summary(today))
+
+    def _compute_summary(self, today):
         return {
-            'today': self.sales_today(),
-            'week': self.sales_this_week(),
-            'month': self.sales_this_month(),
-            'last_7_days': self.sales_last_7_days(),
-            'payment_methods': self.sales_by_payment_method(),
-            'top_products': self.top_products(limit=5),
-            'low_stock': list(self.low_stock_alerts()[:10]),
-            'expiring': list(self.expiration_alerts(days=30)[:10]),
-            'expired': list(self.expired_batches()[:5]),
+            **self._block('sales', today, self.sales_periods),
+            'payment_methods': self._block('payment_methods', today, self.sales_by_payment_method),
+            'top_products': self._block(
+                'top_products', f'{today}:30d:5', lambda: self.top_products(limit=5),
+            ),
+            'low_stock': self._block(
+                'low_stock', '10', lambda: list(self.low_stock_alerts()[:10]),
+            ),
+            'low_margin': self._block(
+                'low_margin', '10', lambda: list(self.low_margin_alerts()[:10]),
+            ),
+            'expiring': self._block(
+                'expiring', f'{today}:30d:10', lambda: list(self.expiration_alerts(days=30)[:10]),
+            ),
+            'expired': self._block(
+                'expired', f'{today}:5', lambda: list(self.expired_batches()[:5]),
+            ),
         }
+
+    def server_timing(self):
+        """Valor del header Server-Timing con el tiempo de cada bloque."""
+        return ', '.join(
+            f'{name};dur={t["ms"]};desc="{"cache" if t["cached"] else "db"}"'
+            for name, t in self.timings.items()
+        )
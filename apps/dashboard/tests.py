@@ -0,0 +1,47 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from apps.tenants.models import Tenant
+
+from .cache import DashboardCache, invalidate_dashboard
+
+
+class DashboardCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Tienda Test', rut_empresa='11111111-1', subdomain='test')
+
+    def setUp(self):
+        cache.clear()
+
+    def hold_lock(self, block, window):
+        cache.add(f'{DashboardCache(self.tenant).key(block, window)}:lock', 1)
+
+    def test_hit_after_compute(self):
+        compute = mock.Mock(return_value=100)
+        self.assertEqual(DashboardCache(self.tenant).get_or_compute('kpis', 'hoy', compute), (100, False))
+        self.assertEqual(DashboardCache(self.tenant).get_or_compute('kpis', 'hoy', compute), (100, True))
+        self.assertEqual(compute.call_count, 1)
+
+    def test_contention_serves_previous_copy_without_waiting(self):
+        """Tras invalidar, mientras otro request recalcula, se sirve la copia anterior."""
+        DashboardCache(self.tenant).get_or_compute('kpis', 'hoy', lambda: 100)
+        invalidate_dashboard(self.tenant.id)
+        self.hold_lock('kpis', 'hoy')
+        compute = mock.Mock(return_value=200)
+        with mock.patch('time.sleep') as sleep:
+            self.assertEqual(DashboardCache(self.tenant).get_or_compute('kpis', 'hoy', compute), (100, True))
+        compute.assert_not_called()
+        sleep.assert_not_called()
+
+    def test_contention_without_copy_computes_directly(self):
+        self.hold_lock('kpis', 'hoy')
+        compute = mock.Mock(return_value=200)
+        with mock.patch('time.sleep') as sleep:
+            self.assertEqual(DashboardCache(self.tenant).get_or_compute('kpis', 'hoy', compute), (200, False))
+        sleep.assert_not_called()
+        # The lock holder writes the block: this request leaves the cache alone
+        self.assertIsNone(cache.get(DashboardCache(self.tenant).key('kpis', 'hoy')))
@@ -8,4 +8,6 @@ urlpatterns = [
     path('reports/margin/', views.reports_margin, name='reports_margin'),
     path('reports/top-products/', views.reports_top_products, name='reports_top_products'),
     path('alerts/stock/', views.alerts_stock, name='alerts_stock'),
+    path('export/', views.export_page, name='export_page'),
+    path('export/download/', views.export_download, name='export_download'),
 ]
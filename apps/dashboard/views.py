@@ -1,9 +1,16 @@
 import json
+from datetime import date, timedelta
+
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from apps.core.decorators import supervisor_required
+from apps.tenants.models import Branch
+from . import exports
 from .services import MetricsService
 
+MARGIN_PERIODS = {'day': 'Diario (30 días)', 'week': 'Semanal (12 semanas)', 'month': 'Mensual (12 meses)'}
+
 
 @supervisor_required
 def admin_dashboard(request):
@@ -34,22 +41,42 @@ def admin_dashboard(request):
         'values': [p['total'] for p in summary['payment_methods']],
     }
 
-    return render(request, 'dashboard/admin_dashboard.html', {
+    response = render(request, 'dashboard/admin_dashboard.html', {
         'summary': summary,
         'chart_data': json.dumps(chart_data),
         'payment_chart': json.dumps(payment_chart),
     })
+    response['Server-Timing'] = service.server_timing()
+    return response
 
 
 @supervisor_required
 def reports_margin(request):
-    """Reporte de márgenes por producto."""
+    """
+    Reporte de márgenes: realizado por producto (últimos 30 días de ventas) y
+    margen de lista del catálogo en el tiempo (?period=day|week|month).
+    """
     tenant = getattr(request, 'tenant', None)
     service = MetricsService(tenant)
     margin_data = service.margin_report(days=30)
 
+    period = request.GET.get('period')
+    if period not in MARGIN_PERIODS:
+        period = 'week'
+    today = service.today()
+    if period == 'day':
+        start = today - timedelta(days=29)
+    elif period == 'week':
+        start = today - timedelta(weeks=11)
+    else:
+        month = today.month + 1  # twelve months, the current one included
+        start = date(today.year - 1, month, 1) if month <= 12 else date(today.year, 1, 1)
+
     return render(request, 'dashboard/reports_margin.html', {
         'margin_data': margin_data,
+        'margin_series': service.margin_series(start, today + timedelta(days=1), period),
+        'period': period,
+        'periods': MARGIN_PERIODS,
     })
 
 
@@ -67,15 +94,59 @@ def reports_top_products(request):
 
 @supervisor_required
 def alerts_stock(request):
-    """Alertas de stock bajo."""
+    """Alertas de stock bajo (del tenant o de una sucursal: ?branch=<id>)."""
     tenant = getattr(request, 'tenant', None)
-    service = MetricsService(tenant)
+    branches = Branch.objects.filter(tenant=tenant).order_by('name')
+    branch_id = request.GET.get('branch', '')
+    branch = branches.filter(pk=branch_id).first() if branch_id.isdigit() else None
+    service = MetricsService(tenant, branch=branch)
     low_stock = service.low_stock_alerts()
+    low_margin = service.low_margin_alerts()
     expired = service.expired_batches()
     expiring = service.expiration_alerts(days=30)
 
     return render(request, 'dashboard/alerts_stock.html', {
+        'branches': branches,
+        'branch': branch,
         'low_stock': low_stock,
+        'low_margin': low_margin,
         'expired': expired,
         'expiring': expiring,
     })
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+@supervisor_required
+def export_page(request):
+    """Formulario de exportación (conjunto, formato y rango de fechas)."""
+    return render(request, 'dashboard/exports.html', {
+        'datasets': exports.DATASETS.values(),
+        'formats': exports.FORMATS,
+    })
+
+
+@supervisor_required
+def export_download(request):
+    """Descarga en streaming: ?dataset=orders&format=csv&start=2026-01-01&end=2026-01-31"""
+    tenant = getattr(request, 'tenant', None)
+    dataset = request.GET.get('dataset')
+    fmt = request.GET.get('format', 'csv')
+    if not tenant or dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        raise Http404("Exportación no disponible.")
+    start = _parse_date(request.GET.get('start'))
+    end = _parse_date(request.GET.get('end'))
+
+    response = StreamingHttpResponse(
+        exports.render(tenant, dataset, fmt, start, end),
+        content_type=exports.FORMATS[fmt][1],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{exports.filename(tenant, dataset, fmt, start, end)}"'
+    )
+    return response
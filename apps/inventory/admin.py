@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Brand, Supplier, Category, Product, Batch
+from .ledger import receive_batch, save_with_movement
+from .models import Brand, Supplier, Category, Product, Batch, BranchStock, PriceHistory, StockMovement
 
 
 @admin.register(Brand)
@@ -36,6 +37,19 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 
+class MarginFilter(admin.SimpleListFilter):
+    title = 'margen'
+    parameter_name = 'margin'
+
+    def lookups(self, request, model_admin):
+        return [('below', 'Bajo el mínimo')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'below':
+            return queryset.below_min_margin()
+        return queryset
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = (
@@ -43,7 +57,8 @@ class ProductAdmin(admin.ModelAdmin):
         'price_clp', 'cost_clp', 'display_margin',
         'stock', 'is_low_stock', 'tenant',
     )
-    list_filter = ('species', 'lifecycle', 'protein', 'brand', 'is_bulk')
+    list_filter = ('species', 'lifecycle', 'protein', 'brand', 'is_bulk', MarginFilter)
+    list_select_related = ('brand', 'tenant')
     search_fields = ('sku', 'name', 'barcode')
     inlines = [BatchInline]
 
@@ -62,7 +77,27 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
 
-    @admin.display(description='Margen %', ordering='cost_clp')
+    def save_model(self, request, obj, form, change):
+        # Stock and price edits are recorded (ledger and price history)
+        save_with_movement(
+            obj, reference="Edición en admin", user=request.user, price_source=PriceHistory.ADMIN,
+        )
+
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not Batch:
+            return super().save_formset(request, form, formset, change)
+        # New batches are stock receipts (product, branch and ledger)
+        for batch in formset.save(commit=False):
+            receive_batch(batch, user=request.user, reference="Recepción en admin")
+        for batch in formset.deleted_objects:
+            batch.delete()
+        formset.save_m2m()
+
+    def get_queryset(self, request):
+        # Margin in SQL (tenant IVA): sortable and filterable without loading rows
+        return super().get_queryset(request).with_margin()
+
+    @admin.display(description='Margen %', ordering='margin')
     def display_margin(self, obj):
         margin = obj.margin_pct
         if obj.is_margin_below_minimum:
@@ -83,6 +118,10 @@ class BatchAdmin(admin.ModelAdmin):
     list_filter = ('expiration_date',)
     search_fields = ('product__name', 'batch_number')
 
+    def save_model(self, request, obj, form, change):
+        # A new batch is a stock receipt (product, branch and ledger)
+        receive_batch(obj, user=request.user, reference="Recepción en admin")
+
     @admin.display(description='¿Expirado?', boolean=True)
     def is_expired_display(self, obj):
         return obj.is_expired
@@ -94,4 +133,52 @@ class BatchAdmin(admin.ModelAdmin):
             return f"❌ Expirado hace {abs(days)} días"
         if days <= 30:
             return f"⚠️ {days} días"
-        return f"✅ {days} días"
\ No newline at end of file
+        return f"✅ {days} días"
+
+@admin.register(BranchStock)
+class BranchStockAdmin(admin.ModelAdmin):
+    """Sólo lectura: el stock por sucursal cambia por ventas, ajustes y traspasos."""
+    list_display = ('product', 'branch', 'stock')
+    list_filter = ('branch',)
+    list_select_related = ('product', 'branch')
+    search_fields = ('product__name', 'product__sku')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'product', 'branch', 'kind', 'quantity', 'reference', 'created_by')
+    list_filter = ('kind', 'branch', 'created_at')
+    list_select_related = ('product', 'branch', 'created_by')
+    search_fields = ('product__name', 'product__sku', 'reference')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PriceHistory)
+class PriceHistoryAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'product', 'price_clp', 'cost_clp', 'source', 'reference', 'created_by')
+    list_filter = ('source', 'created_at')
+    list_select_related = ('product', 'created_by')
+    search_fields = ('product__name', 'product__sku', 'reference')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save
 
 
 class InventoryConfig(AppConfig):
     name = 'apps.inventory'
     label = 'inventory'
+
+    def ready(self):
+        from apps.tenants.models import Branch
+        from .branches import seed_first_branch
+
+        post_save.connect(seed_first_branch, sender=Branch, dispatch_uid='branch_stock_seed')
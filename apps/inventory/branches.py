@@ -0,0 +1,188 @@
+"""
+Stock por sucursal (BranchStock).
+
+Product.stock sigue siendo el total del tenant (lectura O(1) para listados y
+búsquedas); cuando el tenant tiene sucursales es la suma de sus BranchStock.
+Las ventas descuentan la sucursal que vende (sales/stock.py), los ajustes de
+stock caen en la sucursal del usuario o en la principal, y transfer_stock()
+mueve stock entre sucursales sin tocar el total.
+
+Todas las operaciones trabajan en bloque: cada una emite un número fijo de
+consultas sin importar cuántos productos involucre.
+"""
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+
+from apps.dashboard.cache import invalidate_dashboard
+
+from .ledger import record_movements
+from .models import BranchStock, Product, StockMovement
+
+STOCK_FIELD = BranchStock._meta.get_field('stock')
+
+
+class TransferError(Exception):
+    """El traspaso no se puede hacer (sucursales inválidas o stock insuficiente)."""
+
+    def __init__(self, message, shortages=None):
+        super().__init__(message)
+        self.shortages = shortages or {}  # {product_id: (disponible, requerido)}
+
+
+class _Shortfall(Exception):
+    pass
+
+
+def main_branch_id(tenant_id):
+    """Sucursal principal del tenant (is_main, si no la más antigua), o None si no tiene."""
+    from apps.tenants.models import Branch
+
+    return Branch.objects.filter(tenant_id=tenant_id).order_by(
+        '-is_main', 'id',
+    ).values_list('id', flat=True).first()
+
+
+def user_branch_id(user, tenant_id):
+    """Sucursal asignada al usuario (perfil de personal), o la principal."""
+    profile = getattr(user, 'staff_profile', None) if user is not None else None
+    if profile is not None and profile.branch_id:
+        return profile.branch_id
+    return main_branch_id(tenant_id)
+
+
+def add_branch_stock(tenant_id, branch_id, lines):
+    """
+    Suma (o resta, con cantidades negativas) stock en una sucursal, creando
+    las filas que falten: un INSERT que ignora las existentes y un UPDATE.
+
+    Args:
+        lines: iterable de (product_id, cantidad)
+    """
+    totals = {}
+    for product_id, quantity in lines:
+        totals[product_id] = totals.get(product_id, Decimal('0')) + Decimal(quantity)
+    totals = {product_id: qty for product_id, qty in totals.items() if qty}
+    if not totals:
+        return
+
+    BranchStock.all_objects.bulk_create([
+        BranchStock(tenant_id=tenant_id, branch_id=branch_id, product_id=product_id)
+        for product_id in totals
+    ], ignore_conflicts=True)
+    BranchStock.all_objects.filter(branch_id=branch_id, product_id__in=list(totals)).update(
+        stock=Case(
+            *[When(product_id=product_id, then=F('stock') + qty)
+              for product_id, qty in totals.items()],
+            output_field=STOCK_FIELD,
+        ),
+    )
+
+
+def stock_by_branch(tenant_id, product_ids=None):
+    """{product_id: {branch_id: stock}} del tenant en una sola consulta."""
+    rows = BranchStock.all_objects.filter(tenant_id=tenant_id)
+    if product_ids is not None:
+        rows = rows.filter(product_id__in=list(product_ids))
+    matrix = {}
+    for product_id, branch_id, stock in rows.values_list('product_id', 'branch_id', 'stock'):
+        matrix.setdefault(product_id, {})[branch_id] = stock
+    return matrix
+
+
+def seed_first_branch(sender, instance, created, **kwargs):
+    """
+    Receiver de post_save de Branch: al crear la primera sucursal del tenant,
+    todo el stock existente pasa a ella (un INSERT).
+    """
+    if not created or BranchStock.all_objects.filter(tenant_id=instance.tenant_id).exists():
+        return
+    if type(instance).objects.filter(tenant_id=instance.tenant_id).exclude(pk=instance.pk).exists():
+        return
+    BranchStock.all_objects.bulk_create([
+        BranchStock(tenant_id=instance.tenant_id, branch=instance, product_id=product_id, stock=stock)
+        for product_id, stock in Product.all_objects.filter(
+            tenant_id=instance.tenant_id,
+        ).exclude(stock=0).values_list('id', 'stock').iterator()
+    ], batch_size=1000)
+
+
+@transaction.atomic
+def transfer_stock(tenant, from_branch, to_branch, lines, user=None, reference=''):
+    """
+    Traspasa stock entre dos sucursales del tenant. Product.stock no cambia.
+
+    Bloquea los productos en orden de id (como el checkout), descuenta el
+    origen con un único UPDATE condicional (stock >= cantidad), suma en el
+    destino y deja en el libro un movimiento de salida y uno de entrada por
+    producto.
+
+    Args:
+        lines: iterable de (product_id, cantidad > 0)
+
+    Raises:
+        TransferError: sucursales inválidas, productos ajenos o stock insuficiente
+    """
+    if from_branch.pk == to_branch.pk:
+        raise TransferError("El origen y el destino deben ser sucursales distintas.")
+    if from_branch.tenant_id != tenant.id or to_branch.tenant_id != tenant.id:
+        raise TransferError("Las sucursales no pertenecen a la tienda.")
+
+    totals = {}
+    for product_id, quantity in lines:
+        quantity = Decimal(quantity)
+        if quantity <= 0:
+            raise TransferError("Las cantidades a traspasar deben ser positivas.")
+        totals[int(product_id)] = totals.get(int(product_id), Decimal('0')) + quantity
+    if not totals:
+        return {}
+
+    found = list(Product.all_objects.select_for_update().filter(
+        tenant=tenant, id__in=list(totals),
+    ).order_by('id').values_list('id', flat=True))
+    if len(found) != len(totals):
+        missing = sorted(set(totals) - set(found))
+        raise TransferError(f"Productos inexistentes: {missing}")
+
+    guard = Q()
+    for product_id, qty in totals.items():
+        guard |= Q(product_id=product_id, stock__gte=qty)
+    try:
+        with transaction.atomic():
+            updated = BranchStock.all_objects.filter(guard, branch=from_branch).update(
+                stock=Case(
+                    *[When(product_id=product_id, then=F('stock') - qty)
+                      for product_id, qty in totals.items()],
+                    output_field=STOCK_FIELD,
+                ),
+            )
+            if updated != len(totals):
+                raise _Shortfall
+    except _Shortfall:
+        # Partial UPDATE rolled back: report what the source actually holds
+        available = dict(BranchStock.all_objects.filter(
+            branch=from_branch, product_id__in=list(totals),
+        ).values_list('product_id', 'stock'))
+        shortages = {
+            product_id: (available.get(product_id, Decimal('0')), qty)
+            for product_id, qty in totals.items()
+            if available.get(product_id, Decimal('0')) < qty
+        }
+        raise TransferError(
+            f"Stock insuficiente en {from_branch.name} para {len(shortages)} producto(s).",
+            shortages,
+        )
+
+    add_branch_stock(tenant.id, to_branch.pk, totals.items())
+    record_movements(
+        tenant.id, StockMovement.TRANSFER, [(pid, -qty) for pid, qty in totals.items()],
+        reference=reference or f"Traspaso a {to_branch.name}", user=user, branch_id=from_branch.pk,
+    )
+    record_movements(
+        tenant.id, StockMovement.TRANSFER, totals.items(),
+        reference=reference or f"Traspaso desde {from_branch.name}", user=user, branch_id=to_branch.pk,
+    )
+    transaction.on_commit(partial(invalidate_dashboard, tenant.id))
+    return totals
@@ -1,5 +1,7 @@
 from django import forms
+from .ledger import save_with_movement
 from .models import Product, Category, Batch, Brand, Supplier
+from .pricing import BulkPriceUpdate, PricingError
 
 WIDGET_BASE = 'w-full p-2 border rounded'
 
@@ -44,6 +46,7 @@ class ProductForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         self.tenant = kwargs.pop('tenant', None)
+        self.user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         # Pre-fill brand/supplier text from existing instance
         if self.instance and self.instance.pk:
@@ -91,7 +94,8 @@ class ProductForm(forms.ModelForm):
             instance.supplier = supplier_obj
 
         if commit:
-            instance.save()
+            # Stock changes go through the ledger (StockMovement)
+            save_with_movement(instance, reference="Edición de producto", user=self.user)
         return instance
 
 
@@ -108,6 +112,9 @@ class BatchForm(forms.ModelForm):
     class Meta:
         model = Batch
         fields = ['product', 'batch_number', 'expiration_date', 'quantity', 'current_quantity']
+        help_texts = {
+            'current_quantity': "Al crear el lote esta cantidad se suma al stock del producto",
+        }
         widgets = {
             'product': forms.Select(attrs={'class': WIDGET_BASE}),
             'batch_number': forms.TextInput(attrs={'class': WIDGET_BASE}),
@@ -138,3 +145,92 @@ class SupplierForm(forms.ModelForm):
             'email': forms.EmailInput(attrs={'class': WIDGET_BASE}),
             'address': forms.TextInput(attrs={'class': WIDGET_BASE}),
         }
+
+
+class ProductImportForm(forms.Form):
+    """Lista de precios CSV para importer.ProductImporter."""
+    file = forms.FileField(label="Archivo CSV")
+    supplier = forms.ModelChoiceField(
+        queryset=Supplier.objects.none(), required=False,
+        label="Proveedor", help_text="Se asigna a todas las filas (deja vacío para usar la columna del archivo)",
+        widget=forms.Select(attrs={'class': WIDGET_BASE}),
+    )
+    dry_run = forms.BooleanField(
+        required=False, initial=True, label="Sólo simular",
+        help_text="Muestra los cambios sin guardarlos",
+    )
+
+    def __init__(self, *args, **kwargs):
+        tenant = kwargs.pop('tenant', None)
+        super().__init__(*args, **kwargs)
+        if tenant is not None:
+            self.fields['supplier'].queryset = Supplier.all_objects.filter(tenant=tenant).order_by('name')
+
+
+class BulkPriceForm(forms.Form):
+    """Alcance y regla de una actualización masiva de precios (pricing.BulkPriceUpdate)."""
+    target = forms.ChoiceField(
+        choices=BulkPriceUpdate.TARGET_CHOICES, label="Actualizar",
+        widget=forms.Select(attrs={'class': WIDGET_BASE}),
+    )
+    mode = forms.ChoiceField(
+        choices=BulkPriceUpdate.MODE_CHOICES, label="Regla",
+        widget=forms.Select(attrs={'class': WIDGET_BASE}),
+    )
+    value = forms.DecimalField(
+        max_digits=10, decimal_places=2, label="Valor",
+        help_text="Porcentaje (5 = +5%, -10 = -10%), monto en pesos o margen objetivo",
+        widget=forms.NumberInput(attrs={'class': WIDGET_BASE, 'step': '0.01'}),
+    )
+    rounding = forms.ChoiceField(
+        choices=BulkPriceUpdate.ROUNDING_CHOICES, label="Redondeo del precio",
+        widget=forms.Select(attrs={'class': WIDGET_BASE}),
+    )
+    categories = forms.ModelMultipleChoiceField(
+        queryset=Category.objects.none(), required=False, label="Categorías",
+        widget=forms.SelectMultiple(attrs={'class': WIDGET_BASE, 'size': 5}),
+    )
+    brands = forms.ModelMultipleChoiceField(
+        queryset=Brand.objects.none(), required=False, label="Marcas",
+        widget=forms.SelectMultiple(attrs={'class': WIDGET_BASE, 'size': 5}),
+    )
+    suppliers = forms.ModelMultipleChoiceField(
+        queryset=Supplier.objects.none(), required=False, label="Proveedores",
+        widget=forms.SelectMultiple(attrs={'class': WIDGET_BASE, 'size': 5}),
+    )
+    skus = forms.CharField(
+        required=False, label="SKUs", help_text="Uno por línea o separados por coma",
+        widget=forms.Textarea(attrs={'class': WIDGET_BASE, 'rows': 5}),
+    )
+    reference = forms.CharField(
+        max_length=100, required=False, label="Referencia",
+        widget=forms.TextInput(attrs={'class': WIDGET_BASE, 'placeholder': 'Ej. Lista proveedor marzo'}),
+    )
+    allow_below_min = forms.BooleanField(
+        required=False, label="Aplicar aunque queden productos bajo su margen mínimo",
+    )
+
+    def __init__(self, *args, **kwargs):
+        self.tenant = kwargs.pop('tenant', None)
+        super().__init__(*args, **kwargs)
+        if self.tenant is not None:
+            self.fields['categories'].queryset = Category.all_objects.filter(tenant=self.tenant).order_by('name')
+            self.fields['brands'].queryset = Brand.all_objects.filter(tenant=self.tenant).order_by('name')
+            self.fields['suppliers'].queryset = Supplier.all_objects.filter(tenant=self.tenant).order_by('name')
+
+    def clean(self):
+        cleaned = super().clean()
+        if self.errors:
+            return cleaned
+        try:
+            self.update = BulkPriceUpdate(
+                self.tenant, cleaned['mode'], cleaned['value'],
+                target=cleaned['target'], rounding=cleaned['rounding'],
+                categories=[c.pk for c in cleaned['categories']],
+                brands=[b.pk for b in cleaned['brands']],
+                suppliers=[s.pk for s in cleaned['suppliers']],
+                skus=cleaned['skus'].replace(',', '\n').splitlines(),
+            )
+        except PricingError as exc:
+            raise forms.ValidationError(str(exc))
+        return cleaned
@@ -0,0 +1,381 @@
+"""
+Importación masiva de productos desde listas de precios de proveedores (CSV).
+
+El archivo se lee en streaming y se procesa por bloques de chunk_size filas.
+Por bloque hay un SELECT de los productos existentes (por SKU) y un único
+INSERT ... ON CONFLICT (tenant, sku) DO UPDATE con las filas nuevas o
+modificadas; las filas sin cambios no se escriben. Los precios nuevos o
+cambiados quedan en el historial (PriceHistory) con un INSERT más. Marcas, proveedores y
+categorías se resuelven contra mapas en memoria (nombre en minúsculas → id)
+cargados una vez; las marcas y categorías que falten se crean en bloque.
+
+Con dry_run no se escribe nada: el informe (ImportReport) trae el diff de lo
+que se crearía o cambiaría y los errores de validación por línea.
+
+Columnas reconocidas (encabezados sin importar mayúsculas ni tildes):
+
+    sku/código, barcode/ean/código de barras, nombre/descripción, marca,
+    proveedor, categoría, especie, precio, costo, margen mínimo, peso,
+    stock mínimo
+
+Sólo se actualizan las columnas presentes en el archivo, y una celda vacía
+deja el valor actual (en un producto nuevo, el por defecto). El stock no se
+importa: los ingresos de mercadería pasan por el libro de movimientos. Las
+columnas no reconocidas (stock incluido) se ignoran y quedan en el informe.
+Los proveedores deben existir (por nombre o RUT); uno desconocido es un
+error de la fila, o se puede fijar un proveedor para todo el archivo.
+
+    report = ProductImporter(tenant, dry_run=True).run(open('lista.csv', encoding='utf-8-sig'))
+"""
+import csv
+import re
+import unicodedata
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Brand, Category, PriceHistory, Product, Supplier
+from .pricing import record_prices
+from .signals import products_bulk_changed
+
+CHUNK_SIZE = 1000
+MAX_DETAILS = 200  # changes and errors kept in the report (counts are always complete)
+
+# Normalized header → field
+HEADER_ALIASES = {
+    'sku': 'sku', 'codigo': 'sku', 'cod': 'sku', 'codigo interno': 'sku',
+    'barcode': 'barcode', 'ean': 'barcode', 'codigo de barras': 'barcode',
+    'name': 'name', 'nombre': 'name', 'descripcion': 'name', 'producto': 'name',
+    'brand': 'brand', 'marca': 'brand',
+    'supplier': 'supplier', 'proveedor': 'supplier',
+    'category': 'category', 'categoria': 'category',
+    'species': 'species', 'especie': 'species',
+    'price': 'price_clp', 'precio': 'price_clp', 'precio venta': 'price_clp', 'price_clp': 'price_clp',
+    'cost': 'cost_clp', 'costo': 'cost_clp', 'costo neto': 'cost_clp', 'cost_clp': 'cost_clp',
+    'min_margin': 'min_margin_pct', 'margen minimo': 'min_margin_pct', 'min_margin_pct': 'min_margin_pct',
+    'weight_kg': 'weight_kg', 'peso': 'weight_kg', 'peso kg': 'weight_kg',
+    'min_stock': 'min_stock_alert', 'stock minimo': 'min_stock_alert', 'min_stock_alert': 'min_stock_alert',
+}
+
+# Plain fields written as-is; brand/supplier/category are resolved to FKs
+VALUE_FIELDS = ['barcode', 'name', 'species', 'price_clp', 'cost_clp',
+                'min_margin_pct', 'weight_kg', 'min_stock_alert']
+RELATED_FIELDS = ['brand', 'supplier', 'category']
+COLUMNS = VALUE_FIELDS + ['brand_name'] + [f'{field}_id' for field in RELATED_FIELDS]
+REQUIRED_FOR_NEW = ['name', 'category', 'price_clp']
+
+_THOUSANDS = re.compile(r'^-?\d{1,3}(\.\d{3})+$')
+
+
+class ImportFileError(Exception):
+    """El archivo no se puede importar (sin encabezado o sin columna SKU)."""
+
+
+class ImportReport:
+    """Resultado de una importación (o de su simulación)."""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.new_brands = []
+        self.new_categories = []
+        self.changes = []  # (línea, sku, 'new'|'update', {campo: (antes, después)})
+        self.errors = []   # (línea, sku, mensaje)
+        self.ignored_columns = []  # encabezados del archivo que no se importan
+
+    @property
+    def total(self):
+        return self.created + self.updated + self.unchanged + self.failed
+
+    def add_change(self, line, sku, action, diff):
+        if len(self.changes) < MAX_DETAILS:
+            self.changes.append((line, sku, action, {
+                column.removesuffix('_id'): change for column, change in diff.items()
+            }))
+
+    def add_error(self, line, sku, message):
+        self.failed += 1
+        if len(self.errors) < MAX_DETAILS:
+            self.errors.append((line, sku, message))
+
+
+def normalize_header(text):
+    text = unicodedata.normalize('NFKD', text.strip().lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r'[\s_.()%-]+', ' ', text).strip()
+
+
+def parse_number(text):
+    """
+    Número en formato chileno o plano: '$12.990' → 12990, '1.234,5' → 1234.5,
+    '2.5' → 2.5. Devuelve Decimal, o None si está vacío.
+    """
+    text = text.replace('$', '').replace(' ', '').strip()
+    if not text:
+        return None
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    elif _THOUSANDS.match(text):
+        text = text.replace('.', '')
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        raise ValidationError(f"'{text}' no es un número.")
+
+
+class ProductImporter:
+    """
+    Importa una lista de productos de un tenant.
+
+    Args:
+        supplier: Supplier que se asigna a todas las filas (anula la columna)
+        dry_run: sólo informar, sin escribir
+        user, reference: para el historial de precios de los productos
+            nuevos o con precio/costo distinto
+    """
+
+    def __init__(self, tenant, supplier=None, dry_run=False, chunk_size=CHUNK_SIZE,
+                 user=None, reference="Importación"):
+        self.tenant = tenant
+        self.supplier = supplier
+        self.dry_run = dry_run
+        self.user = user
+        self.reference = reference
+        self.chunk_size = chunk_size
+        self.report = ImportReport(dry_run)
+        self._seen = set()
+        self._pending = set()
+        self._species = {}
+        for code, label in Product.SPECIES_CHOICES:
+            self._species[code.lower()] = code
+            self._species[normalize_header(label)] = code
+
+    def run(self, stream):
+        """Procesa el archivo (iterable de líneas de texto). Returns: ImportReport."""
+        lines = iter(stream)
+        header_line = next(lines, '')
+        if not header_line.strip():
+            raise ImportFileError("El archivo está vacío.")
+        delimiter = max(',;\t', key=header_line.count)
+        headers = next(csv.reader([header_line], delimiter=delimiter))
+        columns = [HEADER_ALIASES.get(normalize_header(h)) for h in headers]
+        if 'sku' not in columns:
+            raise ImportFileError("El archivo no tiene columna SKU/Código.")
+        self.columns = columns
+        self.report.ignored_columns = [
+            header.strip() for header, column in zip(headers, columns) if column is None and header.strip()
+        ]
+        self.present = {c for c in columns if c}
+        if self.supplier is not None:
+            self.present.add('supplier')
+
+        self._load_maps()
+        reader = csv.reader(lines, delimiter=delimiter)
+        with transaction.atomic():
+            chunk = []
+            for values in reader:
+                if not any(value.strip() for value in values):
+                    continue
+                # line_num counts the header we consumed by hand
+                chunk.append((reader.line_num + 1, values))
+                if len(chunk) >= self.chunk_size:
+                    self._process(chunk)
+                    chunk = []
+            if chunk:
+                self._process(chunk)
+            if not self.dry_run and (self.report.created or self.report.updated):
+                # Bulk writes skip post_save: let the caches drop the tenant once
+                transaction.on_commit(lambda: products_bulk_changed.send(
+                    sender=Product, tenant_id=self.tenant.id,
+                ))
+        return self.report
+
+    # ──────────── Resolución ────────────
+
+    def _load_maps(self):
+        """Mapas nombre (y RUT) → id de marcas, proveedores y categorías."""
+        self.names = {
+            field: dict(model.all_objects.filter(tenant=self.tenant).values_list('id', 'name'))
+            for field, model in (('brand', Brand), ('category', Category), ('supplier', Supplier))
+        }
+        self.brands = {name.lower(): pk for pk, name in self.names['brand'].items()}
+        self.categories = {name.lower(): pk for pk, name in self.names['category'].items()}
+        self.suppliers = {name.lower(): pk for pk, name in self.names['supplier'].items()}
+        for pk, rut in Supplier.all_objects.filter(tenant=self.tenant).exclude(rut='').values_list('id', 'rut'):
+            self.suppliers[rut.replace('.', '').lower()] = pk
+
+    def _create_missing(self, model, mapping, names, created):
+        """Crea en bloque las marcas/categorías que faltan (en simulación sólo las anota)."""
+        missing = {}
+        for name in names:
+            if name and name.lower() not in mapping:
+                missing.setdefault(name.lower(), name)
+        if self.dry_run:
+            # Nothing is created, so later chunks see the same names again
+            missing = {key: name for key, name in missing.items() if key not in self._pending}
+            self._pending.update(missing)
+        if not missing:
+            return
+        created.extend(missing.values())
+        if self.dry_run:
+            return
+        model.all_objects.bulk_create(
+            [model(tenant=self.tenant, name=name) for name in missing.values()],
+            ignore_conflicts=True,
+        )
+        label = 'brand' if model is Brand else 'category'
+        for pk, name in model.all_objects.filter(
+            tenant=self.tenant, name__in=list(missing.values()),
+        ).values_list('id', 'name'):
+            mapping[name.lower()] = pk
+            self.names[label][pk] = name
+
+    # ──────────── Bloques ────────────
+
+    def _parse(self, values):
+        """{campo: valor limpio} de una fila. Raises: ValidationError."""
+        row = {}
+        for column, raw in zip(self.columns, values):
+            if column is None:
+                continue
+            raw = raw.strip()
+            if column in RELATED_FIELDS:
+                row[column] = raw
+            elif column in ('price_clp', 'cost_clp'):
+                number = parse_number(raw)
+                row[column] = None if number is None else int(number.quantize(Decimal('1'), ROUND_HALF_UP))
+            elif column in ('min_margin_pct', 'weight_kg', 'min_stock_alert'):
+                row[column] = parse_number(raw)
+            elif column == 'species':
+                row[column] = self._species.get(normalize_header(raw), raw) if raw else None
+            else:
+                row[column] = raw or None
+
+        sku = row.get('sku')
+        if not sku:
+            raise ValidationError("Fila sin SKU.")
+        if sku in self._seen:
+            raise ValidationError("SKU repetido en el archivo.")
+        self._seen.add(sku)
+
+        for field in VALUE_FIELDS + ['sku']:
+            if row.get(field) is not None:
+                model_field = Product._meta.get_field(field)
+                try:
+                    row[field] = model_field.clean(row[field], None)
+                except ValidationError as exc:
+                    raise ValidationError(f"{model_field.verbose_name}: {'; '.join(exc.messages)}")
+        return row
+
+    def _resolve(self, row):
+        """Columnas brand_id/supplier_id/category_id de las celdas no vacías. Raises: ValidationError."""
+        resolved = {}
+        if row.get('brand'):
+            resolved['brand_id'] = self.brands.get(row['brand'].lower())
+            resolved['brand_name'] = row['brand'][:100]
+        if self.supplier is not None:
+            resolved['supplier_id'] = self.supplier.pk
+        elif row.get('supplier'):
+            name = row['supplier']
+            resolved['supplier_id'] = self.suppliers.get(name.lower()) or self.suppliers.get(
+                name.replace('.', '').lower())
+            if resolved['supplier_id'] is None:
+                raise ValidationError(f"Proveedor desconocido: {name}.")
+        if row.get('category'):
+            resolved['category_id'] = self.categories.get(row['category'].lower())
+        return resolved
+
+    def _process(self, chunk):
+        report = self.report
+        sku_index = self.columns.index('sku')
+        rows = []
+        for line, values in chunk:
+            try:
+                rows.append((line, self._parse(values)))
+            except ValidationError as exc:
+                sku = values[sku_index].strip() if len(values) > sku_index else ''
+                report.add_error(line, sku, '; '.join(exc.messages))
+        if not rows:
+            return
+
+        self._create_missing(Brand, self.brands, {r.get('brand') for _, r in rows}, report.new_brands)
+        self._create_missing(Category, self.categories, {r.get('category') for _, r in rows}, report.new_categories)
+
+        existing = {
+            current['sku']: current
+            for current in Product.all_objects.filter(
+                tenant=self.tenant, sku__in=[row['sku'] for _, row in rows],
+            ).values('sku', *COLUMNS)
+        }
+
+        now = timezone.now()
+        products = []
+        repriced = set()  # SKUs that get a PriceHistory row
+        for line, row in rows:
+            try:
+                # Blank cells leave the current value (or the model default) alone
+                values = {field: row[field] for field in VALUE_FIELDS if row.get(field) is not None}
+                values.update(self._resolve(row))
+            except ValidationError as exc:
+                report.add_error(line, row['sku'], '; '.join(exc.messages))
+                continue
+            current = existing.get(row['sku'])
+
+            if current is None:
+                missing = [field for field in REQUIRED_FOR_NEW if not row.get(field)]
+                if missing:
+                    report.add_error(line, row['sku'], f"Producto nuevo sin: {', '.join(missing)}.")
+                    continue
+                diff = {c: (None, self._display(c, v, row)) for c, v in values.items() if c != 'brand_name'}
+                report.created += 1
+                report.add_change(line, row['sku'], 'new', diff)
+                repriced.add(row['sku'])
+            else:
+                diff = {
+                    c: (self._display(c, current[c]), self._display(c, v, row))
+                    for c, v in values.items()
+                    if c != 'brand_name' and v != current[c]
+                }
+                if not diff:
+                    report.unchanged += 1
+                    continue
+                # Every NOT NULL column must be in the INSERT half of the upsert
+                values = {**{c: current[c] for c in COLUMNS}, **values}
+                report.updated += 1
+                report.add_change(line, row['sku'], 'update', diff)
+                if 'price_clp' in diff or 'cost_clp' in diff:
+                    repriced.add(row['sku'])
+
+            products.append(Product(tenant=self.tenant, sku=row['sku'], modified_at=now, **values))
+
+        if products and not self.dry_run:
+            update_fields = [c for c in COLUMNS if c.replace('_id', '') in self.present]
+            if 'brand' in self.present:
+                update_fields.append('brand_name')
+            Product.all_objects.bulk_create(
+                products, update_conflicts=True,
+                unique_fields=['tenant', 'sku'], update_fields=update_fields + ['modified_at'],
+            )
+            if repriced:
+                ids = dict(Product.all_objects.filter(
+                    tenant=self.tenant, sku__in=list(repriced),
+                ).values_list('sku', 'id'))
+                record_prices(self.tenant.id, [
+                    (ids[product.sku], product.price_clp, product.cost_clp)
+                    for product in products if product.sku in repriced
+                ], PriceHistory.IMPORT, reference=self.reference, user=self.user)
+
+    def _display(self, column, value, row=None):
+        """Valor legible para el diff (nombres en vez de ids)."""
+        if column.endswith('_id'):
+            field = column[:-3]
+            if value is None:
+                # Brand/category still to be created (dry run): show the file's name
+                return (row.get(field) or None) if row is not None else None
+            return self.names[field].get(value, value)
+        return value
@@ -0,0 +1,192 @@
+"""
+Libro de movimientos de stock (StockMovement) y fotos periódicas (StockSnapshot).
+
+Cada cambio de stock deja su movimiento en la misma transacción: ventas y
+anulaciones (CheckoutService), ediciones del producto (ProductForm/admin,
+vía save_with_movement, que también registra los cambios de precio en
+PriceHistory), recepción de lotes (receive_batch) y traspasos entre
+sucursales (branches.py). Los movimientos se escriben siempre en bloque (un
+INSERT por operación).
+
+take_snapshots() guarda, por producto, el saldo acumulado hasta un
+movimiento dado; stock_at() parte de la última foto anterior a la fecha y
+sólo suma los movimientos posteriores. balances() da el saldo actual según
+el libro para todo el tenant (lo usa verify_stock_ledger).
+"""
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from apps.dashboard.cache import invalidate_dashboard
+
+from .models import PriceHistory, Product, StockMovement, StockSnapshot
+
+# Movements younger than this are left for the next snapshot: a transaction
+# still open when the snapshot runs may commit a lower id later.
+SNAPSHOT_LAG = timedelta(minutes=5)
+
+
+def record_movements(tenant_id, kind, lines, reference='', user=None, branch_id=None):
+    """
+    Registra un movimiento por línea con un único INSERT.
+
+    Args:
+        lines: iterable de (product_id, cantidad con signo); se omiten los ceros
+    """
+    movements = [
+        StockMovement(
+            tenant_id=tenant_id, product_id=product_id, branch_id=branch_id, kind=kind,
+            quantity=Decimal(quantity), reference=reference[:100],
+            created_by=user if user and user.is_authenticated else None,
+        )
+        for product_id, quantity in lines
+        if quantity
+    ]
+    if movements:
+        StockMovement.all_objects.bulk_create(movements)
+    return movements
+
+
+def save_with_movement(product, kind=StockMovement.ADJUSTMENT, reference='', user=None,
+                       price_source=PriceHistory.FORM):
+    """
+    Guarda el producto y registra como movimiento la diferencia entre su
+    stock y el de la base (bloqueando la fila, para no pisar ventas en curso).
+    La diferencia se aplica a la sucursal del usuario (o a la principal).
+    Si cambió el precio o el costo (o el producto es nuevo), deja además una
+    fila en el historial de precios con origen price_source. Al confirmar
+    invalida el cache del dashboard del tenant.
+    """
+    from .branches import add_branch_stock, user_branch_id
+    from .pricing import record_prices
+
+    with transaction.atomic():
+        current, price, cost = Decimal('0'), None, None
+        if product.pk:
+            row = Product.all_objects.select_for_update().filter(
+                pk=product.pk,
+            ).values_list('stock', 'price_clp', 'cost_clp').first()
+            if row is not None:
+                current, price, cost = row
+        product.save()
+        delta = Decimal(product.stock) - current
+        if delta:
+            branch_id = user_branch_id(user, product.tenant_id)
+            if branch_id:
+                add_branch_stock(product.tenant_id, branch_id, [(product.pk, delta)])
+            record_movements(
+                product.tenant_id, kind, [(product.pk, delta)],
+                reference=reference, user=user, branch_id=branch_id,
+            )
+        if (product.price_clp, product.cost_clp) != (price, cost):
+            record_prices(
+                product.tenant_id, [(product.pk, product.price_clp, product.cost_clp)],
+                price_source, reference=reference, user=user,
+            )
+        transaction.on_commit(partial(invalidate_dashboard, product.tenant_id))
+    return product
+
+
+def receive_batch(batch, user=None, reference=''):
+    """
+    Guarda el lote; si es nuevo, su saldo (current_quantity) entra como
+    recepción: se suma al stock del producto y de la sucursal del usuario (o
+    de la principal) y queda un movimiento RECEIPT. Editar un lote existente
+    no mueve stock.
+    """
+    from .branches import add_branch_stock, user_branch_id
+
+    with transaction.atomic():
+        created = batch.pk is None
+        if not batch.tenant_id:
+            batch.tenant_id = batch.product.tenant_id
+        batch.save()
+        quantity = Decimal(batch.current_quantity or 0)
+        if created and quantity:
+            Product.all_objects.filter(pk=batch.product_id).update(
+                stock=F('stock') + quantity, modified_at=timezone.now(),
+            )
+            branch_id = user_branch_id(user, batch.tenant_id)
+            if branch_id:
+                add_branch_stock(batch.tenant_id, branch_id, [(batch.product_id, quantity)])
+            record_movements(
+                batch.tenant_id, StockMovement.RECEIPT, [(batch.product_id, quantity)],
+                reference=reference or f"Lote {batch.batch_number}", user=user, branch_id=branch_id,
+            )
+            transaction.on_commit(partial(invalidate_dashboard, batch.tenant_id))
+    return batch
+
+
+def stock_at(product, when):
+    """Stock del producto a la fecha when: última foto previa + movimientos posteriores."""
+    snapshot = StockSnapshot.all_objects.filter(
+        product=product, taken_at__lte=when,
+    ).order_by('-taken_at', '-id').values_list('stock', 'last_movement_id').first()
+    stock, after = snapshot or (Decimal('0'), 0)
+    delta = StockMovement.all_objects.filter(
+        product=product, id__gt=after, created_at__lte=when,
+    ).aggregate(total=Sum('quantity'))['total']
+    return stock + (delta or 0)
+
+
+def _last_run(tenant_id):
+    """(last_movement_id, {product_id: stock}) de la última toma de fotos del tenant."""
+    mark = StockSnapshot.all_objects.filter(tenant_id=tenant_id).aggregate(
+        mark=Max('last_movement_id'),
+    )['mark']
+    if mark is None:
+        return 0, {}
+    return mark, dict(StockSnapshot.all_objects.filter(
+        tenant_id=tenant_id, last_movement_id=mark,
+    ).values_list('product_id', 'stock'))
+
+
+def _movement_totals(tenant_id, after, upto=None):
+    """{product_id: suma} de los movimientos del tenant con after < id <= upto."""
+    movements = StockMovement.all_objects.filter(tenant_id=tenant_id, id__gt=after)
+    if upto is not None:
+        movements = movements.filter(id__lte=upto)
+    return dict(
+        movements.values('product_id').annotate(total=Sum('quantity'))
+        .values_list('product_id', 'total').order_by()
+    )
+
+
+def balances(tenant_id):
+    """Saldo actual de cada producto con movimientos, según el libro."""
+    mark, stocks = _last_run(tenant_id)
+    for product_id, total in _movement_totals(tenant_id, mark).items():
+        stocks[product_id] = stocks.get(product_id, Decimal('0')) + total
+    return stocks
+
+
+def take_snapshots(tenant_id, now=None):
+    """
+    Foto de todos los productos con movimientos, incremental respecto de la
+    anterior: sólo se agregan los movimientos nuevos (una consulta agrupada).
+    Deja fuera los movimientos de los últimos SNAPSHOT_LAG.
+
+    Returns: número de fotos creadas (0 si no hubo movimientos nuevos).
+    """
+    cutoff = (now or timezone.now()) - SNAPSHOT_LAG
+    upto = StockMovement.all_objects.filter(
+        tenant_id=tenant_id, created_at__lte=cutoff,
+    ).aggregate(mark=Max('id'))['mark']
+    mark, stocks = _last_run(tenant_id)
+    if upto is None or upto <= mark:
+        return 0
+
+    for product_id, total in _movement_totals(tenant_id, mark, upto).items():
+        stocks[product_id] = stocks.get(product_id, Decimal('0')) + total
+    StockSnapshot.all_objects.bulk_create([
+        StockSnapshot(
+            tenant_id=tenant_id, product_id=product_id,
+            taken_at=cutoff, last_movement_id=upto, stock=stock,
+        )
+        for product_id, stock in stocks.items()
+    ], batch_size=1000)
+    return len(stocks)
@@ -0,0 +1,110 @@
+"""
+ProductListing — listado paginado del catálogo de inventario.
+
+Paginación keyset (cursor) sobre (name, id): cada página es
+`WHERE (name, id) > (último_name, último_id) ORDER BY name, id LIMIT n`,
+que recorre el índice inv_product_tenant_name_id sin OFFSET, así que la
+página 400 cuesta lo mismo que la primera. Marca, categoría y proveedor
+vienen en el mismo SELECT (select_related).
+
+Filtros (todos dentro del tenant):
+  species      → índice (tenant, species, name, id)
+  category     → índice (tenant, category, name, id)
+  low_stock    → índice parcial (tenant, name, id) WHERE stock <= min_stock_alert
+  below_margin → ProductQuerySet.below_min_margin() (se evalúa sobre el
+                 recorrido por nombre; no es indexable porque depende de
+                 precio, costo e IVA del tenant)
+"""
+import base64
+import json
+
+from django.db.models import F, Q
+
+from .models import Product
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(product):
+    raw = json.dumps([product.name, product.pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(name, id) del cursor, o None si está vacío o mal formado."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        name, pk = json.loads(base64.urlsafe_b64decode(padded))
+        return str(name), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+class ProductListing:
+    """Páginas de productos de un tenant, filtradas y ordenadas por (name, id)."""
+
+    def __init__(self, tenant=None, species=None, category=None,
+                 low_stock=False, below_margin=False):
+        self.tenant = tenant
+        self.species = species or None
+        self.category = category or None
+        self.low_stock = bool(low_stock)
+        self.below_margin = bool(below_margin)
+
+    @classmethod
+    def from_params(cls, tenant, params):
+        """Construye el listado desde request.GET."""
+        category = params.get('category')
+        return cls(
+            tenant,
+            species=params.get('species') or None,
+            category=int(category) if category and category.isdigit() else None,
+            low_stock=params.get('low_stock') == '1',
+            below_margin=params.get('below_margin') == '1',
+        )
+
+    def querystring(self):
+        """Filtros activos como dict (para armar la URL de la página siguiente)."""
+        params = {}
+        if self.species:
+            params['species'] = self.species
+        if self.category:
+            params['category'] = self.category
+        if self.low_stock:
+            params['low_stock'] = '1'
+        if self.below_margin:
+            params['below_margin'] = '1'
+        return params
+
+    def queryset(self):
+        if self.tenant is not None:
+            qs = Product.all_objects.filter(tenant=self.tenant)
+        else:
+            qs = Product.objects.all()
+        if self.species:
+            qs = qs.filter(species=self.species)
+        if self.category:
+            qs = qs.filter(category_id=self.category)
+        if self.low_stock:
+            qs = qs.filter(stock__lte=F('min_stock_alert'))
+        qs = qs.with_margin(iva_rate=self.tenant.iva_rate if self.tenant else None)
+        if self.below_margin:
+            qs = qs.below_min_margin()
+        return qs.select_related('brand', 'category', 'supplier').order_by('name', 'id')
+
+    def page(self, cursor=None, size=PAGE_SIZE):
+        """
+        Returns: (productos, cursor_siguiente) — cursor_siguiente es None en la
+        última página.
+        """
+        qs = self.queryset()
+        after = decode_cursor(cursor)
+        if after is not None:
+            name, pk = after
+            qs = qs.filter(Q(name__gt=name) | Q(name=name, id__gt=pk))
+        rows = list(qs[:size + 1])
+        if len(rows) > size:
+            return rows[:size], encode_cursor(rows[size - 1])
+        return rows, None
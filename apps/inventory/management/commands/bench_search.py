@@ -0,0 +1,128 @@
+"""
+Benchmark de la búsqueda de productos de la caja: compara la consulta
+histórica (tres icontains con OR + distinct) contra ProductSearch.
+
+Con --seed N crea un catálogo sintético de N productos dentro de una
+transacción que se revierte al final.
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+TARGET_P95_MS = 20
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_search(tenant, query):
+    from apps.inventory.models import Product
+
+    qs = Product.all_objects.filter(tenant=tenant)
+    products = (
+        qs.filter(name__icontains=query, stock__gt=0)
+        | qs.filter(sku__icontains=query, stock__gt=0)
+        | qs.filter(barcode__icontains=query, stock__gt=0)
+    )
+    return list(products.distinct()[:12])
+
+
+class Command(BaseCommand):
+    help = 'Mide p50/p95 de la búsqueda de productos (histórica vs indexada)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Crear N productos sintéticos (se revierten al final)')
+        parser.add_argument('--runs', type=int, default=50,
+                            help='Repeticiones por término (default: 50)')
+        parser.add_argument('--tenant', type=int, default=None,
+                            help='ID del tenant (default: primero activo)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        from apps.inventory.models import Product
+        from apps.inventory.search import ProductSearch
+        from apps.tenants.models import Tenant
+
+        if options['tenant']:
+            tenant = Tenant.objects.get(id=options['tenant'])
+        else:
+            tenant = Tenant.objects.filter(is_active=True).first()
+
+        if options['seed']:
+            self._seed(tenant, options['seed'])
+
+        sample = list(
+            Product.all_objects.filter(tenant=tenant, stock__gt=0)
+            .exclude(barcode__isnull=True).values_list('name', 'sku', 'barcode')[:200]
+        )
+        if not sample:
+            self.stderr.write("No hay productos para medir (use --seed).")
+            return
+
+        rng = random.Random(42)
+        terms = []
+        for name, sku, barcode in rng.sample(sample, min(10, len(sample))):
+            terms += [barcode, sku, name.split()[0][:4], name[:8]]
+
+        search = ProductSearch(tenant)
+        rows = [
+            ('histórica', lambda q: legacy_search(tenant, q)),
+            ('indexada', search.search),
+        ]
+        self.stdout.write(f"Catálogo: {Product.all_objects.filter(tenant=tenant).count()} productos, "
+                          f"{len(terms)} términos x {options['runs']} repeticiones")
+        for label, fn in rows:
+            timings = []
+            for _ in range(options['runs']):
+                for term in terms:
+                    started = time.perf_counter()
+                    fn(term)
+                    timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p50 = statistics.median(timings)
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            style = self.style.SUCCESS if p95 < TARGET_P95_MS else self.style.WARNING
+            self.stdout.write(style(f"{label:<10} p50={p50:6.2f} ms  p95={p95:6.2f} ms"))
+
+    def _seed(self, tenant, count):
+        from apps.inventory.ledger import record_movements
+        from apps.inventory.models import Category, PriceHistory, Product, StockMovement
+        from apps.inventory.pricing import record_prices
+
+        words = ['Alimento', 'Arena', 'Snack', 'Collar', 'Juguete', 'Shampoo',
+                 'Adulto', 'Cachorro', 'Senior', 'Pollo', 'Salmón', 'Cordero',
+                 'Premium', 'Light', 'Gato', 'Perro', 'Granel', 'Kg']
+        rng = random.Random(7)
+        category, _ = Category.all_objects.get_or_create(tenant=tenant, name='Bench')
+        products = Product.all_objects.bulk_create([
+            Product(
+                tenant=tenant, category=category,
+                sku=f'BS{i:06d}', barcode=f'780{i:010d}',
+                name=' '.join(rng.sample(words, 4)),
+                price_clp=rng.randint(500, 60000), stock=rng.randint(0, 50),
+            )
+            for i in range(count)
+        ], batch_size=2000)
+        record_movements(
+            tenant.id, StockMovement.ADJUSTMENT,
+            [(product.pk, product.stock) for product in products], reference='Saldo inicial',
+        )
+        record_prices(
+            tenant.id, [(product.pk, product.price_clp, product.cost_clp) for product in products],
+            PriceHistory.INITIAL, reference='Precio inicial',
+        )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE inventory_product')
@@ -0,0 +1,82 @@
+"""
+Importa (o simula) una lista de precios de proveedor en CSV:
+
+    python manage.py import_products lista.csv --tenant 3 --dry-run
+    python manage.py import_products lista.csv --tenant 3 --supplier "Distribuidora Sur"
+
+Con --dry-run muestra el diff (productos nuevos, campos que cambian y errores
+por línea) sin escribir nada. Ver apps/inventory/importer.py.
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Importa productos desde un CSV de proveedor (upsert por SKU)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo CSV (separado por coma, punto y coma o tabulación)')
+        parser.add_argument('--tenant', type=int, required=True, help='ID del tenant')
+        parser.add_argument('--supplier', help='Proveedor (nombre o RUT) para todas las filas')
+        parser.add_argument('--dry-run', action='store_true', help='Sólo mostrar los cambios')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--encoding', default='utf-8-sig', help='Codificación (p. ej. latin-1)')
+
+    def handle(self, *args, **options):
+        from apps.tenants.models import Tenant
+        from apps.inventory.importer import ImportFileError, ProductImporter
+        from apps.inventory.models import Supplier
+
+        tenant = Tenant.objects.filter(id=options['tenant']).first()
+        if tenant is None:
+            raise CommandError(f"Tenant {options['tenant']} no existe.")
+
+        supplier = None
+        if options['supplier']:
+            text = options['supplier']
+            supplier = (
+                Supplier.all_objects.filter(tenant=tenant, name__iexact=text).first()
+                or Supplier.all_objects.filter(tenant=tenant, rut=text).first()
+            )
+            if supplier is None:
+                raise CommandError(f"Proveedor '{text}' no existe.")
+
+        importer = ProductImporter(
+            tenant, supplier=supplier, dry_run=options['dry_run'], chunk_size=options['chunk_size'],
+            reference=f"Importación {os.path.basename(options['path'])}",
+        )
+        started = time.perf_counter()
+        try:
+            with open(options['path'], encoding=options['encoding'], newline='') as stream:
+                report = importer.run(stream)
+        except (OSError, UnicodeDecodeError, ImportFileError) as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        if report.ignored_columns:
+            self.stdout.write(self.style.WARNING(
+                f"Columnas ignoradas: {', '.join(report.ignored_columns)}"
+            ))
+        for line, sku, action, diff in report.changes:
+            label = 'NUEVO' if action == 'new' else 'CAMBIA'
+            fields = ', '.join(f"{field}: {old} → {new}" if action == 'update' else f"{field}={new}"
+                               for field, (old, new) in diff.items())
+            self.stdout.write(f"  {line:>6}  {label:<7}{sku:<20}{fields}")
+        for line, sku, message in sorted(report.errors):
+            self.stdout.write(self.style.WARNING(f"  {line:>6}  ERROR  {sku:<20}{message}"))
+        if report.new_brands:
+            self.stdout.write(f"Marcas nuevas: {', '.join(report.new_brands)}")
+        if report.new_categories:
+            self.stdout.write(f"Categorías nuevas: {', '.join(report.new_categories)}")
+
+        verb = 'se crearían' if report.dry_run else 'creados'
+        summary = (
+            f"{report.total} filas en {elapsed:.1f}s: {report.created} {verb}, "
+            f"{report.updated} con cambios, {report.unchanged} sin cambios, {report.failed} con errores"
+        )
+        if report.dry_run:
+            self.stdout.write(self.style.NOTICE(f"[simulación] {summary}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
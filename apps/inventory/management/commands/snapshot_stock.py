@@ -0,0 +1,31 @@
+"""
+Toma una foto del stock por producto a partir del libro de movimientos
+(incremental: sólo suma los movimientos desde la foto anterior). Pensado para
+correr periódicamente (cron), por ejemplo cada noche:
+
+    python manage.py snapshot_stock
+    python manage.py snapshot_stock --tenant 3
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Guarda fotos de stock (StockSnapshot) desde el libro de movimientos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='ID del tenant (default: todos)')
+
+    def handle(self, *args, **options):
+        from apps.tenants.models import Tenant
+        from apps.inventory.ledger import take_snapshots
+
+        tenants = Tenant.objects.all()
+        if options['tenant']:
+            tenants = tenants.filter(id=options['tenant'])
+            if not tenants.exists():
+                raise CommandError(f"Tenant {options['tenant']} no existe.")
+
+        for tenant in tenants:
+            rows = take_snapshots(tenant.id)
+            self.stdout.write(f"{tenant.name}: {rows} fotos")
+        self.stdout.write(self.style.SUCCESS("Fotos de stock guardadas."))
@@ -0,0 +1,86 @@
+"""
+Verifica Product.stock contra el libro de movimientos (última foto +
+movimientos posteriores).
+
+    python manage.py verify_stock_ledger
+    python manage.py verify_stock_ledger --tenant 3 --fix
+
+Con --fix reescribe Product.stock con el saldo del libro. También informa
+los productos cuyo stock por sucursal (BranchStock) no suma el total; esos
+no se corrigen solos (hay que decidir en qué sucursal está la diferencia).
+"""
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, Sum, When
+
+
+class Command(BaseCommand):
+    help = 'Compara el stock de cada producto con su libro de movimientos (y opcionalmente lo corrige)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='ID del tenant (default: todos)')
+        parser.add_argument('--fix', action='store_true', help='Reescribir Product.stock desde el libro')
+
+    def handle(self, *args, **options):
+        from apps.tenants.models import Tenant
+        from apps.inventory.ledger import balances
+        from apps.inventory.models import BranchStock, Product
+
+        tenants = Tenant.objects.all()
+        if options['tenant']:
+            tenants = tenants.filter(id=options['tenant'])
+            if not tenants.exists():
+                raise CommandError(f"Tenant {options['tenant']} no existe.")
+
+        checked = mismatched = unsplit = 0
+        for tenant in tenants:
+            with transaction.atomic():
+                # Lock in id order (like checkout) so no sale moves stock mid-check
+                stocks = dict(
+                    Product.all_objects.select_for_update().filter(tenant=tenant)
+                    .order_by('id').values_list('id', 'stock')
+                )
+                ledger = balances(tenant.id)
+                if tenant.branches.exists():
+                    split = dict(
+                        BranchStock.all_objects.filter(tenant=tenant)
+                        .values('product_id').annotate(total=Sum('stock'))
+                        .values_list('product_id', 'total').order_by()
+                    )
+                    for product_id, stock in stocks.items():
+                        branches_total = split.get(product_id, Decimal('0'))
+                        if branches_total != ledger.get(product_id, Decimal('0')):
+                            unsplit += 1
+                            self.stdout.write(self.style.WARNING(
+                                f"  {tenant.name}: producto {product_id} suma {branches_total} "
+                                f"en sucursales y {ledger.get(product_id, Decimal('0'))} en el libro"
+                            ))
+                diff = {
+                    product_id: (stock, ledger.get(product_id, Decimal('0')))
+                    for product_id, stock in stocks.items()
+                    if stock != ledger.get(product_id, Decimal('0'))
+                }
+                checked += len(stocks)
+                if not diff:
+                    continue
+                mismatched += len(diff)
+                self.stdout.write(self.style.WARNING(f"{tenant.name}:"))
+                for product_id, (actual, expected) in diff.items():
+                    self.stdout.write(f"  producto {product_id}: {actual} → {expected}")
+                if options['fix']:
+                    Product.all_objects.filter(id__in=list(diff)).update(stock=Case(
+                        *[When(id=product_id, then=expected)
+                          for product_id, (_, expected) in diff.items()],
+                        output_field=Product._meta.get_field('stock'),
+                    ))
+
+        summary = f"{checked} productos revisados, {mismatched} con diferencias"
+        if unsplit:
+            raise CommandError(f"{summary}; {unsplit} con stock por sucursal descuadrado")
+        if mismatched and not options['fix']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(
+            summary + (" (corregidos)" if mismatched else "")
+        ))
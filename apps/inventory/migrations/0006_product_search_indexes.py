@@ -0,0 +1,54 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:40 (manually extended)
+
+from django.db import migrations, models
+
+
+# PostgreSQL-only search indexes (SQLite dev/test DBs skip them):
+#   - trigram GIN over UPPER(name): serves name__icontains (UPPER(name) LIKE '%q%')
+#   - text_pattern_ops btree over UPPER(sku): serves sku__istartswith
+#   - text_pattern_ops btree over barcode: serves barcode__startswith
+POSTGRES_SEARCH_INDEXES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS inv_product_name_trgm '
+    'ON inventory_product USING gin (UPPER(name) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS inv_product_sku_prefix '
+    'ON inventory_product (tenant_id, UPPER(sku) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS inv_product_barcode_prefix '
+    'ON inventory_product (tenant_id, barcode text_pattern_ops)',
+]
+
+POSTGRES_SEARCH_INDEXES_REVERSE = [
+    'DROP INDEX IF EXISTS inv_product_name_trgm',
+    'DROP INDEX IF EXISTS inv_product_sku_prefix',
+    'DROP INDEX IF EXISTS inv_product_barcode_prefix',
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in POSTGRES_SEARCH_INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in POSTGRES_SEARCH_INDEXES_REVERSE:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_product_brand_name_product_bulk_price_per_kg_and_more'),
+        ('tenants', '0002_default_tenant'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['tenant', 'barcode'], name='inv_product_tenant_barcode'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
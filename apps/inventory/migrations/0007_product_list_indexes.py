@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_product_search_indexes'),
+        ('tenants', '0003_tenant_timezone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['tenant', 'name', 'id'], name='inv_product_tenant_name_id'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['tenant', 'species', 'name', 'id'], name='inv_product_species_name'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['tenant', 'category', 'name', 'id'], name='inv_product_category_name'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__lte', models.F('min_stock_alert'))), fields=['tenant', 'name', 'id'], name='inv_product_low_stock'),
+        ),
+    ]
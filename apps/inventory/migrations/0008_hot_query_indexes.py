@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_product_list_indexes'),
+        ('tenants', '0003_tenant_timezone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(condition=models.Q(('current_quantity__gt', 0)), fields=['tenant', 'expiration_date'], name='inv_batch_remaining_exp'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__lte', models.F('min_stock_alert'))), fields=['tenant', 'stock'], name='inv_product_low_stock_alert'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def opening_balances(apps, schema_editor):
+    """Un ajuste inicial por producto con stock, para que el libro cuadre con Product.stock."""
+    Product = apps.get_model('inventory', 'Product')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            tenant_id=tenant_id, product_id=product_id, kind='ADJUSTMENT',
+            quantity=stock, reference='Saldo inicial',
+        )
+        for product_id, tenant_id, stock in Product.objects.exclude(stock=0)
+        .values_list('id', 'tenant_id', 'stock').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_hot_query_indexes'),
+        ('tenants', '0003_tenant_timezone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Creado el')),
+                ('modified_at', models.DateTimeField(auto_now=True, verbose_name='Modificado el')),
+                ('kind', models.CharField(choices=[('SALE', 'Venta'), ('VOID', 'Anulación'), ('RECEIPT', 'Recepción'), ('ADJUSTMENT', 'Ajuste'), ('TRANSFER', 'Traspaso')], max_length=12, verbose_name='Tipo')),
+                ('quantity', models.DecimalField(decimal_places=3, max_digits=12, verbose_name='Cantidad')),
+                ('reference', models.CharField(blank=True, max_length=100, verbose_name='Referencia')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='inventory.product')),
+                ('tenant', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_set', to='tenants.tenant', verbose_name='Tienda')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de stock',
+                'verbose_name_plural': 'Movimientos de stock',
+                'indexes': [models.Index(fields=['product', 'created_at', 'id'], name='inv_movement_product_time'), models.Index(fields=['tenant', 'id'], name='inv_movement_tenant_id')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Creado el')),
+                ('modified_at', models.DateTimeField(auto_now=True, verbose_name='Modificado el')),
+                ('taken_at', models.DateTimeField(verbose_name='Fecha')),
+                ('last_movement_id', models.BigIntegerField()),
+                ('stock', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='inventory.product')),
+                ('tenant', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_set', to='tenants.tenant', verbose_name='Tienda')),
+            ],
+            options={
+                'verbose_name': 'Foto de stock',
+                'verbose_name_plural': 'Fotos de stock',
+                'indexes': [models.Index(fields=['product', 'taken_at'], name='inv_snapshot_product_time'), models.Index(fields=['tenant', 'last_movement_id'], name='inv_snapshot_tenant_mark')],
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_main_branches(apps, schema_editor):
+    """Todo el stock actual queda en la sucursal principal de cada tenant que tenga sucursales."""
+    Branch = apps.get_model('tenants', 'Branch')
+    BranchStock = apps.get_model('inventory', 'BranchStock')
+    Product = apps.get_model('inventory', 'Product')
+    main = {}
+    for branch_id, tenant_id in Branch.objects.order_by('-is_main', 'id').values_list('id', 'tenant_id'):
+        main.setdefault(tenant_id, branch_id)
+    BranchStock.objects.bulk_create([
+        BranchStock(tenant_id=tenant_id, branch_id=main[tenant_id], product_id=product_id, stock=stock)
+        for product_id, tenant_id, stock in Product.objects.exclude(stock=0)
+        .values_list('id', 'tenant_id', 'stock').iterator()
+        if tenant_id in main
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_stock_ledger'),
+        ('tenants', '0003_tenant_timezone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tenants.branch', verbose_name='Sucursal'),
+        ),
+        migrations.CreateModel(
+            name='BranchStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Creado el')),
+                ('modified_at', models.DateTimeField(auto_now=True, verbose_name='Modificado el')),
+                ('stock', models.DecimalField(decimal_places=3, default=0, max_digits=10, verbose_name='Stock')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stocks', to='tenants.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='branch_stocks', to='inventory.product')),
+                ('tenant', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_set', to='tenants.tenant', verbose_name='Tienda')),
+            ],
+            options={
+                'verbose_name': 'Stock por sucursal',
+                'verbose_name_plural': 'Stock por sucursal',
+                'constraints': [models.UniqueConstraint(fields=('branch', 'product'), name='inv_branch_stock_unique')],
+            },
+        ),
+        migrations.RunPython(seed_main_branches, migrations.RunPython.noop),
+    ]
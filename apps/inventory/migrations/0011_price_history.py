@@ -0,0 +1,51 @@
+# Generated by Django 6.0.2 on 2026-10-18 19:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def initial_prices(apps, schema_editor):
+    """Una fila inicial por producto: el historial parte del precio y costo actuales."""
+    Product = apps.get_model('inventory', 'Product')
+    PriceHistory = apps.get_model('inventory', 'PriceHistory')
+    PriceHistory.objects.bulk_create([
+        PriceHistory(
+            tenant_id=tenant_id, product_id=product_id, price_clp=price,
+            cost_clp=cost, source='INITIAL', reference='Precio inicial',
+        )
+        for product_id, tenant_id, price, cost in Product.objects
+        .values_list('id', 'tenant_id', 'price_clp', 'cost_clp').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_branch_stock'),
+        ('tenants', '0003_tenant_timezone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Creado el')),
+                ('modified_at', models.DateTimeField(auto_now=True, verbose_name='Modificado el')),
+                ('price_clp', models.IntegerField(verbose_name='Precio Venta (CLP)')),
+                ('cost_clp', models.IntegerField(verbose_name='Costo Neto (CLP)')),
+                ('source', models.CharField(choices=[('INITIAL', 'Precio inicial'), ('BULK', 'Actualización masiva')], max_length=10, verbose_name='Origen')),
+                ('reference', models.CharField(blank=True, max_length=100, verbose_name='Referencia')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='inventory.product')),
+                ('tenant', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_set', to='tenants.tenant', verbose_name='Tienda')),
+            ],
+            options={
+                'verbose_name': 'Historial de precio',
+                'verbose_name_plural': 'Historial de precios',
+            },
+        ),
+        migrations.RunPython(initial_prices, migrations.RunPython.noop),
+    ]
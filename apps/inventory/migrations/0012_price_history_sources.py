@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-18 21:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_price_history'),
+        ('tenants', '0003_tenant_timezone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pricehistory',
+            name='source',
+            field=models.CharField(choices=[('INITIAL', 'Precio inicial'), ('FORM', 'Edición de producto'), ('ADMIN', 'Edición en admin'), ('IMPORT', 'Importación'), ('BULK', 'Actualización masiva')], max_length=10, verbose_name='Origen'),
+        ),
+        migrations.AddIndex(
+            model_name='pricehistory',
+            index=models.Index(fields=['product', 'created_at', 'id'], name='inv_price_product_time'),
+        ),
+        migrations.AddIndex(
+            model_name='pricehistory',
+            index=models.Index(fields=['tenant', 'created_at'], name='inv_price_tenant_time'),
+        ),
+    ]
@@ -1,4 +1,10 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
+from django.db.models.lookups import GreaterThan
+
+from apps.core.managers import TenantManager
 from apps.core.models import TenantAwareModel
 
 
@@ -47,6 +53,42 @@ class Category(TenantAwareModel):
         unique_together = ('tenant', 'name')
 
 
+def margin_expression(price, cost, iva):
+    """
+    Margen % sobre costo del precio neto (precio sin IVA), como expresión
+    float sin redondear; 0 si el costo no es positivo. price, cost e iva son
+    expresiones (p. ej. F('price_clp') o un precio propuesto).
+    """
+    # Float arithmetic: SQLite would truncate integer/decimal quotients
+    net_price = Cast(price, FloatField()) * 100 / (iva + 100)
+    cost = Cast(cost, FloatField())
+    return Case(
+        When(GreaterThan(cost, 0), then=(net_price - cost) * 100 / cost),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    """Margen calculado en SQL para filtrar, ordenar y contar sin cargar productos."""
+
+    def with_margin(self, iva_rate=None):
+        """
+        Anota `margin`: margen % sobre costo del precio neto (precio sin IVA),
+        sin redondear (float); 0 si el producto no tiene costo.
+
+        El IVA es el iva_rate del tenant de cada producto; pasar iva_rate
+        (p. ej. tenant.iva_rate) evita el JOIN con tenants.
+        """
+        iva = Value(float(iva_rate)) if iva_rate is not None else Cast('tenant__iva_rate', FloatField())
+        return self.annotate(margin=margin_expression(F('price_clp'), F('cost_clp'), iva))
+
+    def below_min_margin(self, iva_rate=None):
+        """Productos con costo cargado cuyo margen actual está bajo min_margin_pct."""
+        qs = self if 'margin' in self.query.annotations else self.with_margin(iva_rate)
+        return qs.filter(cost_clp__gt=0, margin__lt=Cast('min_margin_pct', FloatField()))
+
+
 class Product(TenantAwareModel):
     SPECIES_CHOICES = [
         ('DOG', 'Perro'),
@@ -126,6 +168,9 @@ class Product(TenantAwareModel):
     # Imagen
     image = models.ImageField(upload_to='products/', blank=True)
 
+    objects = TenantManager.from_queryset(ProductQuerySet)()
+    all_objects = models.Manager.from_queryset(ProductQuerySet)()
+
     # Legacy — se mantiene para compatibilidad de datos existentes
     brand_name = models.CharField(max_length=100, blank=True, verbose_name="Marca (legacy)")
 
@@ -137,20 +182,45 @@ class Product(TenantAwareModel):
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
         unique_together = ('tenant', 'sku')
+        indexes = [
+            models.Index(fields=['tenant', 'barcode'], name='inv_product_tenant_barcode'),
+            # Keyset pagination of the inventory list (see listing.py)
+            models.Index(fields=['tenant', 'name', 'id'], name='inv_product_tenant_name_id'),
+            models.Index(fields=['tenant', 'species', 'name', 'id'], name='inv_product_species_name'),
+            models.Index(fields=['tenant', 'category', 'name', 'id'], name='inv_product_category_name'),
+            models.Index(
+                fields=['tenant', 'name', 'id'], name='inv_product_low_stock',
+                condition=models.Q(stock__lte=models.F('min_stock_alert')),
+            ),
+            # Same rows ordered by stock: MetricsService.low_stock_alerts
+            models.Index(
+                fields=['tenant', 'stock'], name='inv_product_low_stock_alert',
+                condition=models.Q(stock__lte=models.F('min_stock_alert')),
+            ),
+        ]
 
     # --- Propiedades de negocio ---
 
+    def _margin(self):
+        """
+        Margen sin redondear: la anotación de ProductQuerySet.with_margin()
+        si está; si no, calculado con el IVA del tenant.
+        """
+        if hasattr(self, 'margin'):
+            return self.margin
+        if self.cost_clp and self.cost_clp > 0:
+            net_price = self.price_clp * 100 / (float(self.tenant.iva_rate) + 100)  # Extraer IVA
+            return (net_price - self.cost_clp) * 100 / self.cost_clp
+        return 0
+
     @property
     def margin_pct(self):
         """Calcula margen de utilidad actual."""
-        if self.cost_clp and self.cost_clp > 0:
-            net_price = self.price_clp / 1.19  # Extraer IVA
-            return round(((net_price - self.cost_clp) / self.cost_clp) * 100, 2)
-        return 0
+        return round(self._margin(), 2)
 
     @property
     def is_margin_below_minimum(self):
-        return self.margin_pct < float(self.min_margin_pct)
+        return bool(self.cost_clp) and self._margin() < float(self.min_margin_pct)
 
     @property
     def is_low_stock(self):
@@ -171,6 +241,13 @@ class Batch(TenantAwareModel):
     class Meta:
         verbose_name = "Lote"
         verbose_name_plural = "Lotes"
+        indexes = [
+            # Batches with stock left, by expiration (expiry alerts, FEFO)
+            models.Index(
+                fields=['tenant', 'expiration_date'], name='inv_batch_remaining_exp',
+                condition=models.Q(current_quantity__gt=0),
+            ),
+        ]
 
     @property
     def is_expired(self):
@@ -186,3 +263,143 @@ class Batch(TenantAwareModel):
     def is_near_expiration(self):
         """Alerta si faltan 30 días o menos."""
         return 0 < self.days_to_expiration <= 30
+
+
+class BranchStock(TenantAwareModel):
+    """
+    Stock de un producto en una sucursal. Cuando el tenant tiene sucursales,
+    Product.stock es la suma de sus filas (total del tenant, sin agregar).
+    """
+    branch = models.ForeignKey('tenants.Branch', on_delete=models.CASCADE, related_name='stocks')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='branch_stocks')
+    stock = models.DecimalField(max_digits=10, decimal_places=3, default=0, verbose_name="Stock")
+
+    class Meta:
+        verbose_name = "Stock por sucursal"
+        verbose_name_plural = "Stock por sucursal"
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'product'], name='inv_branch_stock_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.branch_id}: {self.stock}"
+
+
+class StockMovement(TenantAwareModel):
+    """
+    Libro de movimientos de stock (sólo se agregan filas).
+
+    quantity lleva signo: negativo para salidas (venta, ajuste a la baja,
+    traspaso saliente) y positivo para entradas. Product.stock debe ser igual
+    a la suma de los movimientos del producto (ver apps/inventory/ledger.py);
+    un traspaso deja dos filas (origen y destino) que se anulan entre sí.
+    """
+    SALE = 'SALE'
+    VOID = 'VOID'
+    RECEIPT = 'RECEIPT'
+    ADJUSTMENT = 'ADJUSTMENT'
+    TRANSFER = 'TRANSFER'
+    KIND_CHOICES = [
+        (SALE, 'Venta'),
+        (VOID, 'Anulación'),
+        (RECEIPT, 'Recepción'),
+        (ADJUSTMENT, 'Ajuste'),
+        (TRANSFER, 'Traspaso'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='movements')
+    branch = models.ForeignKey(
+        'tenants.Branch', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', verbose_name="Sucursal",
+    )
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES, verbose_name="Tipo")
+    quantity = models.DecimalField(max_digits=12, decimal_places=3, verbose_name="Cantidad")
+    reference = models.CharField(max_length=100, blank=True, verbose_name="Referencia")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='+', verbose_name="Usuario",
+    )
+
+    class Meta:
+        verbose_name = "Movimiento de stock"
+        verbose_name_plural = "Movimientos de stock"
+        indexes = [
+            models.Index(fields=['product', 'created_at', 'id'], name='inv_movement_product_time'),
+            models.Index(fields=['tenant', 'id'], name='inv_movement_tenant_id'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+} {self.product_id}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Los movimientos de stock no se modifican.")
+        super().save(*args, **kwargs)
+
+
+class StockSnapshot(TenantAwareModel):
+    """
+    Saldo de un producto tras aplicar todos los movimientos del tenant con
+    id <= last_movement_id. El stock a una fecha se obtiene desde la última
+    foto anterior más los movimientos posteriores, sin recorrer el historial.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='snapshots')
+    taken_at = models.DateTimeField(verbose_name="Fecha")
+    last_movement_id = models.BigIntegerField()
+    stock = models.DecimalField(max_digits=12, decimal_places=3)
+
+    class Meta:
+        verbose_name = "Foto de stock"
+        verbose_name_plural = "Fotos de stock"
+        indexes = [
+            models.Index(fields=['product', 'taken_at'], name='inv_snapshot_product_time'),
+            models.Index(fields=['tenant', 'last_movement_id'], name='inv_snapshot_tenant_mark'),
+        ]
+
+
+class PriceHistory(TenantAwareModel):
+    """
+    Precio y costo de un producto a partir de created_at (sólo se agregan
+    filas): cada cambio de precio o costo deja una fila con los valores nuevos.
+    El precio vigente a una fecha es la última fila anterior (ver pricing.py).
+    """
+    INITIAL = 'INITIAL'
+    FORM = 'FORM'
+    ADMIN = 'ADMIN'
+    IMPORT = 'IMPORT'
+    BULK = 'BULK'
+    SOURCE_CHOICES = [
+        (INITIAL, 'Precio inicial'),
+        (FORM, 'Edición de producto'),
+        (ADMIN, 'Edición en admin'),
+        (IMPORT, 'Importación'),
+        (BULK, 'Actualización masiva'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_history')
+    price_clp = models.IntegerField(verbose_name="Precio Venta (CLP)")
+    cost_clp = models.IntegerField(verbose_name="Costo Neto (CLP)")
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, verbose_name="Origen")
+    reference = models.CharField(max_length=100, blank=True, verbose_name="Referencia")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='+', verbose_name="Usuario",
+    )
+
+    class Meta:
+        verbose_name = "Historial de precio"
+        verbose_name_plural = "Historial de precios"
+        indexes = [
+            # Price as of a date: pricing.price_at / prices_at
+            models.Index(fields=['product', 'created_at', 'id'], name='inv_price_product_time'),
+            # Changes in a date range: pricing.price_changes
+            models.Index(fields=['tenant', 'created_at'], name='inv_price_tenant_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: ${self.price_clp} / costo ${self.cost_clp}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("El historial de precios no se modifica.")
+        super().save(*args, **kwargs)
@@ -0,0 +1,308 @@
+"""
+Precios: historial (PriceHistory) y actualización masiva (BulkPriceUpdate).
+
+Historial: cada cambio de precio o costo —formulario y admin (vía
+ledger.save_with_movement), importación y actualización masiva— deja una
+fila con los valores nuevos (record_prices). price_at()/prices_at() dan el
+precio vigente a una fecha leyendo sólo la última fila anterior de cada
+producto (índice inv_price_product_time); price_changes() recorre los
+cambios de un rango (inv_price_tenant_time). Con eso los reportes de margen
+en el tiempo no necesitan recorrer OrderItem.
+
+Actualización masiva:
+
+Alcance: categorías, marcas, proveedores y/o lista de SKUs (todos dentro del
+tenant; los filtros se combinan con AND). Modos:
+
+    PERCENT  precio (o costo) × (1 + valor/100)
+    AMOUNT   precio (o costo) + valor
+    MARGIN   precio tal que el margen sobre costo sea `valor` % (sólo
+             precio)
+
+Los productos sin costo cargado quedan fuera de MARGIN y de los cambios de costo.
+
+Los precios resultantes se redondean a puntos de precio en pesos (ROUNDING);
+los costos, al peso. Todo el cálculo es una expresión SQL: preview() da el
+impacto en margen frente a min_margin_pct con una consulta agregada y una
+página de ejemplos, y apply() registra el historial (PriceHistory) y
+actualiza todos los productos con un solo UPDATE, sin importar cuántos sean.
+
+    update = BulkPriceUpdate(tenant, BulkPriceUpdate.PERCENT, 5, categories=[3])
+    update.preview()
+    update.apply(user=request.user, reference="Lista Distribuidora Sur marzo")
+    price_at(product, timezone.now() - timedelta(days=90))  # (precio, costo)
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    Avg, Case, Count, F, FloatField, IntegerField, OuterRef, Q, Subquery, Value, When,
+)
+from django.db.models.functions import Cast, Ceil, Floor
+from django.utils import timezone
+
+from .models import PriceHistory, Product, margin_expression
+from .signals import products_bulk_changed
+
+PREVIEW_ROWS = 50
+
+
+class PricingError(Exception):
+    """La actualización no es válida o dejaría precios fuera de las reglas."""
+
+
+# ──────────── Historial ────────────
+
+def record_prices(tenant_id, lines, source, reference='', user=None):
+    """
+    Registra el precio y costo vigentes desde ahora con un único INSERT.
+
+    Args:
+        lines: iterable de (product_id, precio, costo)
+    """
+    rows = [
+        PriceHistory(
+            tenant_id=tenant_id, product_id=product_id, price_clp=price, cost_clp=cost,
+            source=source, reference=reference[:100],
+            created_by=user if user and user.is_authenticated else None,
+        )
+        for product_id, price, cost in lines
+    ]
+    if rows:
+        PriceHistory.all_objects.bulk_create(rows, batch_size=1000)
+    return rows
+
+
+def _latest(product, when):
+    return PriceHistory.all_objects.filter(
+        product=product, created_at__lte=when,
+    ).order_by('-created_at', '-id')
+
+
+def price_at(product, when):
+    """(precio, costo) vigentes para el producto en when, o None si aún no tenía precio."""
+    return _latest(product, when).values_list('price_clp', 'cost_clp').first()
+
+
+def prices_at(tenant_id, when, products=None):
+    """
+    {product_id: (precio, costo)} vigentes en when para los productos del
+    tenant (o del queryset products), en una consulta: por producto, una
+    subconsulta que lee la última fila del índice.
+    """
+    qs = Product.all_objects.filter(tenant_id=tenant_id)
+    if products is not None:
+        qs = qs.filter(pk__in=products.values('pk'))
+    latest = _latest(OuterRef('pk'), when)
+    rows = qs.annotate(
+        price_then=Subquery(latest.values('price_clp')[:1]),
+        cost_then=Subquery(latest.values('cost_clp')[:1]),
+    ).filter(price_then__isnull=False).values_list('id', 'price_then', 'cost_then')
+    return {product_id: (price, cost) for product_id, price, cost in rows}
+
+
+def price_changes(tenant_id, start, end, products=None):
+    """(product_id, created_at, precio, costo) con start < created_at <= end, en orden."""
+    qs = PriceHistory.all_objects.filter(tenant_id=tenant_id, created_at__gt=start, created_at__lte=end)
+    if products is not None:
+        qs = qs.filter(product__in=products.values('pk'))
+    return qs.order_by('created_at', 'id').values_list('product_id', 'created_at', 'price_clp', 'cost_clp')
+
+
+def list_margin(price, cost, iva_rate):
+    """Margen % sobre costo del precio neto (como margin_expression), o None sin costo."""
+    if not cost or cost <= 0:
+        return None
+    net_price = price * 100 / (float(iva_rate) + 100)
+    return (net_price - cost) * 100 / cost
+
+
+# ──────────── Actualización masiva ────────────
+
+
+class BulkPriceUpdate:
+    """Cambio de precio o costo de todos los productos de un alcance."""
+
+    PERCENT = 'PERCENT'
+    AMOUNT = 'AMOUNT'
+    MARGIN = 'MARGIN'
+    MODE_CHOICES = [
+        (PERCENT, 'Porcentaje'),
+        (AMOUNT, 'Monto fijo (CLP)'),
+        (MARGIN, 'Margen objetivo (%)'),
+    ]
+
+    PRICE = 'price_clp'
+    COST = 'cost_clp'
+    TARGET_CHOICES = [
+        (PRICE, 'Precio de venta'),
+        (COST, 'Costo neto'),
+    ]
+
+    ROUNDING_CHOICES = [
+        ('PESO', 'Al peso'),
+        ('TEN', 'A $10 (hacia arriba)'),
+        ('HUNDRED', 'A $100 (hacia arriba)'),
+        ('END_990', 'Terminado en $990 (hacia arriba)'),
+    ]
+
+    def __init__(self, tenant, mode, value, target=PRICE, rounding='PESO',
+                 categories=(), brands=(), suppliers=(), skus=()):
+        self.tenant = tenant
+        self.mode = mode
+        self.value = Decimal(value)
+        self.target = target
+        self.rounding = rounding if target == self.PRICE else 'PESO'
+        self.categories = list(categories)
+        self.brands = list(brands)
+        self.suppliers = list(suppliers)
+        self.skus = [sku.strip() for sku in skus if sku.strip()]
+
+        if mode not in dict(self.MODE_CHOICES):
+            raise PricingError(f"Modo desconocido: {mode}")
+        if target not in dict(self.TARGET_CHOICES):
+            raise PricingError(f"Campo desconocido: {target}")
+        if rounding not in dict(self.ROUNDING_CHOICES):
+            raise PricingError(f"Redondeo desconocido: {rounding}")
+        if mode == self.MARGIN and target != self.PRICE:
+            raise PricingError("El margen objetivo sólo se aplica al precio de venta.")
+        if mode == self.MARGIN and self.value <= -100:
+            raise PricingError("El margen objetivo debe ser mayor que -100%.")
+        if not (self.categories or self.brands or self.suppliers or self.skus):
+            raise PricingError("Elige al menos una categoría, marca, proveedor o SKU.")
+
+    # ──────────── Expresiones ────────────
+
+    def _iva(self):
+        return Value(float(self.tenant.iva_rate))
+
+    def _raw(self):
+        """Nuevo valor del campo, sin redondear (float)."""
+        value = float(self.value)
+        if self.mode == self.MARGIN:
+            # margin = (net - cost) / cost  →  price = cost × (1 + m) × (1 + IVA)
+            return (Cast('cost_clp', FloatField()) * (100 + value) / 100
+                    * (self._iva() + 100) / 100)
+        current = Cast(self.target, FloatField())
+        if self.mode == self.PERCENT:
+            return current * (100 + value) / 100
+        return current + value
+
+    def new_value(self):
+        """
+        Nuevo valor del campo objetivo como expresión entera: al peso más
+        cercano y, para precios, hacia arriba al punto de precio elegido (así
+        un margen objetivo no queda bajo lo pedido por el redondeo).
+        """
+        pesos = Floor(self._raw() + 0.5)
+        if self.rounding == 'TEN':
+            pesos = Ceil(pesos / 10) * 10
+        elif self.rounding == 'HUNDRED':
+            pesos = Ceil(pesos / 100) * 100
+        elif self.rounding == 'END_990':
+            # Next price ending in 990 at or above: 12.340 → 12.990
+            pesos = Ceil((pesos + 10) / 1000) * 1000 - 10
+        return Cast(pesos, IntegerField())
+
+    def _scope(self):
+        qs = Product.all_objects.filter(tenant=self.tenant)
+        if self.categories:
+            qs = qs.filter(category_id__in=self.categories)
+        if self.brands:
+            qs = qs.filter(brand_id__in=self.brands)
+        if self.suppliers:
+            qs = qs.filter(supplier_id__in=self.suppliers)
+        if self.skus:
+            qs = qs.filter(sku__in=self.skus)
+        if self.mode == self.MARGIN or self.target == self.COST:
+            qs = qs.filter(cost_clp__gt=0)  # products without a cost loaded are left alone
+        return qs
+
+    def _annotation(self):
+        return 'new_price' if self.target == self.PRICE else 'new_cost'
+
+    def queryset(self):
+        """Productos del alcance, con margin, new_price, new_cost y new_margin anotados."""
+        new_price = self.new_value() if self.target == self.PRICE else F('price_clp')
+        new_cost = self.new_value() if self.target == self.COST else F('cost_clp')
+        return self._scope().with_margin(self.tenant.iva_rate).annotate(
+            new_price=new_price,
+            new_cost=new_cost,
+        ).annotate(
+            new_margin=margin_expression(F('new_price'), F('new_cost'), self._iva()),
+        )
+
+    # ──────────── Vista previa / aplicación ────────────
+
+    def preview(self, rows=PREVIEW_ROWS):
+        """
+        Impacto del cambio: totales (una consulta agregada) y los `rows`
+        productos que quedan con menor margen.
+
+        Returns: dict con products, changed, invalid (precio/costo <= 0),
+            below_min_before, below_min_after, avg_margin_before,
+            avg_margin_after (sobre productos con costo) y rows
+        """
+        min_margin = Cast('min_margin_pct', FloatField())
+        has_cost = Q(cost_clp__gt=0)
+        changed = ~Q(**{self.target: F(self._annotation())})
+        summary = self.queryset().aggregate(
+            products=Count('id'),
+            changed=Count('id', filter=changed),
+            invalid=Count('id', filter=changed & Q(**{f'{self._annotation()}__lte': 0})),
+            below_min_before=Count('id', filter=has_cost & Q(margin__lt=min_margin)),
+            below_min_after=Count('id', filter=Q(new_cost__gt=0, new_margin__lt=min_margin)),
+            avg_margin_before=Avg('margin', filter=has_cost),
+            avg_margin_after=Avg('new_margin', filter=Q(new_cost__gt=0)),
+        )
+        # Lowest resulting margins first; products without a cost go last
+        no_cost_last = Case(When(new_cost__gt=0, then=Value(0)), default=Value(1))
+        summary['rows'] = list(
+            self.queryset().select_related('brand')
+            .order_by(no_cost_last, 'new_margin', 'name', 'id')[:rows]
+        )
+        return summary
+
+    @transaction.atomic
+    def apply(self, user=None, reference='', allow_below_min=False):
+        """
+        Aplica el cambio: bloquea los productos del alcance (en orden de id,
+        como el checkout), deja una fila de PriceHistory por producto que
+        cambia (un INSERT en bloque) y actualiza todos con un único UPDATE.
+
+        Raises:
+            PricingError: algún precio/costo quedaría en 0 o menos, o (sin
+                allow_below_min) algún producto quedaría bajo su margen mínimo
+
+        Returns: número de productos actualizados
+        """
+        qs = self.queryset()
+        annotation = self._annotation()
+        changed = list(
+            qs.select_for_update().exclude(**{self.target: F(annotation)})
+            .order_by('id').values_list('id', 'new_price', 'new_cost')
+        )
+        if not changed:
+            return 0
+        if any(price <= 0 or cost < 0 or (cost == 0 and self.target == self.COST)
+               for _, price, cost in changed):
+            raise PricingError("El cambio deja productos con precio o costo en cero o negativo.")
+        if not allow_below_min:
+            below = qs.filter(
+                new_cost__gt=0, new_margin__lt=Cast('min_margin_pct', FloatField()),
+            ).exclude(**{self.target: F(annotation)}).count()
+            if below:
+                raise PricingError(f"{below} producto(s) quedarían bajo su margen mínimo.")
+
+        record_prices(self.tenant.id, changed, PriceHistory.BULK, reference=reference, user=user)
+
+        # Same scope and expression as the locked read: one UPDATE for every row
+        self._scope().exclude(**{self.target: self.new_value()}).update(**{
+            self.target: self.new_value(),
+            'modified_at': timezone.now(),
+        })
+        # update() skips post_save: drop the tenant's cached barcode snapshots once
+        transaction.on_commit(lambda: products_bulk_changed.send(
+            sender=Product, tenant_id=self.tenant.id,
+        ))
+        return len(changed)
@@ -0,0 +1,83 @@
+"""
+ProductSearch — búsqueda de productos para la caja.
+
+Estrategia (de más barata a más cara):
+  1. Código exacto: barcode o SKU idéntico al texto (índices por tenant).
+  2. Consulta rankeada: nombre contiene el texto (índice trigram GIN sobre
+     UPPER(name) en PostgreSQL), o SKU / código de barras que empiezan con
+     el texto (índices btree text_pattern_ops). Se ordena por relevancia:
+     coincidencia exacta > prefijo de nombre > prefijo de código > contiene.
+
+Los índices específicos de PostgreSQL se crean en la migración
+inventory.0006; en SQLite la misma consulta funciona sin ellos.
+"""
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Product
+
+DEFAULT_LIMIT = 12
+
+
+class ProductSearch:
+    """Busca productos con stock de un tenant."""
+
+    def __init__(self, tenant=None):
+        self.tenant = tenant
+
+    def _base(self):
+        if self.tenant is not None:
+            qs = Product.all_objects.filter(tenant=self.tenant)
+        else:
+            qs = Product.objects.all()
+        return qs.filter(stock__gt=0).select_related('brand')
+
+    @staticmethod
+    def looks_like_code(query):
+        """Texto de escáner: sin espacios (barcode o SKU completo)."""
+        return bool(query) and ' ' not in query
+
+    def _exact_qs(self, query):
+        return self._base().filter(Q(barcode=query) | Q(sku=query))[:DEFAULT_LIMIT]
+
+    def _ranked_qs(self, query, limit):
+        rank = Case(
+            When(Q(barcode=query) | Q(sku__iexact=query), then=Value(0)),
+            When(name__istartswith=query, then=Value(1)),
+            When(Q(sku__istartswith=query) | Q(barcode__startswith=query), then=Value(2)),
+            default=Value(3),
+            output_field=IntegerField(),
+        )
+        return self._base().filter(
+            Q(name__icontains=query)
+            | Q(sku__istartswith=query)
+            | Q(barcode__startswith=query)
+        ).annotate(search_rank=rank).order_by('search_rank', 'name', 'id')[:limit]
+
+    def exact(self, query):
+        """Productos cuyo barcode o SKU es exactamente query (lectura por índice)."""
+        return list(self._exact_qs(query))
+
+    def ranked(self, query, limit=DEFAULT_LIMIT):
+        """Búsqueda difusa rankeada por relevancia."""
+        return list(self._ranked_qs(query, limit))
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        query = (query or '').strip()
+        if not query:
+            return []
+        if self.looks_like_code(query):
+            hits = self.exact(query)
+            if hits:
+                return hits
+        return self.ranked(query, limit)
+
+    async def asearch(self, query, limit=DEFAULT_LIMIT):
+        """Variante async de search() (ORM async, para vistas async/ASGI)."""
+        query = (query or '').strip()
+        if not query:
+            return []
+        if self.looks_like_code(query):
+            hits = [product async for product in self._exact_qs(query)]
+            if hits:
+                return hits
+        return [product async for product in self._ranked_qs(query, limit)]
@@ -0,0 +1,10 @@
+"""
+Señales del catálogo.
+
+products_bulk_changed se envía (sender=Product, tenant_id=...) una vez por
+operación masiva —importación, repreciado— que escribe con bulk_create() o
+update() y por lo tanto no dispara post_save por producto.
+"""
+from django.dispatch import Signal
+
+products_bulk_changed = Signal()
@@ -1,3 +1,344 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.sales.models import CashRegister, Shift
+from apps.sales.services import CheckoutService
+from apps.tenants.models import Branch, Tenant
+
+from .importer import ProductImporter, parse_number
+from .ledger import balances, receive_batch, record_movements, save_with_movement, stock_at, take_snapshots
+from .models import Batch, BranchStock, Category, PriceHistory, Product, StockMovement, StockSnapshot
+from .pricing import BulkPriceUpdate, PricingError
+
+
+class InventoryTestCase(TestCase):
+    """Tenant (IVA 19%) con una categoría; los productos los crea cada test."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Tienda Test', rut_empresa='11111111-1', subdomain='test')
+        cls.category = Category.objects.create(tenant=cls.tenant, name='Alimentos')
+
+    def make_product(self, sku, price=1190, cost=500, **fields):
+        return Product.all_objects.create(
+            tenant=self.tenant, sku=sku, name=fields.pop('name', f'Producto {sku}'),
+            price_clp=price, cost_clp=cost, category=fields.pop('category', self.category), **fields,
+        )
+
+
+class MarginTest(InventoryTestCase):
+
+    def test_annotation_and_fallback_agree(self):
+        product = self.make_product('A', price=1190, cost=800, min_margin_pct=30)
+        annotated = Product.all_objects.with_margin().get(pk=product.pk)
+        plain = Product.all_objects.get(pk=product.pk)
+        self.assertEqual(annotated.margin_pct, 25.0)
+        self.assertEqual(plain.margin_pct, 25.0)
+        self.assertTrue(plain.is_margin_below_minimum)
+
+    def test_annotated_listing_costs_no_query_per_product(self):
+        for i in range(5):
+            self.make_product(f'P{i}', price=1190, cost=900 + i, min_margin_pct=30)
+        with self.assertNumQueries(1):
+            margins = [
+                (product.margin_pct, product.is_margin_below_minimum)
+                for product in Product.all_objects.filter(tenant=self.tenant).below_min_margin(
+                    iva_rate=self.tenant.iva_rate,
+                )
+            ]
+        self.assertEqual(len(margins), 5)
+        self.assertTrue(all(below for _, below in margins))
+        self.assertIsInstance(margins[0][0], float)
+        self.assertLess(margins[0][0], 30)
+
+
+class ProductImporterTest(InventoryTestCase):
+
+    def run_import(self, text, **options):
+        return ProductImporter(self.tenant, **options).run(StringIO(text))
+
+    def test_thousands_separator(self):
+        self.assertEqual(parse_number('1.990'), 1990)
+        self.assertEqual(parse_number('$12.990'), 12990)
+        self.assertEqual(parse_number('1.234,5'), Decimal('1234.5'))
+        self.assertEqual(parse_number('2.5'), Decimal('2.5'))
+        self.assertIsNone(parse_number(' '))
+
+        self.run_import('sku;nombre;categoría;precio\nA;Arena;Alimentos;1.990\n')
+        self.assertEqual(Product.all_objects.get(tenant=self.tenant, sku='A').price_clp, 1990)
+
+    def test_dry_run_writes_nothing_and_reports_diff(self):
+        self.make_product('A', price=1190, cost=500)
+        report = self.run_import(
+            'sku,nombre,categoria,marca,precio\n'
+            'A,Producto A,Alimentos,,1290\n'
+            'B,Collar,Accesorios,Acme,4990\n',
+            dry_run=True,
+        )
+        self.assertEqual((report.created, report.updated, report.failed), (1, 1, 0))
+        self.assertEqual(report.changes, [
+            (2, 'A', 'update', {'price_clp': (1190, 1290)}),
+            (3, 'B', 'new', {'name': (None, 'Collar'), 'price_clp': (None, 4990),
+                             'brand': (None, 'Acme'), 'category': (None, 'Accesorios')}),
+        ])
+        self.assertEqual((report.new_brands, report.new_categories), (['Acme'], ['Accesorios']))
+        self.assertEqual(Product.all_objects.get(sku='A').price_clp, 1190)
+        self.assertFalse(Product.all_objects.filter(sku='B').exists())
+        self.assertFalse(Category.all_objects.filter(name='Accesorios').exists())
+        self.assertFalse(PriceHistory.all_objects.exists())
+
+    def test_reimport_updates_only_changed_columns(self):
+        self.make_product('A', price=1190, cost=500, name='Arena 5kg', barcode='780001')
+        self.make_product('B', price=2990, cost=1500)
+        report = self.run_import(
+            'sku,nombre,precio,codigo de barras\n'
+            'A,Arena 5kg,1290,\n'
+            'B,Producto B,2990,780002\n'
+        )
+        self.assertEqual((report.updated, report.unchanged), (2, 0))
+        self.assertEqual(report.changes[0][3], {'price_clp': (1190, 1290)})
+        self.assertEqual(report.changes[1][3], {'barcode': (None, '780002')})
+
+        a = Product.all_objects.get(sku='A')
+        # Blank cell and columns missing from the file keep their value
+        self.assertEqual((a.price_clp, a.cost_clp, a.barcode, a.name), (1290, 500, '780001', 'Arena 5kg'))
+
+        again = self.run_import('sku,nombre,precio\nA,Arena 5kg,1290\nB,Producto B,2990\n')
+        self.assertEqual((again.updated, again.unchanged), (0, 2))
+
+    def test_bad_cell_is_a_line_error(self):
+        report = self.run_import(
+            'sku,nombre,categoria,precio,peso\n'
+            'A,Arena,Alimentos,abc,1\n'
+            'B,Collar,Alimentos,4990,x\n'
+            'C,Correa,Alimentos,2990,0.5\n'
+            'D,Sin precio,Alimentos,,\n'
+        )
+        self.assertEqual((report.created, report.failed), (1, 3))
+        self.assertEqual([(line, sku) for line, sku, _ in report.errors], [(2, 'A'), (3, 'B'), (5, 'D')])
+        self.assertIn('Producto nuevo sin: price_clp', report.errors[2][2])
+        self.assertEqual(list(Product.all_objects.values_list('sku', flat=True)), ['C'])
+
+    def test_chunk_boundary(self):
+        """Los bloques no cambian el resultado: SKU repetido y categorías nuevas entre bloques."""
+        text = (
+            'sku,nombre,categoria,precio\n'
+            'A,Arena,Arena,1000\nB,Collar,Accesorios,2000\n'
+            'C,Correa,Accesorios,3000\nA,Repetido,Arena,9000\n'
+            'D,Plato,Accesorios,4000\n'
+        )
+        simulated = self.run_import(text, dry_run=True, chunk_size=2)
+        self.assertEqual(sorted(simulated.new_categories), ['Accesorios', 'Arena'])
+
+        report = self.run_import(text, chunk_size=2)
+        self.assertEqual((report.created, report.failed), (4, 1))
+        self.assertEqual(report.errors, [(5, 'A', 'SKU repetido en el archivo.')])
+        self.assertEqual(simulated.changes, report.changes)
+        self.assertEqual(Product.all_objects.get(sku='A').price_clp, 1000)
+        self.assertEqual(Category.all_objects.filter(name__in=['Arena', 'Accesorios']).count(), 2)
+
+    def test_price_history_import_rows(self):
+        self.make_product('A', price=1190, cost=500)
+        self.make_product('B', price=2990, cost=1500)
+        self.run_import(
+            'sku,nombre,categoria,precio,costo\n'
+            'A,Producto A,Alimentos,1290,500\n'
+            'B,Collar nuevo,Alimentos,2990,1500\n'
+            'C,Correa,Alimentos,3990,2000\n',
+            reference='Lista marzo',
+        )
+        # B only changed its name: no price row
+        self.assertEqual(
+            sorted(PriceHistory.all_objects.values_list('product__sku', 'price_clp', 'cost_clp', 'source', 'reference')),
+            [('A', 1290, 500, 'IMPORT', 'Lista marzo'), ('C', 3990, 2000, 'IMPORT', 'Lista marzo')],
+        )
+
+    def test_unrecognised_columns_are_reported(self):
+        self.make_product('A', stock=5)
+        report = self.run_import('sku,precio,stock,Color\nA,1290,99,rojo\n')
+        self.assertEqual(report.ignored_columns, ['stock', 'Color'])
+        product = Product.all_objects.get(sku='A')
+        self.assertEqual((product.price_clp, product.stock), (1290, 5))
+
+
+class BulkPriceUpdateTest(InventoryTestCase):
+
+    def update(self, mode, value, **options):
+        return BulkPriceUpdate(self.tenant, mode, value, categories=[self.category.id], **options)
+
+    def new_prices(self, update):
+        return dict(update.queryset().values_list('sku', 'new_price'))
+
+    def test_rounding_modes(self):
+        for sku, price in (('A', 12340), ('B', 12990), ('C', 12301), ('D', 13000)):
+            self.make_product(sku, price=price)
+        expected = {
+            'PESO': {'A': 12340, 'B': 12990, 'C': 12301, 'D': 13000},
+            'TEN': {'A': 12340, 'B': 12990, 'C': 12310, 'D': 13000},
+            'HUNDRED': {'A': 12400, 'B': 13000, 'C': 12400, 'D': 13000},
+            'END_990': {'A': 12990, 'B': 12990, 'C': 12990, 'D': 13990},
+        }
+        for rounding, prices in expected.items():
+            with self.subTest(rounding=rounding):
+                self.assertEqual(self.new_prices(self.update('AMOUNT', 0, rounding=rounding)), prices)
+        # Rounding happens after the change, to the nearest peso first
+        self.assertEqual(self.new_prices(self.update('PERCENT', '10.005', rounding='PESO'))['A'], 13575)
+
+    def test_margin_mode(self):
+        """precio = costo × (1 + margen) × (1 + IVA); sin costo el producto queda fuera."""
+        self.make_product('A', price=1000, cost=1000)
+        self.make_product('B', price=1000, cost=0)
+        update = self.update('MARGIN', 30)
+        self.assertEqual(self.new_prices(update), {'A': 1547})
+        product = update.queryset().get()
+        self.assertAlmostEqual(product.new_margin, 30, delta=0.05)
+        self.assertEqual(self.new_prices(self.update('MARGIN', 30, rounding='END_990')), {'A': 1990})
+        with self.assertRaises(PricingError):
+            self.update('MARGIN', 30, target=BulkPriceUpdate.COST)
+
+    def test_preview_aggregates(self):
+        self.make_product('A', price=1190, cost=500)
+        self.make_product('B', price=2380, cost=1000)
+        self.make_product('C', price=5000, cost=0)
+        preview = self.update('PERCENT', -50).preview()
+        self.assertEqual(
+            {key: preview[key] for key in ('products', 'changed', 'invalid', 'below_min_before', 'below_min_after')},
+            {'products': 3, 'changed': 3, 'invalid': 0, 'below_min_before': 0, 'below_min_after': 2},
+        )
+        self.assertAlmostEqual(preview['avg_margin_before'], 100)
+        self.assertAlmostEqual(preview['avg_margin_after'], 0)
+        self.assertEqual([row.sku for row in preview['rows']][-1], 'C')
+
+        self.assertEqual(self.update('AMOUNT', -1190).preview()['invalid'], 1)
+
+    def test_apply_rejects_zero_prices_and_low_margins(self):
+        a = self.make_product('A', price=1190, cost=500)
+        self.make_product('B', price=2380, cost=1000)
+        with self.assertRaisesMessage(PricingError, 'cero o negativo'):
+            self.update('AMOUNT', -1190).apply()
+        with self.assertRaisesMessage(PricingError, '2 producto(s) quedarían bajo su margen mínimo'):
+            self.update('PERCENT', -50).apply()
+        a.refresh_from_db()
+        self.assertEqual(a.price_clp, 1190)
+        self.assertFalse(PriceHistory.all_objects.exists())
+
+        self.assertEqual(self.update('PERCENT', -50).apply(allow_below_min=True), 2)
+        a.refresh_from_db()
+        self.assertEqual(a.price_clp, 595)
+
+    def test_apply_is_one_update_plus_bulk_history(self):
+        for i in range(5):
+            self.make_product(f'P{i}', price=1000 * (i + 1), cost=100)
+        other = Category.objects.create(tenant=self.tenant, name='Accesorios')
+        self.make_product('X', price=1000, cost=100, category=other)
+        with CaptureQueriesContext(connection) as queries:
+            count = self.update('PERCENT', 10, rounding='END_990').apply(reference='Alza marzo')
+        self.assertEqual(count, 5)
+        statements = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(len([sql for sql in statements if sql.startswith('UPDATE')]), 1)
+        self.assertEqual(len([sql for sql in statements if sql.startswith('INSERT')]), 1)
+
+        expected = [('P0', 1990), ('P1', 2990), ('P2', 3990), ('P3', 4990), ('P4', 5990)]
+        self.assertEqual(
+            sorted(PriceHistory.all_objects.values_list('product__sku', 'price_clp', 'source', 'reference')),
+            [(sku, price, 'BULK', 'Alza marzo') for sku, price in expected],
+        )
+        self.assertEqual(
+            sorted(Product.all_objects.values_list('sku', 'price_clp')), expected + [('X', 1000)],
+        )
+
+
+class StockLedgerTest(InventoryTestCase):
+    """Alta, recepción de lote, venta y anulación: el libro cuadra con Product.stock."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.branch = Branch.objects.create(tenant=cls.tenant, name='Principal', is_main=True)
+        cls.user = get_user_model().objects.create(username='cajero')
+        register = CashRegister.objects.create(tenant=cls.tenant, branch=cls.branch, name='Caja 1')
+        cls.shift = Shift.objects.create(tenant=cls.tenant, register=register, cashier=cls.user)
+
+    def setUp(self):
+        self.product = save_with_movement(Product(
+            tenant=self.tenant, sku='A', name='Arena', price_clp=1190, cost_clp=500,
+            stock=10, category=self.category,
+        ))
+        receive_batch(Batch(
+            product=self.product, batch_number='L1', expiration_date=date.today() + timedelta(days=30),
+            quantity=5, current_quantity=5,
+        ))
+        service = CheckoutService(self.tenant, self.shift, self.user)
+        order = service.process_sale({self.product.id: '3'})
+        service.void_sale(order, self.user, 'Error de digitación')
+        service.process_sale({self.product.id: '2'})
+        self.product.refresh_from_db()
+
+    def assertLedgerBalances(self):
+        stock = Product.all_objects.get(pk=self.product.pk).stock
+        self.assertEqual(balances(self.tenant.id), {self.product.id: stock})
+        self.assertEqual(BranchStock.all_objects.get(product=self.product, branch=self.branch).stock, stock)
+
+    def test_every_change_leaves_a_movement(self):
+        self.assertEqual(self.product.stock, Decimal('13'))
+        self.assertEqual(
+            list(StockMovement.all_objects.order_by('id').values_list('kind', 'quantity', 'branch_id')),
+            [('ADJUSTMENT', 10, self.branch.id), ('RECEIPT', 5, self.branch.id),
+             ('SALE', -3, self.branch.id), ('VOID', 3, self.branch.id), ('SALE', -2, self.branch.id)],
+        )
+        self.assertLedgerBalances()
+
+        self.product.stock = 12
+        save_with_movement(self.product, reference='Conteo')
+        self.assertEqual(StockMovement.all_objects.latest('id').quantity, -1)
+        self.assertLedgerBalances()
+
+    def test_record_movements_skips_zero_lines(self):
+        movements = record_movements(self.tenant.id, StockMovement.ADJUSTMENT, [
+            (self.product.id, 0), (self.product.id, '1.5'),
+        ], reference='x' * 150)
+        self.assertEqual([(m.quantity, len(m.reference)) for m in movements], [(Decimal('1.5'), 100)])
+
+    def test_stock_at_with_and_without_snapshots(self):
+        start = timezone.now() - timedelta(days=1)
+        for hours, movement in enumerate(StockMovement.all_objects.order_by('id'), start=1):
+            StockMovement.all_objects.filter(pk=movement.pk).update(created_at=start + timedelta(hours=hours))
+        expected = [0, 10, 15, 12, 15, 13]
+        at = [start + timedelta(hours=hours, minutes=30) for hours in range(6)]
+
+        self.assertEqual([stock_at(self.product, when) for when in at], expected)
+        # Snapshot after the third movement (now minus SNAPSHOT_LAG)
+        self.assertEqual(take_snapshots(self.tenant.id, now=at[3] + timedelta(minutes=5)), 1)
+        self.assertEqual(StockSnapshot.all_objects.get().stock, 12)
+        self.assertEqual(take_snapshots(self.tenant.id, now=at[3] + timedelta(minutes=5)), 0)
+        with self.assertNumQueries(2):
+            self.assertEqual(stock_at(self.product, at[5]), 13)
+        self.assertEqual([stock_at(self.product, when) for when in at[3:]], expected[3:])
+
+        self.assertEqual(take_snapshots(self.tenant.id), 1)
+        self.assertEqual(StockSnapshot.all_objects.latest('id').stock, 13)
+        self.assertLedgerBalances()
+
+    def test_verify_stock_ledger(self):
+        take_snapshots(self.tenant.id, now=timezone.now() + timedelta(hours=1))
+        out = StringIO()
+        call_command('verify_stock_ledger', stdout=out)
+        self.assertIn('1 productos revisados, 0 con diferencias', out.getvalue())
+
+        Product.all_objects.filter(pk=self.product.pk).update(stock=99)
+        with self.assertRaisesMessage(CommandError, '1 con diferencias'):
+            call_command('verify_stock_ledger', stdout=StringIO())
+        call_command('verify_stock_ledger', '--fix', stdout=StringIO())
+        self.assertLedgerBalances()
 
-# Create your tests here.
+        BranchStock.all_objects.filter(product=self.product).update(stock=1)
+        with self.assertRaisesMessage(CommandError, 'stock por sucursal descuadrado'):
+            call_command('verify_stock_ledger', stdout=StringIO())
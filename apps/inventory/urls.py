@@ -5,6 +5,8 @@ urlpatterns = [
     path('', views.inventory_dashboard, name='inventory_dashboard'),
     path('products/', views.product_list, name='inventory_list'),
     path('products/new/', views.product_create, name='product_create'),
+    path('products/import/', views.product_import, name='product_import'),
+    path('products/reprice/', views.product_reprice, name='product_reprice'),
     path('products/<int:pk>/edit/', views.product_update, name='product_update'),
     path('products/<int:pk>/delete/', views.product_delete, name='product_delete'),
     
@@ -1,7 +1,15 @@
+import io
+from urllib.parse import urlencode
+
 from django.shortcuts import render, get_object_or_404, redirect
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from .importer import ImportFileError, ProductImporter
+from .ledger import receive_batch
+from .listing import ProductListing
 from .models import Product
-from .forms import ProductForm
+from .forms import BulkPriceForm, ProductForm, ProductImportForm
+from .pricing import PricingError
 
 @login_required
 def inventory_dashboard(request):
@@ -9,14 +17,28 @@ def inventory_dashboard(request):
 
 @login_required
 def product_list(request):
-    products = Product.objects.all().order_by('name')
-    return render(request, 'inventory/product_list.html', {'products': products})
+    """Catálogo paginado por cursor; las páginas siguientes llegan vía HTMX (scroll infinito)."""
+    listing = ProductListing.from_params(getattr(request, 'tenant', None), request.GET)
+    products, next_cursor = listing.page(request.GET.get('cursor'))
+
+    next_url = None
+    if next_cursor:
+        next_url = '?' + urlencode({**listing.querystring(), 'cursor': next_cursor})
+    context = {'products': products, 'next_url': next_url, 'listing': listing}
+
+    if request.htmx and not request.htmx.history_restore_request:
+        return render(request, 'inventory/partials/product_rows.html', context)
+    context.update({
+        'species_choices': Product.SPECIES_CHOICES,
+        'categories': Category.objects.order_by('name'),
+    })
+    return render(request, 'inventory/product_list.html', context)
 
 @login_required
 def product_create(request):
     tenant = getattr(request, 'tenant', None)
     if request.method == 'POST':
-        form = ProductForm(request.POST, tenant=tenant)
+        form = ProductForm(request.POST, tenant=tenant, user=request.user)
         if form.is_valid():
             form.save()
             return redirect('inventory_list')
@@ -29,7 +51,7 @@ def product_update(request, pk):
     product = get_object_or_404(Product, pk=pk)
     tenant = getattr(request, 'tenant', None)
     if request.method == 'POST':
-        form = ProductForm(request.POST, instance=product, tenant=tenant)
+        form = ProductForm(request.POST, instance=product, tenant=tenant, user=request.user)
         if form.is_valid():
             form.save()
             return redirect('inventory_list')
@@ -37,6 +59,55 @@ def product_update(request, pk):
         form = ProductForm(instance=product, tenant=tenant)
     return render(request, 'inventory/product_form.html', {'form': form, 'title': 'Editar Producto'})
 
+@login_required
+def product_import(request):
+    """Importa (o simula) una lista de precios CSV; muestra el informe de cambios."""
+    tenant = getattr(request, 'tenant', None)
+    report = None
+    if request.method == 'POST':
+        form = ProductImportForm(request.POST, request.FILES, tenant=tenant)
+        if form.is_valid() and tenant is not None:
+            stream = io.TextIOWrapper(form.cleaned_data['file'], encoding='utf-8-sig', newline='')
+            importer = ProductImporter(
+                tenant, supplier=form.cleaned_data['supplier'], dry_run=form.cleaned_data['dry_run'],
+                user=request.user, reference=f"Importación {form.cleaned_data['file'].name}",
+            )
+            try:
+                report = importer.run(stream)
+            except (ImportFileError, UnicodeDecodeError) as exc:
+                form.add_error('file', str(exc) if isinstance(exc, ImportFileError)
+                               else "El archivo debe estar en UTF-8.")
+    else:
+        form = ProductImportForm(tenant=tenant)
+    return render(request, 'inventory/product_import.html', {'form': form, 'report': report})
+
+@login_required
+def product_reprice(request):
+    """
+    Actualización masiva de precios/costos: "Vista previa" muestra el impacto
+    en margen; "Aplicar" guarda (y vuelve a validar contra el margen mínimo).
+    """
+    tenant = getattr(request, 'tenant', None)
+    preview = None
+    if request.method == 'POST':
+        form = BulkPriceForm(request.POST, tenant=tenant)
+        if form.is_valid():
+            if request.POST.get('action') == 'apply':
+                try:
+                    updated = form.update.apply(
+                        user=request.user, reference=form.cleaned_data['reference'],
+                        allow_below_min=form.cleaned_data['allow_below_min'],
+                    )
+                except PricingError as exc:
+                    form.add_error(None, str(exc))
+                else:
+                    messages.success(request, f"✅ {updated} producto(s) actualizados.")
+                    return redirect('inventory_list')
+            preview = form.update.preview()
+    else:
+        form = BulkPriceForm(tenant=tenant)
+    return render(request, 'inventory/product_reprice.html', {'form': form, 'preview': preview})
+
 @login_required
 def product_delete(request, pk):
     product = get_object_or_404(Product, pk=pk)
@@ -100,7 +171,8 @@ def batch_create(request):
     if request.method == 'POST':
         form = BatchForm(request.POST)
         if form.is_valid():
-            form.save()
+            batch = form.save(commit=False)
+            receive_batch(batch, user=request.user, reference=f"Recepción lote {batch.batch_number}")
             return redirect('batch_list')
     else:
         form = BatchForm()
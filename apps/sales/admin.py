@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CashRegister, Shift, Order, OrderItem, Payment
+from .models import CashRegister, Shift, Order, OrderItem, Payment, DailySalesRollup
 
 
 class OrderItemInline(admin.TabularInline):
@@ -23,7 +23,7 @@ class CashRegisterAdmin(admin.ModelAdmin):
 class ShiftAdmin(admin.ModelAdmin):
     list_display = (
         'register', 'cashier', 'opened_at', 'closed_at',
-        'opening_cash', 'closing_cash', 'is_open_display',
+        'opening_cash', 'closing_cash', 'orders_count', 'gross_clp', 'is_open_display',
     )
     list_filter = ('register', 'cashier')
     readonly_fields = ('opened_at',)
@@ -42,7 +42,7 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ('is_paid', 'is_voided', 'branch', 'date')
     search_fields = ('id', 'order_number', 'customer__first_name')
     inlines = [OrderItemInline, PaymentInline]
-    readonly_fields = ('date', 'net_amount', 'iva_amount')
+    readonly_fields = ('date', 'net_amount', 'iva_amount', 'idempotency_key')
 
     @admin.display(description='Total CLP')
     def total_display(self, obj):
@@ -61,3 +61,19 @@ class OrderAdmin(admin.ModelAdmin):
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('order', 'amount_clp', 'method', 'transaction_id')
     list_filter = ('method',)
+
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    list_display = (
+        'day', 'branch', 'product', 'payment_method',
+        'orders', 'total_clp', 'quantity', 'revenue_clp',
+    )
+    list_filter = ('day', 'branch', 'payment_method')
+    list_select_related = ('branch', 'product')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class SalesConfig(AppConfig):
     name = 'apps.sales'
     label = 'sales'
+
+    def ready(self):
+        from apps.inventory.models import Product
+        from apps.inventory.signals import products_bulk_changed
+        from .barcodes import invalidate_product, invalidate_tenant
+
+        post_save.connect(invalidate_product, sender=Product, dispatch_uid='barcode_index_save')
+        post_delete.connect(invalidate_product, sender=Product, dispatch_uid='barcode_index_delete')
+        products_bulk_changed.connect(invalidate_tenant, sender=Product, dispatch_uid='barcode_index_bulk')
@@ -0,0 +1,130 @@
+"""
+Índice en memoria código → producto, por tenant, para el escáner de la caja.
+
+Cada proceso mantiene un dict {barcode|sku: foto del producto} por tenant,
+cargado con una sola consulta la primera vez (o al arrancar, ver
+warm_on_startup). Guardar o borrar un Product invalida el tenant completo al
+confirmar la transacción: localmente y, vía un número de versión en el cache
+de Django, en los demás procesos; lo mismo ocurre tras una operación masiva
+sobre el catálogo (señal products_bulk_changed). Con el índice caliente un
+escaneo no lee la base de datos.
+
+Las fotos tienen el mismo formato que Cart.snapshot(); el stock es sólo un
+tope para el carrito: CheckoutService revalida stock y precio al cobrar.
+"""
+import logging
+import threading
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+
+from apps.inventory.models import Product
+
+from .cart import to_milli
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'pos:barcodes:version:{tenant_id}'
+
+
+class BarcodeIndex:
+    """Mapa código → foto de producto por tenant, con invalidación por versión."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._maps = {}  # tenant_id -> (version, {code: snapshot})
+
+    @staticmethod
+    def _version(tenant_id):
+        return cache.get(VERSION_KEY.format(tenant_id=tenant_id), 0)
+
+    def warm(self, tenant_id):
+        """Carga (una consulta) el mapa del tenant y lo devuelve."""
+        version = self._version(tenant_id)
+        codes = {}
+        rows = Product.all_objects.filter(tenant_id=tenant_id).values(
+            'id', 'name', 'sku', 'barcode', 'price_clp', 'is_bulk', 'stock',
+        )
+        for row in rows:
+            snapshot = {
+                'id': row['id'],
+                'name': row['name'],
+                'sku': row['sku'],
+                'price_clp': row['price_clp'],
+                'is_bulk': row['is_bulk'],
+                'stock': to_milli(row['stock']),
+            }
+            codes.setdefault(row['sku'], snapshot)
+            if row['barcode']:
+                # A barcode wins over a SKU with the same text
+                codes[row['barcode']] = snapshot
+        with self._lock:
+            self._maps[tenant_id] = (version, codes)
+        return codes
+
+    def lookup(self, tenant_id, code):
+        """Foto del producto con ese barcode/SKU, o None."""
+        entry = self._maps.get(tenant_id)
+        if entry is None or entry[0] != self._version(tenant_id):
+            codes = self.warm(tenant_id)
+        else:
+            codes = entry[1]
+        return codes.get(code)
+
+    async def alookup(self, tenant_id, code):
+        """Variante async de lookup(); sólo toca la base de datos si hay que recargar."""
+        entry = self._maps.get(tenant_id)
+        version = await cache.aget(VERSION_KEY.format(tenant_id=tenant_id), 0)
+        if entry is None or entry[0] != version:
+            codes = await sync_to_async(self.warm)(tenant_id)
+        else:
+            codes = entry[1]
+        return codes.get(code)
+
+    def is_warm(self, tenant_id):
+        entry = self._maps.get(tenant_id)
+        return entry is not None and entry[0] == self._version(tenant_id)
+
+    def invalidate(self, tenant_id):
+        """Descarta el mapa del tenant aquí y en los demás procesos."""
+        with self._lock:
+            self._maps.pop(tenant_id, None)
+        key = VERSION_KEY.format(tenant_id=tenant_id)
+        if not cache.add(key, 1, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
+
+
+barcode_index = BarcodeIndex()
+
+
+def invalidate_product(sender, instance, **kwargs):
+    """
+    Receiver de post_save/post_delete de Product. Invalida al confirmar: antes
+    del commit otro proceso recargaría las filas viejas con la versión nueva.
+    """
+    transaction.on_commit(partial(barcode_index.invalidate, instance.tenant_id))
+
+
+def invalidate_tenant(sender, tenant_id, **kwargs):
+    """Receiver de products_bulk_changed (cambios masivos sin post_save)."""
+    barcode_index.invalidate(tenant_id)
+
+
+def warm_on_startup():
+    """Precarga los mapas de todos los tenants activos (POS_BARCODE_WARM_ON_STARTUP)."""
+    if not getattr(settings, 'POS_BARCODE_WARM_ON_STARTUP', False):
+        return
+    from apps.tenants.models import Tenant
+
+    try:
+        for tenant_id in Tenant.objects.filter(is_active=True).values_list('id', flat=True):
+            barcode_index.warm(tenant_id)
+    except DatabaseError:
+        # e.g. before the first migrate
+        logger.warning("Barcode index warm-up skipped: database not ready")
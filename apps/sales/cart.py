@@ -0,0 +1,463 @@
+"""
+Carrito de la caja.
+
+Cada línea guarda una foto del producto (nombre, SKU, precio, stock máximo)
+tomada al agregarlo, y el carrito mantiene el total bruto de forma
+incremental: renderizarlo no consulta la base de datos y agregar una unidad
+de un producto que ya está en el carrito tampoco. El precio se vuelve a
+validar al cobrar (ver CheckoutService).
+
+El almacenamiento es intercambiable (setting POS_CART_STORE):
+  - SessionCartStore: request.session (comportamiento histórico).
+  - RedisCartStore: un hash por carrito, con HINCRBY por línea; agregar
+    productos no reescribe la sesión.
+  - MemoryCartStore: LRU en memoria con TTL, para tests y un solo nodo.
+
+Las cantidades se guardan como enteros en milésimas (1 kg = 1000) para que
+los incrementos atómicos sean exactos.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from apps.core.utils import format_clp
+
+SNAPSHOT_FIELDS = ('name', 'sku', 'price_clp', 'is_bulk', 'stock')
+
+BULK_STEP = 500   # 0,500 kg
+UNIT_STEP = 1000  # 1 unidad
+
+DEFAULT_CART_STORE = {
+    'BACKEND': 'apps.sales.cart.SessionCartStore',
+    'OPTIONS': {},
+}
+
+
+def line_total_for(price_clp, quantity):
+    """Total de una línea, con el mismo redondeo que OrderItem."""
+    return int(round(float(price_clp) * float(quantity)))
+
+
+def to_quantity(milli):
+    return Decimal(milli).scaleb(-3)
+
+
+def to_milli(quantity):
+    return int(Decimal(quantity) * 1000)
+
+
+# ──────────────────────── Stores ────────────────────────
+
+class CartStore:
+    """
+    Interfaz de almacenamiento del carrito.
+
+    Todas las operaciones reciben la sesión del request; los backends que no
+    guardan el carrito en la sesión sólo escriben en ella una vez, para
+    asignar un cart_id.
+    """
+
+    CART_ID_KEY = 'cart_id'
+
+    def cart_id(self, session):
+        cart_id = session.get(self.CART_ID_KEY)
+        if cart_id is None:
+            cart_id = uuid.uuid4().hex
+            session[self.CART_ID_KEY] = cart_id
+        return cart_id
+
+    def load(self, session):
+        """Returns: ({product_id: (snapshot, qty_milli)}, total_gross)"""
+        raise NotImplementedError
+
+    def get_line(self, session, product_id):
+        """Returns: (snapshot, qty_milli) o None"""
+        raise NotImplementedError
+
+    def set_snapshot(self, session, product_id, snapshot):
+        raise NotImplementedError
+
+    def incr_quantity(self, session, product_id, delta):
+        """Suma delta (milésimas) a la línea y devuelve la cantidad nueva."""
+        raise NotImplementedError
+
+    def incr_total(self, session, delta):
+        raise NotImplementedError
+
+    def pop_line(self, session, product_id):
+        """Elimina la línea y devuelve (snapshot, qty_milli) o None."""
+        raise NotImplementedError
+
+    def clear(self, session):
+        raise NotImplementedError
+
+
+class SessionCartStore(CartStore):
+    """Guarda el carrito completo en request.session."""
+
+    SESSION_KEY = 'pos_cart'
+
+    def _data(self, session):
+        data = session.get(self.SESSION_KEY)
+        if data is None:
+            data = {'lines': {}, 'total_gross': 0}
+        return data
+
+    def _save(self, session, data):
+        session[self.SESSION_KEY] = data
+        session.modified = True
+
+    def load(self, session):
+        data = self._data(session)
+        lines = {
+            int(product_id): (line['snapshot'], line['qty'])
+            for product_id, line in data['lines'].items()
+        }
+        return lines, data['total_gross']
+
+    def get_line(self, session, product_id):
+        line = self._data(session)['lines'].get(str(product_id))
+        if line is None:
+            return None
+        return line['snapshot'], line['qty']
+
+    def set_snapshot(self, session, product_id, snapshot):
+        data = self._data(session)
+        line = data['lines'].setdefault(str(product_id), {'qty': 0})
+        line['snapshot'] = snapshot
+        self._save(session, data)
+
+    def incr_quantity(self, session, product_id, delta):
+        data = self._data(session)
+        line = data['lines'][str(product_id)]
+        line['qty'] += delta
+        self._save(session, data)
+        return line['qty']
+
+    def incr_total(self, session, delta):
+        data = self._data(session)
+        data['total_gross'] += delta
+        self._save(session, data)
+        return data['total_gross']
+
+    def pop_line(self, session, product_id):
+        data = self._data(session)
+        line = data['lines'].pop(str(product_id), None)
+        if line is None:
+            return None
+        self._save(session, data)
+        return line['snapshot'], line['qty']
+
+    def clear(self, session):
+        self._save(session, {'lines': {}, 'total_gross': 0})
+
+
+class MemoryCartStore(CartStore):
+    """LRU en memoria del proceso con expiración por inactividad."""
+
+    def __init__(self, max_carts=1000, ttl=60 * 60 * 12):
+        self.max_carts = max_carts
+        self.ttl = ttl
+        self._carts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cart(self, session):
+        """Carrito vivo (crea uno vacío si no existe o expiró). Llamar con _lock."""
+        cart_id = self.cart_id(session)
+        now = time.monotonic()
+        entry = self._carts.get(cart_id)
+        if entry is None or entry['expires_at'] < now:
+            entry = {'lines': {}, 'total_gross': 0}
+        entry['expires_at'] = now + self.ttl
+        self._carts[cart_id] = entry
+        self._carts.move_to_end(cart_id)
+        while len(self._carts) > self.max_carts:
+            self._carts.popitem(last=False)
+        return entry
+
+    def load(self, session):
+        with self._lock:
+            cart = self._cart(session)
+            lines = {
+                product_id: (line['snapshot'], line['qty'])
+                for product_id, line in cart['lines'].items()
+            }
+            return lines, cart['total_gross']
+
+    def get_line(self, session, product_id):
+        with self._lock:
+            line = self._cart(session)['lines'].get(int(product_id))
+            return None if line is None else (line['snapshot'], line['qty'])
+
+    def set_snapshot(self, session, product_id, snapshot):
+        with self._lock:
+            line = self._cart(session)['lines'].setdefault(int(product_id), {'qty': 0})
+            line['snapshot'] = snapshot
+
+    def incr_quantity(self, session, product_id, delta):
+        with self._lock:
+            line = self._cart(session)['lines'][int(product_id)]
+            line['qty'] += delta
+            return line['qty']
+
+    def incr_total(self, session, delta):
+        with self._lock:
+            cart = self._cart(session)
+            cart['total_gross'] += delta
+            return cart['total_gross']
+
+    def pop_line(self, session, product_id):
+        with self._lock:
+            line = self._cart(session)['lines'].pop(int(product_id), None)
+            return None if line is None else (line['snapshot'], line['qty'])
+
+    def clear(self, session):
+        with self._lock:
+            self._carts.pop(self.cart_id(session), None)
+
+
+class RedisCartStore(CartStore):
+    """
+    Un hash de Redis por carrito:
+        total      → total bruto (HINCRBY)
+        q:<id>     → cantidad en milésimas (HINCRBY)
+        s:<id>     → foto JSON del producto
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', ttl=60 * 60 * 12,
+                 prefix='pos:cart:'):
+        import redis  # Sólo requerido en producción (requirements/production.txt)
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, session):
+        return f"{self.prefix}{self.cart_id(session)}"
+
+    def _touch(self, pipe, key):
+        pipe.expire(key, self.ttl)
+
+    def load(self, session):
+        raw = self.client.hgetall(self._key(session))
+        lines = {}
+        total = 0
+        for field, value in raw.items():
+            field = field.decode()
+            if field == 'total':
+                total = int(value)
+            elif field.startswith('s:'):
+                product_id = int(field[2:])
+                qty = int(raw.get(f'q:{product_id}'.encode(), 0))
+                lines[product_id] = (json.loads(value), qty)
+        return lines, total
+
+    def get_line(self, session, product_id):
+        snapshot, qty = self.client.hmget(
+            self._key(session), f's:{product_id}', f'q:{product_id}',
+        )
+        if snapshot is None:
+            return None
+        return json.loads(snapshot), int(qty or 0)
+
+    def set_snapshot(self, session, product_id, snapshot):
+        key = self._key(session)
+        pipe = self.client.pipeline()
+        pipe.hset(key, f's:{product_id}', json.dumps(snapshot))
+        pipe.hsetnx(key, f'q:{product_id}', 0)
+        self._touch(pipe, key)
+        pipe.execute()
+
+    def incr_quantity(self, session, product_id, delta):
+        key = self._key(session)
+        pipe = self.client.pipeline()
+        pipe.hincrby(key, f'q:{product_id}', delta)
+        self._touch(pipe, key)
+        return pipe.execute()[0]
+
+    def incr_total(self, session, delta):
+        key = self._key(session)
+        pipe = self.client.pipeline()
+        pipe.hincrby(key, 'total', delta)
+        self._touch(pipe, key)
+        return pipe.execute()[0]
+
+    def pop_line(self, session, product_id):
+        key = self._key(session)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hmget(key, f's:{product_id}', f'q:{product_id}')
+        pipe.hdel(key, f's:{product_id}', f'q:{product_id}')
+        (snapshot, qty), _ = pipe.execute()
+        if snapshot is None:
+            return None
+        return json.loads(snapshot), int(qty or 0)
+
+    def clear(self, session):
+        self.client.delete(self._key(session))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_cart_store():
+    """Backend configurado en settings.POS_CART_STORE (instancia única por proceso)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = getattr(settings, 'POS_CART_STORE', DEFAULT_CART_STORE)
+                backend = import_string(config['BACKEND'])
+                _store = backend(**config.get('OPTIONS', {}))
+    return _store
+
+
+# ──────────────────────── Cart ────────────────────────
+
+class Cart:
+    """Carrito del request actual con totales incrementales."""
+
+    def __init__(self, session, store=None):
+        self.session = session
+        self.store = store or get_cart_store()
+
+    # ──────────── Lectura ────────────
+
+    def _lines(self):
+        return self.store.load(self.session)
+
+    def __bool__(self):
+        lines, _ = self._lines()
+        return bool(lines)
+
+    def get_line(self, product_id):
+        return self.store.get_line(self.session, product_id)
+
+    def quantities(self):
+        """{product_id: quantity_str}, el formato que espera CheckoutService."""
+        lines, _ = self._lines()
+        return {
+            str(product_id): str(to_quantity(qty))
+            for product_id, (_, qty) in lines.items() if qty > 0
+        }
+
+    def expected_prices(self):
+        """{product_id: price_clp} mostrados al cajero (para revalidar al cobrar)."""
+        lines, _ = self._lines()
+        return {
+            product_id: snapshot['price_clp']
+            for product_id, (snapshot, _) in lines.items()
+        }
+
+    def totals(self):
+        """Contexto para pos/partials/cart_items.html — cero consultas SQL."""
+        lines, total_gross = self._lines()
+        items = []
+        for product_id, (snapshot, qty) in lines.items():
+            if qty <= 0:
+                continue
+            quantity = to_quantity(qty)
+            line_total = line_total_for(snapshot['price_clp'], quantity)
+            items.append({
+                'product': {
+                    'id': product_id,
+                    'name': snapshot['name'],
+                    'sku': snapshot['sku'],
+                    'price_clp': snapshot['price_clp'],
+                },
+                'quantity': quantity,
+                'line_total': line_total,
+                'line_total_formatted': format_clp(line_total),
+            })
+
+        total_net = int(total_gross / 1.19) if total_gross else 0
+        total_iva = total_gross - total_net
+
+        return {
+            'items': items,
+            'total_gross': total_gross,
+            'total_net': total_net,
+            'total_iva': total_iva,
+            'total_formatted': format_clp(total_gross),
+            'iva_formatted': format_clp(total_iva),
+        }
+
+    # ──────────── Escritura ────────────
+
+    def add(self, product=None, product_id=None, snapshot=None):
+        """
+        Agrega un paso (1 unidad o 0,5 kg a granel) de un producto.
+
+        Si el producto ya está en el carrito basta con product_id (se usa la
+        foto guardada); si no, hay que pasar la instancia de Product o una
+        foto ya armada (snapshot, p. ej. del índice de códigos de barras).
+
+        Returns: True si se agregó, False si supera el stock disponible.
+        """
+        if product is not None:
+            product_id = product.id
+        line = self.get_line(product_id)
+        if line is None:
+            if product is not None:
+                snapshot = self.snapshot(product)
+            if snapshot is None:
+                return False
+            snapshot = {key: snapshot[key] for key in SNAPSHOT_FIELDS}
+            self.store.set_snapshot(self.session, product_id, snapshot)
+            line = (snapshot, 0)
+
+        snapshot, _ = line
+        step = BULK_STEP if snapshot['is_bulk'] else UNIT_STEP
+        new_qty = self.store.incr_quantity(self.session, product_id, step)
+        if new_qty > snapshot['stock']:
+            self.store.incr_quantity(self.session, product_id, -step)
+            return False
+
+        price = snapshot['price_clp']
+        self.store.incr_total(
+            self.session,
+            line_total_for(price, to_quantity(new_qty))
+            - line_total_for(price, to_quantity(new_qty - step)),
+        )
+        return True
+
+    def remove(self, product_id):
+        line = self.store.pop_line(self.session, product_id)
+        if line is not None:
+            snapshot, qty = line
+            self.store.incr_total(
+                self.session, -line_total_for(snapshot['price_clp'], to_quantity(qty)),
+            )
+
+    def reprice(self, prices):
+        """Actualiza la foto de precio de las líneas indicadas ({product_id: price_clp})."""
+        for product_id, price_clp in prices.items():
+            line = self.get_line(product_id)
+            if line is None:
+                continue
+            snapshot, qty = line
+            quantity = to_quantity(qty)
+            delta = (line_total_for(price_clp, quantity)
+                     - line_total_for(snapshot['price_clp'], quantity))
+            snapshot['price_clp'] = price_clp
+            self.store.set_snapshot(self.session, product_id, snapshot)
+            self.store.incr_total(self.session, delta)
+
+    def clear(self):
+        self.store.clear(self.session)
+
+    @staticmethod
+    def snapshot(product):
+        return {
+            'name': product.name,
+            'sku': product.sku,
+            'price_clp': product.price_clp,
+            'is_bulk': product.is_bulk,
+            'stock': to_milli(product.stock),
+        }
@@ -0,0 +1,96 @@
+"""
+Benchmark del pipeline de checkout: cuenta consultas SQL por venta en modo
+con turno y sin turno, para distintos tamaños de carrito.
+
+Todo se ejecuta dentro de una transacción que se revierte al final, por lo
+que no deja datos en la base.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide consultas SQL y tiempo de CheckoutService.process_sale (con y sin turno)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lines', type=int, nargs='+', default=[1, 10, 40],
+            help='Tamaños de carrito a medir (default: 1 10 40)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                results = self._run(options['lines'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{'modo':<10}{'líneas':>8}{'queries':>10}{'ms':>10}")
+        for mode, lines, queries, ms in results:
+            self.stdout.write(f"{mode:<10}{lines:>8}{queries:>10}{ms:>10.1f}")
+
+        # Shift mode adds one UPDATE for the shift's running counters
+        by_mode = {}
+        for mode, _, queries, _ in results:
+            by_mode.setdefault(mode, set()).add(queries)
+        if all(len(counts) == 1 for counts in by_mode.values()):
+            self.stdout.write(self.style.SUCCESS(
+                "OK: consultas constantes sin importar el tamaño del carrito ("
+                + ", ".join(f"{mode}: {counts.pop()}" for mode, counts in by_mode.items())
+                + ")"
+            ))
+        else:
+            raise CommandError(
+                "El número de consultas varía con el tamaño del carrito: "
+                + ", ".join(f"{mode}: {sorted(counts)}" for mode, counts in by_mode.items())
+            )
+
+    def _run(self, sizes):
+        from django.contrib.auth import get_user_model
+        from apps.inventory.models import BranchStock, Category, Product
+        from apps.sales.models import CashRegister, Shift
+        from apps.sales.services import CheckoutService
+        from apps.tenants.models import Branch, Tenant
+
+        tenant = Tenant.objects.create(
+            name='Bench', rut_empresa='bench-0', subdomain='bench-checkout',
+        )
+        branch = Branch.objects.create(tenant=tenant, name='Bench')
+        register = CashRegister.objects.create(tenant=tenant, branch=branch, name='Bench')
+        cashier = get_user_model().objects.create(username='bench-checkout')
+        category = Category.objects.create(tenant=tenant, name='Bench')
+        products = Product.all_objects.bulk_create([
+            Product(
+                tenant=tenant, category=category, sku=f'BENCH-{i}',
+                name=f'Bench {i}', price_clp=1990, cost_clp=1000, stock=10_000,
+            )
+            for i in range(max(sizes))
+        ])
+        BranchStock.all_objects.bulk_create([
+            BranchStock(tenant=tenant, branch=branch, product=product, stock=product.stock)
+            for product in products
+        ])
+
+        results = []
+        for mode in ('turno', 'sin turno'):
+            shift = None
+            if mode == 'turno':
+                shift = Shift.objects.create(tenant=tenant, register=register, cashier=cashier)
+                shift.register = register
+            service = CheckoutService(tenant=tenant, shift=shift, cashier=cashier)
+            for size in sizes:
+                cart = {str(p.id): '1.500' for p in products[:size]}
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as ctx:
+                    service.process_sale(cart)
+                elapsed = (time.perf_counter() - started) * 1000
+                results.append((mode, size, len(ctx.captured_queries), elapsed))
+        return results
@@ -0,0 +1,62 @@
+"""
+Reporte (opcional) de los planes de las consultas calientes del dashboard, de
+turnos y del historial de precios contra la base configurada, indicando si
+cada una usa su índice (ver apps/sales/query_plans.py):
+
+    python manage.py explain_hot_queries --tenant 3 --verbose
+
+Todo ocurre dentro de una transacción que se revierte. Es informativo: la
+verificación de índices es HotQueryIndexTest (apps/sales/tests.py) y corre sólo
+sobre PostgreSQL (en SQLite el planificador puede preferir otro índice).
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Muestra con EXPLAIN si las consultas del dashboard, de turnos y de precios usan sus índices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='ID del tenant (default: el primero)')
+        parser.add_argument('--verbose', action='store_true', help='Muestra los planes completos')
+
+    def handle(self, *args, **options):
+        from apps.tenants.models import Tenant
+        from apps.sales.query_plans import disable_seqscan, hot_query_checks, query_plans
+
+        tenants = Tenant.objects.order_by('id')
+        if options['tenant']:
+            tenants = tenants.filter(id=options['tenant'])
+        tenant = tenants.first()
+        if tenant is None:
+            raise CommandError("No hay tenant para armar las consultas.")
+
+        try:
+            with transaction.atomic():
+                disable_seqscan()
+                results = [
+                    (label, index, query_plans(run))
+                    for label, index, run in hot_query_checks(tenant)
+                ]
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        missing = 0
+        for label, index, plans in results:
+            ok = any(index in plan for plan in plans)
+            status = self.style.SUCCESS('OK') if ok else self.style.WARNING('SIN ÍNDICE')
+            self.stdout.write(f"{label:<42}{index:<32}{status}")
+            if options['verbose'] or not ok:
+                for plan in plans:
+                    self.stdout.write('    ' + plan.replace('\n', '\n    '))
+            missing += not ok
+
+        if missing:
+            self.stdout.write(self.style.WARNING(f"{missing} consulta(s) sin su índice en esta base."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Todas las consultas usan su índice."))
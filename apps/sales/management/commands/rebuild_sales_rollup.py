@@ -0,0 +1,35 @@
+"""
+Reconstruye DailySalesRollup desde las ventas (backfill inicial o reparación).
+
+    python manage.py rebuild_sales_rollup
+    python manage.py rebuild_sales_rollup --tenant 3 --since 2026-01-01
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el resumen diario de ventas (DailySalesRollup) por tenant'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='ID del tenant (default: todos)')
+        parser.add_argument(
+            '--since', type=date.fromisoformat,
+            help='Recalcular sólo desde esta fecha (YYYY-MM-DD, hora local del tenant)',
+        )
+
+    def handle(self, *args, **options):
+        from apps.tenants.models import Tenant
+        from apps.sales.rollups import rebuild
+
+        tenants = Tenant.objects.all()
+        if options['tenant']:
+            tenants = tenants.filter(id=options['tenant'])
+            if not tenants.exists():
+                raise CommandError(f"Tenant {options['tenant']} no existe.")
+
+        for tenant in tenants:
+            rows = rebuild(tenant, since=options['since'])
+            self.stdout.write(f"{tenant.name}: {rows} filas")
+        self.stdout.write(self.style.SUCCESS("Resumen diario reconstruido."))
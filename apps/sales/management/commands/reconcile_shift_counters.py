@@ -0,0 +1,61 @@
+"""
+Verifica los contadores acumulados de Shift contra las órdenes del turno.
+
+    python manage.py reconcile_shift_counters            # turnos abiertos
+    python manage.py reconcile_shift_counters --all      # todos los turnos
+    python manage.py reconcile_shift_counters --all --fix
+
+Con --fix reescribe los contadores con el valor recalculado. La migración
+sales 0013 ya los calcula para los turnos abiertos; para los turnos cerrados
+antes de esta versión usar --all --fix.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = 'Compara los contadores de cada turno con sus órdenes (y opcionalmente los corrige)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shift', type=int, help='ID de un turno específico')
+        parser.add_argument('--all', action='store_true', help='Incluir turnos cerrados')
+        parser.add_argument('--fix', action='store_true', help='Corregir los contadores que no cuadren')
+
+    def handle(self, *args, **options):
+        from apps.sales.models import Shift
+        from apps.sales.services import ShiftService
+
+        shifts = Shift.all_objects.select_related('tenant').order_by('id')
+        if options['shift']:
+            shifts = shifts.filter(id=options['shift'])
+        elif not options['all']:
+            shifts = shifts.filter(closed_at__isnull=True)
+
+        checked = mismatched = 0
+        for shift in shifts.iterator():
+            checked += 1
+            with transaction.atomic():
+                # Lock the row so no checkout moves the counters mid-check
+                locked = Shift.all_objects.select_for_update().get(pk=shift.pk)
+                expected = ShiftService(shift.tenant).shift_summary(locked).counters()
+                shift = locked
+                diff = {
+                    field: (getattr(shift, field), value)
+                    for field, value in expected.items()
+                    if getattr(shift, field) != value
+                }
+                if not diff:
+                    continue
+                mismatched += 1
+                self.stdout.write(self.style.WARNING(f"Turno {shift.id}:"))
+                for field, (actual, value) in diff.items():
+                    self.stdout.write(f"  {field}: {actual} → {value}")
+                if options['fix']:
+                    Shift.all_objects.filter(pk=shift.pk).update(**expected)
+
+        summary = f"{checked} turnos revisados, {mismatched} con diferencias"
+        if mismatched and not options['fix']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(
+            summary + (" (corregidos)" if mismatched else "")
+        ))
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_order_branch_order_cashier_order_is_voided_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, help_text='Clave enviada por la caja para que los reintentos no dupliquen la venta', max_length=64, null=True, verbose_name='Clave de Idempotencia'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('idempotency_key__isnull', False)), fields=('tenant', 'idempotency_key'), name='sales_order_unique_idempotency_key'),
+        ),
+    ]
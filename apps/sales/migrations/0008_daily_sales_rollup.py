@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:40
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_product_search_indexes'),
+        ('sales', '0007_order_idempotency_key'),
+        ('tenants', '0003_tenant_timezone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Creado el')),
+                ('modified_at', models.DateTimeField(auto_now=True, verbose_name='Modificado el')),
+                ('day', models.DateField(verbose_name='Día')),
+                ('payment_method', models.CharField(blank=True, default='', max_length=20, verbose_name='Medio de Pago')),
+                ('orders', models.IntegerField(default=0, verbose_name='Órdenes')),
+                ('total_clp', models.IntegerField(default=0, verbose_name='Total (CLP)')),
+                ('quantity', models.DecimalField(decimal_places=3, default=0, max_digits=14, verbose_name='Cantidad')),
+                ('revenue_clp', models.IntegerField(default=0, verbose_name='Venta Líneas (CLP)')),
+                ('cost_clp', models.DecimalField(decimal_places=3, default=0, max_digits=16, verbose_name='Costo (CLP)')),
+                ('branch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='tenants.branch', verbose_name='Sucursal')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='inventory.product', verbose_name='Producto')),
+                ('tenant', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_set', to='tenants.tenant', verbose_name='Tienda')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Ventas',
+                'verbose_name_plural': 'Resúmenes Diarios de Ventas',
+                'indexes': [models.Index(fields=['tenant', 'day'], name='sales_rollup_tenant_day')],
+                'constraints': [models.UniqueConstraint(models.F('tenant'), django.db.models.functions.comparison.Coalesce('branch', 0), models.F('day'), django.db.models.functions.comparison.Coalesce('product', 0), models.F('payment_method'), name='sales_rollup_unique_key')],
+            },
+        ),
+    ]
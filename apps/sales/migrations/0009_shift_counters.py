@@ -0,0 +1,73 @@
+# Generated by Django 6.0.2 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_daily_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shift',
+            name='card_clp',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Tarjeta (CLP)'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='cash_clp',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Efectivo (CLP)'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='gross_clp',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Total Bruto (CLP)'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='item_lines',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Líneas Vendidas'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='item_units',
+            field=models.DecimalField(decimal_places=3, default=0, editable=False, max_digits=14, verbose_name='Unidades Vendidas'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='iva_clp',
+            field=models.IntegerField(default=0, editable=False, verbose_name='IVA (CLP)'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='mixed_clp',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Pago Mixto (CLP)'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='net_clp',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Neto (CLP)'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='orders_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Ventas'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='transfer_clp',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Transferencia (CLP)'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='voided_clp',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Anulado (CLP)'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='voided_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Anuladas'),
+        ),
+    ]
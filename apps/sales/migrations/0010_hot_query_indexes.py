@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_make_tenant_nonnull'),
+        ('sales', '0009_shift_counters'),
+        ('tenants', '0003_tenant_timezone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('is_paid', True), ('is_voided', False)), fields=['tenant', 'date'], name='sales_order_paid_tenant_date'),
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(condition=models.Q(('closed_at__isnull', True)), fields=['tenant', 'register'], name='sales_shift_open'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_hot_query_indexes'),
+        ('sales', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItemBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=3, max_digits=10, verbose_name='Cantidad')),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='allocations', to='inventory.batch')),
+                ('order_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batch_allocations', to='sales.orderitem')),
+            ],
+            options={
+                'verbose_name': 'Asignación de lote',
+                'verbose_name_plural': 'Asignaciones de lote',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0011_order_item_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shift',
+            name='card_orders',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Ventas Tarjeta'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='cash_orders',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Ventas Efectivo'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='mixed_orders',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Ventas Pago Mixto'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='transfer_orders',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Ventas Transferencia'),
+        ),
+    ]
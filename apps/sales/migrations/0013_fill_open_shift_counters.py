@@ -0,0 +1,75 @@
+# Generated by Django 6.0.2 on 2026-10-18 21:20
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+METHOD_COUNTERS = {
+    'CASH': ('cash_clp', 'cash_orders'),
+    'CARD': ('card_clp', 'card_orders'),
+    'TRANSFER': ('transfer_clp', 'transfer_orders'),
+    'MIXED': ('mixed_clp', 'mixed_orders'),
+}
+
+
+def fill_open_shift_counters(apps, schema_editor):
+    """
+    Los turnos abiertos al desplegar los contadores parten en 0: se calculan
+    desde sus órdenes para que el cierre muestre sus ventas y su efectivo.
+    Los cerrados no se tocan (ver reconcile_shift_counters --all --fix).
+    """
+    Shift = apps.get_model('sales', 'Shift')
+    Order = apps.get_model('sales', 'Order')
+    OrderItem = apps.get_model('sales', 'OrderItem')
+    Payment = apps.get_model('sales', 'Payment')
+
+    for shift_id in Shift.objects.filter(closed_at__isnull=True).values_list('id', flat=True):
+        methods = {}
+        for order_id, method in Payment.objects.filter(
+            order__shift_id=shift_id,
+        ).order_by('order_id', 'id').values_list('order_id', 'method'):
+            methods.setdefault(order_id, method)
+        items = {
+            row['order_id']: (row['lines'], row['units'] or Decimal('0'))
+            for row in OrderItem.objects.filter(order__shift_id=shift_id).values('order_id').annotate(
+                lines=Count('id'), units=Sum('quantity'),
+            ).order_by()
+        }
+
+        values = {
+            'orders_count': 0, 'voided_count': 0, 'gross_clp': 0, 'net_clp': 0, 'iva_clp': 0,
+            'voided_clp': 0, 'item_lines': 0, 'item_units': Decimal('0'),
+        }
+        for amount_field, orders_field in METHOD_COUNTERS.values():
+            values[amount_field] = values[orders_field] = 0
+        for order_id, is_voided, total, net, iva in Order.objects.filter(
+            shift_id=shift_id, is_paid=True,
+        ).values_list('id', 'is_voided', 'total_clp', 'net_amount', 'iva_amount'):
+            if is_voided:
+                values['voided_count'] += 1
+                values['voided_clp'] += total
+                continue
+            lines, units = items.get(order_id, (0, Decimal('0')))
+            values['orders_count'] += 1
+            values['gross_clp'] += total
+            values['net_clp'] += net
+            values['iva_clp'] += iva
+            values['item_lines'] += lines
+            values['item_units'] += units
+            fields = METHOD_COUNTERS.get(methods.get(order_id))
+            if fields:
+                values[fields[0]] += total
+                values[fields[1]] += 1
+        Shift.objects.filter(pk=shift_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0012_shift_method_order_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_open_shift_counters, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,9 @@
 from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce
 from apps.core.models import TenantAwareModel
 from apps.customers.models import Customer
-from apps.inventory.models import Product
+from apps.inventory.models import Batch, Product
 
 
 class CashRegister(TenantAwareModel):
@@ -39,10 +40,53 @@ class Shift(TenantAwareModel):
     closing_cash = models.IntegerField(null=True, blank=True, verbose_name="Efectivo Final (CLP)")
     notes = models.TextField(blank=True, verbose_name="Observaciones")
 
+    # Contadores acumulados (los mantienen checkout y anulaciones; ver
+    # `manage.py reconcile_shift_counters`). Montos netos de anulaciones.
+    orders_count = models.IntegerField(default=0, editable=False, verbose_name="Ventas")
+    voided_count = models.IntegerField(default=0, editable=False, verbose_name="Anuladas")
+    gross_clp = models.IntegerField(default=0, editable=False, verbose_name="Total Bruto (CLP)")
+    net_clp = models.IntegerField(default=0, editable=False, verbose_name="Neto (CLP)")
+    iva_clp = models.IntegerField(default=0, editable=False, verbose_name="IVA (CLP)")
+    cash_clp = models.IntegerField(default=0, editable=False, verbose_name="Efectivo (CLP)")
+    card_clp = models.IntegerField(default=0, editable=False, verbose_name="Tarjeta (CLP)")
+    transfer_clp = models.IntegerField(default=0, editable=False, verbose_name="Transferencia (CLP)")
+    mixed_clp = models.IntegerField(default=0, editable=False, verbose_name="Pago Mixto (CLP)")
+    cash_orders = models.IntegerField(default=0, editable=False, verbose_name="Ventas Efectivo")
+    card_orders = models.IntegerField(default=0, editable=False, verbose_name="Ventas Tarjeta")
+    transfer_orders = models.IntegerField(default=0, editable=False, verbose_name="Ventas Transferencia")
+    mixed_orders = models.IntegerField(default=0, editable=False, verbose_name="Ventas Pago Mixto")
+    voided_clp = models.IntegerField(default=0, editable=False, verbose_name="Anulado (CLP)")
+    item_lines = models.IntegerField(default=0, editable=False, verbose_name="Líneas Vendidas")
+    item_units = models.DecimalField(
+        max_digits=14, decimal_places=3, default=0, editable=False,
+        verbose_name="Unidades Vendidas",
+    )
+
+    # Payment.method → contadores de Shift (monto, número de ventas)
+    METHOD_COUNTERS = {
+        'CASH': ('cash_clp', 'cash_orders'),
+        'CARD': ('card_clp', 'card_orders'),
+        'TRANSFER': ('transfer_clp', 'transfer_orders'),
+        'MIXED': ('mixed_clp', 'mixed_orders'),
+    }
+    COUNTER_FIELDS = (
+        'orders_count', 'voided_count', 'gross_clp', 'net_clp', 'iva_clp',
+        'cash_clp', 'card_clp', 'transfer_clp', 'mixed_clp',
+        'cash_orders', 'card_orders', 'transfer_orders', 'mixed_orders',
+        'voided_clp', 'item_lines', 'item_units',
+    )
+
     class Meta:
         verbose_name = "Turno"
         verbose_name_plural = "Turnos"
         ordering = ['-opened_at']
+        indexes = [
+            # Open shifts only (a handful of rows): ShiftService.get_open_shift
+            models.Index(
+                fields=['tenant', 'register'], name='sales_shift_open',
+                condition=models.Q(closed_at__isnull=True),
+            ),
+        ]
 
     def __str__(self):
         status = "Abierto" if self.is_open else "Cerrado"
@@ -86,6 +130,11 @@ class Order(TenantAwareModel):
         null=True, blank=True, related_name='voided_orders',
     )
     void_reason = models.TextField(blank=True, verbose_name="Razón Anulación")
+    idempotency_key = models.CharField(
+        max_length=64, null=True, blank=True, editable=False,
+        verbose_name="Clave de Idempotencia",
+        help_text="Clave enviada por la caja para que los reintentos no dupliquen la venta",
+    )
 
     # Desglose fiscal
     net_amount = models.IntegerField(default=0, verbose_name="Neto")
@@ -104,6 +153,20 @@ class Order(TenantAwareModel):
         ordering = ['-date']
         verbose_name = "Venta"
         verbose_name_plural = "Ventas"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='sales_order_unique_idempotency_key',
+            ),
+        ]
+        indexes = [
+            # Paid, non-voided sales by date: MetricsService time series/reports
+            models.Index(
+                fields=['tenant', 'date'], name='sales_order_paid_tenant_date',
+                condition=models.Q(is_paid=True, is_voided=False),
+            ),
+        ]
 
 
 class OrderItem(models.Model):
@@ -120,6 +183,22 @@ class OrderItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class OrderItemBatch(models.Model):
+    """Cantidad de una línea de venta descontada de un lote (FEFO)."""
+    order_item = models.ForeignKey(
+        OrderItem, on_delete=models.CASCADE, related_name='batch_allocations',
+    )
+    batch = models.ForeignKey(Batch, on_delete=models.PROTECT, related_name='allocations')
+    quantity = models.DecimalField(max_digits=10, decimal_places=3, verbose_name="Cantidad")
+
+    class Meta:
+        verbose_name = "Asignación de lote"
+        verbose_name_plural = "Asignaciones de lote"
+
+    def __str__(self):
+        return f"{self.batch} × {self.quantity}"
+
+
 class Payment(TenantAwareModel):
     METHOD_CHOICES = [
         ('CASH', 'Efectivo'),
@@ -141,3 +220,57 @@ class Payment(TenantAwareModel):
     class Meta:
         verbose_name = "Pago"
         verbose_name_plural = "Pagos"
+
+
+class DailySalesRollup(TenantAwareModel):
+    """
+    Ventas pre-agregadas por tenant, sucursal, día (hora local del tenant),
+    producto y medio de pago. La mantienen CheckoutService (al cobrar) y
+    void_sale (al anular) al confirmar su transacción; se reconstruye con
+    `manage.py rebuild_sales_rollup`.
+
+    Filas con product=None: totales de órdenes (orders, total_clp).
+    Filas con producto: totales de línea (quantity, revenue_clp, cost_clp).
+    """
+    branch = models.ForeignKey(
+        'tenants.Branch', on_delete=models.CASCADE,
+        null=True, blank=True, verbose_name="Sucursal",
+    )
+    day = models.DateField(verbose_name="Día")
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE,
+        null=True, blank=True, verbose_name="Producto",
+    )
+    payment_method = models.CharField(
+        max_length=20, blank=True, default='', verbose_name="Medio de Pago",
+    )
+    orders = models.IntegerField(default=0, verbose_name="Órdenes")
+    total_clp = models.IntegerField(default=0, verbose_name="Total (CLP)")
+    quantity = models.DecimalField(
+        max_digits=14, decimal_places=3, default=0, verbose_name="Cantidad",
+    )
+    revenue_clp = models.IntegerField(default=0, verbose_name="Venta Líneas (CLP)")
+    cost_clp = models.DecimalField(
+        max_digits=16, decimal_places=3, default=0, verbose_name="Costo (CLP)",
+    )
+
+    class Meta:
+        verbose_name = "Resumen Diario de Ventas"
+        verbose_name_plural = "Resúmenes Diarios de Ventas"
+        constraints = [
+            # Coalesce: one row per key even when branch/product are NULL
+            models.UniqueConstraint(
+                models.F('tenant'),
+                Coalesce('branch', 0),
+                models.F('day'),
+                Coalesce('product', 0),
+                models.F('payment_method'),
+                name='sales_rollup_unique_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['tenant', 'day'], name='sales_rollup_tenant_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} — {self.product or 'Órdenes'} ({self.payment_method or '-'})"
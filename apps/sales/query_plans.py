@@ -0,0 +1,81 @@
+"""
+Planes de ejecución (EXPLAIN) de las consultas calientes de MetricsService,
+ShiftService y del historial de precios, y el índice que cada una debe usar:
+
+    sales_order_paid_tenant_date  ventas pagadas no anuladas por fecha (parcial)
+    sales_shift_open              turnos abiertos por caja (parcial)
+    inv_product_low_stock_alert   productos bajo stock mínimo por stock (parcial)
+    inv_batch_remaining_exp       lotes con saldo por vencimiento (parcial)
+    sales_rollup_tenant_day       resumen diario por fecha
+    inv_price_product_time        precio vigente a una fecha (historial de precios)
+    inv_price_tenant_time         cambios de precio de un rango
+
+Cada chequeo ejecuta el método del servicio, captura el SQL que emite y corre
+EXPLAIN sobre esas mismas consultas. Lo usan el test de índices
+(HotQueryIndexTest, sólo PostgreSQL) y el reporte explain_hot_queries.
+"""
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def disable_seqscan():
+    """
+    En PostgreSQL desactiva el seq scan hasta el fin de la transacción
+    (SET LOCAL), para que el plan muestre el índice aunque las tablas sean
+    chicas. No hace nada en otros motores.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+
+def hot_query_checks(tenant):
+    """[(etiqueta, índice esperado, callable que ejecuta la consulta)]"""
+    from django.utils import timezone
+    from apps.dashboard.services import MetricsService
+    from apps.inventory.models import Product
+    from apps.inventory.pricing import price_at, price_changes
+    from apps.sales.models import CashRegister
+    from apps.sales.services import ShiftService
+
+    metrics = MetricsService(tenant, use_cache=False)
+    shifts = ShiftService(tenant)
+    today = metrics.today()
+    register = CashRegister.all_objects.filter(tenant=tenant).first()
+    product_id = Product.all_objects.filter(tenant=tenant).values_list('id', flat=True).first() or 0
+    now = timezone.now()
+    return [
+        ('MetricsService.sales_series (hour)', 'sales_order_paid_tenant_date',
+         lambda: metrics.sales_series(today, today + timedelta(days=1), 'hour')),
+        ('MetricsService.sales_series (day)', 'sales_rollup_tenant_day',
+         lambda: metrics.sales_series(today - timedelta(days=30), today, 'day')),
+        ('MetricsService.low_stock_alerts', 'inv_product_low_stock_alert',
+         lambda: list(metrics.low_stock_alerts()[:10])),
+        ('MetricsService.expiration_alerts', 'inv_batch_remaining_exp',
+         lambda: list(metrics.expiration_alerts()[:10])),
+        ('MetricsService.expired_batches', 'inv_batch_remaining_exp',
+         lambda: list(metrics.expired_batches()[:10])),
+        ('ShiftService.get_open_shift', 'sales_shift_open',
+         lambda: shifts.get_open_shift(register.pk if register else 0)),
+        ('pricing.price_at', 'inv_price_product_time',
+         lambda: price_at(product_id, now)),
+        ('pricing.price_changes', 'inv_price_tenant_time',
+         lambda: list(price_changes(tenant.id, now - timedelta(days=30), now))),
+    ]
+
+
+def query_plans(run):
+    """Planes (texto) de todas las consultas SELECT que ejecuta run()."""
+    with CaptureQueriesContext(connection) as ctx:
+        run()
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    plans = []
+    with connection.cursor() as cursor:
+        for query in ctx.captured_queries:
+            if not query['sql'].lstrip().upper().startswith('SELECT'):
+                continue
+            cursor.execute(prefix + query['sql'])
+            plans.append('\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall()))
+    return plans
@@ -0,0 +1,167 @@
+"""
+Resumen diario de ventas (DailySalesRollup).
+
+CheckoutService y void_sale aplican aquí los deltas de cada venta al
+confirmar su transacción (schedule_order): la fila de totales (product=None)
+es la misma para todas las ventas del día con un medio de pago, y actualizarla
+dentro del checkout haría esperar a cada caja el commit de la anterior. Son
+siempre dos consultas en su propia transacción corta: un INSERT que ignora
+las filas ya existentes (restricción única sales_rollup_unique_key) y un único
+UPDATE con CASE que les suma el delta. Si el proceso cae entre el commit de la
+venta y el del resumen, la venta falta en el resumen hasta el próximo rebuild.
+
+rebuild() recalcula el resumen desde Order/OrderItem (backfill o reparación).
+"""
+from datetime import datetime, time
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DailySalesRollup, Order, OrderItem, Payment
+
+ORDER_FIELDS = ('orders', 'total_clp')
+LINE_FIELDS = ('quantity', 'revenue_clp', 'cost_clp')
+COST_FIELD = DecimalField(max_digits=16, decimal_places=3)
+
+
+def rollup_day(tenant, moment):
+    """Día (hora local del tenant) al que se imputa una venta."""
+    return timezone.localtime(moment, tenant.tzinfo).date()
+
+
+def schedule_order(tenant, order, lines, payment_method, sign=1):
+    """record_order al confirmar la transacción en curso (un error no anula la venta)."""
+    transaction.on_commit(
+        partial(record_order, tenant, order, lines, payment_method, sign), robust=True,
+    )
+
+
+@transaction.atomic
+def record_order(tenant, order, lines, payment_method, sign=1):
+    """
+    Suma (sign=1) o resta (sign=-1, anulación) una venta al resumen.
+
+    lines: [(product_id, quantity, line_total_clp, cost_at_sale)]
+    """
+    deltas = {None: {'orders': sign, 'total_clp': sign * order.total_clp}}
+    for product_id, quantity, line_total, cost in lines:
+        row = deltas.setdefault(product_id, {'quantity': 0, 'revenue_clp': 0, 'cost_clp': 0})
+        row['quantity'] += sign * quantity
+        row['revenue_clp'] += sign * line_total
+        row['cost_clp'] += sign * cost * Decimal(quantity)
+    _apply(
+        tenant_id=tenant.id,
+        branch_id=order.branch_id,
+        day=rollup_day(tenant, order.date),
+        payment_method=payment_method or '',
+        deltas=deltas,
+    )
+
+
+def _apply(tenant_id, branch_id, day, payment_method, deltas):
+    """Aplica {product_id|None: {campo: delta}} a las filas de una clave."""
+    # 1. Make sure every row exists (rows already there are left untouched)
+    DailySalesRollup.all_objects.bulk_create([
+        DailySalesRollup(
+            tenant_id=tenant_id, branch_id=branch_id, day=day,
+            product_id=product_id, payment_method=payment_method,
+        )
+        for product_id in deltas
+    ], ignore_conflicts=True)
+
+    # 2. Add the deltas with a single UPDATE (row locks serialize concurrent sales)
+    updates = {}
+    for field in ORDER_FIELDS + LINE_FIELDS:
+        whens = [
+            When(_product_q(product_id), then=F(field) + values[field])
+            for product_id, values in deltas.items()
+            if values.get(field)
+        ]
+        if whens:
+            updates[field] = Case(
+                *whens, default=F(field),
+                output_field=DailySalesRollup._meta.get_field(field),
+            )
+    product_filter = Q()
+    for product_id in deltas:
+        product_filter |= _product_q(product_id)
+    DailySalesRollup.all_objects.filter(
+        product_filter,
+        tenant_id=tenant_id, branch_id=branch_id,
+        day=day, payment_method=payment_method,
+    ).update(**updates)
+
+
+def _product_q(product_id):
+    if product_id is None:
+        return Q(product__isnull=True)
+    return Q(product_id=product_id)
+
+
+def payment_method_of(order_ref):
+    """Expresión: medio del primer pago de la orden ('' si no tiene)."""
+    first_payment = Payment.all_objects.filter(order=order_ref).order_by('id')
+    return Coalesce(Subquery(first_payment.values('method')[:1]), Value(''))
+
+
+@transaction.atomic
+def rebuild(tenant, since=None):
+    """
+    Recalcula el resumen del tenant (desde la fecha since, o completo) con dos
+    consultas agrupadas. Conviene correrlo fuera del horario de venta: las
+    ventas que entren durante el recálculo pueden quedar fuera.
+
+    Returns: número de filas creadas.
+    """
+    tz = tenant.tzinfo
+    orders = Order.all_objects.filter(tenant=tenant, is_paid=True, is_voided=False)
+    items = OrderItem.objects.filter(
+        order__tenant=tenant, order__is_paid=True, order__is_voided=False,
+    )
+    existing = DailySalesRollup.all_objects.filter(tenant=tenant)
+    if since is not None:
+        start = timezone.make_aware(datetime.combine(since, time.min), tz)
+        orders = orders.filter(date__gte=start)
+        items = items.filter(order__date__gte=start)
+        existing = existing.filter(day__gte=since)
+    existing.delete()
+
+    order_rows = orders.annotate(
+        day=TruncDate('date', tzinfo=tz),
+        method=payment_method_of(OuterRef('pk')),
+    ).values('branch_id', 'day', 'method').annotate(
+        n=Count('id'), total=Sum('total_clp'),
+    ).order_by()
+
+    line_rows = items.annotate(
+        day=TruncDate('order__date', tzinfo=tz),
+        method=payment_method_of(OuterRef('order_id')),
+    ).values('order__branch_id', 'day', 'method', 'product_id').annotate(
+        qty=Sum('quantity'),
+        revenue=Sum('line_total_clp'),
+        cost=Sum(F('cost_at_sale') * F('quantity'), output_field=COST_FIELD),
+    ).order_by()
+
+    rollups = [
+        DailySalesRollup(
+            tenant=tenant, branch_id=row['branch_id'], day=row['day'],
+            payment_method=row['method'], orders=row['n'], total_clp=row['total'] or 0,
+        )
+        for row in order_rows
+    ] + [
+        DailySalesRollup(
+            tenant=tenant, branch_id=row['order__branch_id'], day=row['day'],
+            product_id=row['product_id'], payment_method=row['method'],
+            quantity=row['qty'] or 0, revenue_clp=row['revenue'] or 0,
+            cost_clp=row['cost'] or 0,
+        )
+        for row in line_rows
+    ]
+    DailySalesRollup.all_objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
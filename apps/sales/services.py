@@ -3,11 +3,23 @@ Service layer for sales operations.
 Encapsulates business logic away from views for testability and reuse.
 """
 from decimal import Decimal
-from django.db import transaction
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from .models import Order, OrderItem, Payment, Shift, CashRegister
-from apps.inventory.models import Product
+from .rollups import payment_method_of, schedule_order
+from .stock import (
+    StockConflict, allocate_batches, decrement_branch_stock, decrement_stock,
+    increment_stock, lock_products, release_batches,
+)
+from apps.dashboard.cache import invalidate_dashboard
+from apps.inventory.branches import add_branch_stock, main_branch_id
+from apps.inventory.ledger import record_movements
+from apps.inventory.models import Product, StockMovement
 
 
 # --- Custom exceptions ---
@@ -21,6 +33,14 @@ class InsufficientStockError(SalesError):
     pass
 
 
+class PriceChangedError(SalesError):
+    """El precio de algún producto cambió desde que se agregó al carrito."""
+
+    def __init__(self, message, prices):
+        super().__init__(message)
+        self.prices = prices  # {product_id: precio vigente}
+
+
 class ShiftClosedError(SalesError):
     pass
 
@@ -36,57 +56,102 @@ class NoOpenShiftError(SalesError):
 # --- CheckoutService ---
 
 class CheckoutService:
-    """Encapsula toda la lógica de cobro y cierre de venta."""
+    """
+    Encapsula toda la lógica de cobro y cierre de venta.
+
+    Un único pipeline para ambos modos: con turno (shift abierto) o sin turno
+    (shift=None, la venta queda sin caja ni sucursal asociada).
+    """
 
     def __init__(self, tenant, shift, cashier):
         self.tenant = tenant
         self.shift = shift
         self.cashier = cashier
 
-    @transaction.atomic
+    @staticmethod
+    def find_by_idempotency_key(tenant, idempotency_key):
+        """Venta ya confirmada con esta clave (una lectura por índice único), o None."""
+        if not idempotency_key:
+            return None
+        return Order.all_objects.filter(
+            tenant=tenant, idempotency_key=idempotency_key,
+        ).first()
+
     def process_sale(self, cart_items, customer=None, payment_method='CASH',
-                     payment_details=None):
+                     payment_details=None, idempotency_key=None,
+                     expected_prices=None):
         """
-        Crea la orden, descuenta stock, registra pago.
+        Crea la orden, descuenta stock (y lotes, en orden FEFO), registra pago.
 
         Args:
             cart_items: dict {product_id: quantity_str}
             customer: Customer instance or None
             payment_method: 'CASH', 'CARD', 'TRANSFER', 'MIXED'
             payment_details: dict with optional transaction_id, card_last_4
+            idempotency_key: clave del cliente; si ya existe una venta con
+                ella se devuelve esa venta sin volver a cobrar.
+            expected_prices: dict {product_id: price_clp} mostrado al cajero;
+                si algún precio cambió no se cobra.
 
         Returns: Order
 
         Raises:
             ShiftClosedError: si el turno está cerrado
             InsufficientStockError: si no hay stock suficiente
+            PriceChangedError: si un precio difiere de expected_prices
         """
-        if not self.shift.is_open:
+        existing = self.find_by_idempotency_key(self.tenant, idempotency_key)
+        if existing:
+            return existing
+
+        try:
+            return self._create_sale(
+                cart_items, customer, payment_method, payment_details,
+                idempotency_key, expected_prices,
+            )
+        except IntegrityError:
+            # Reintento concurrente: la otra petición confirmó primero
+            existing = self.find_by_idempotency_key(self.tenant, idempotency_key)
+            if existing:
+                return existing
+            raise
+
+    @transaction.atomic
+    def _create_sale(self, cart_items, customer, payment_method,
+                     payment_details, idempotency_key, expected_prices=None):
+        if self.shift is not None and not self.shift.is_open:
             raise ShiftClosedError("El turno está cerrado. Abre un nuevo turno.")
 
-        # Create order
+        lines, total = self._build_lines(cart_items, expected_prices)
+
+        # Create order (totals known up front: a single INSERT)
+        net_amount = int(total / 1.19)
         order = Order(
             tenant=self.tenant,
             customer=customer,
             shift=self.shift,
-            branch=self.shift.register.branch,
+            branch=self.shift.register.branch if self.shift else None,
             cashier=self.cashier,
+            total_clp=total,
+            net_amount=net_amount,
+            iva_amount=total - net_amount,
+            is_paid=True,
+            idempotency_key=idempotency_key or None,
         )
         order.save()
 
-        total = 0
-        for product_id, quantity_str in cart_items.items():
-            product = Product.all_objects.get(id=product_id)
-            qty = Decimal(quantity_str)
-
-            if product.stock < qty:
-                raise InsufficientStockError(
-                    f"Stock insuficiente para {product.name}: "
-                    f"disponible {product.stock}, requerido {qty}"
-                )
-
-            line_total = int(round(product.price_clp * float(qty)))
-            OrderItem.objects.create(
+        if self.shift is not None:
+            # Running counters; also catches a shift closed since it was loaded
+            updated = Shift.all_objects.filter(
+                pk=self.shift.pk, closed_at__isnull=True,
+            ).update(**shift_counter_updates(
+                order, payment_method, len(lines), sum(qty for _, qty, _ in lines),
+            ))
+            if not updated:
+                raise ShiftClosedError("El turno está cerrado. Abre un nuevo turno.")
+
+        items = OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
                 product=product,
                 quantity=qty,
@@ -94,17 +159,18 @@ class CheckoutService:
                 cost_at_sale=product.cost_clp,
                 line_total_clp=line_total,
             )
-
-            product.stock -= qty
-            product.save()
-            total += line_total
-
-        # Fiscal breakdown
-        order.total_clp = total
-        order.net_amount = int(total / 1.19)
-        order.iva_amount = total - order.net_amount
-        order.is_paid = True
-        order.save()
+            for product, qty, line_total in lines
+        ])
+
+        # Shiftless sales draw from the main branch (None: tenant without branches)
+        stock_branch_id = order.branch_id or main_branch_id(self.tenant.id)
+        self._decrement_stock(lines, stock_branch_id)
+        allocate_batches(self.tenant.id, items)
+        record_movements(
+            self.tenant.id, StockMovement.SALE,
+            [(product.id, -qty) for product, qty, _ in lines],
+            reference=f"Venta #{order.pk}", user=self.cashier, branch_id=stock_branch_id,
+        )
 
         # Payment
         details = payment_details or {}
@@ -117,34 +183,270 @@ class CheckoutService:
             card_last_4=details.get('card_last_4'),
         ).save()
 
+        schedule_order(self.tenant, order, [
+            (product.id, qty, line_total, product.cost_clp)
+            for product, qty, line_total in lines
+        ], payment_method)
+        transaction.on_commit(partial(invalidate_dashboard, self.tenant.id))
+
         return order
 
+    def _build_lines(self, cart_items, expected_prices=None):
+        """
+        Bloquea (en orden de id) y carga todos los productos del carrito en una
+        sola consulta, y valida stock y (opcionalmente) precios.
+
+        Returns: (lines, total) donde lines es [(product, qty, line_total)]
+        en el mismo orden del carrito.
+        """
+        quantities = {
+            int(product_id): Decimal(quantity_str)
+            for product_id, quantity_str in cart_items.items()
+        }
+        products = lock_products(quantities, tenant_id=self.tenant.id)
+
+        lines = []
+        total = 0
+        changed = {}
+        for product_id, qty in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                raise Product.DoesNotExist(
+                    f"Producto {product_id} no existe."
+                )
+            if product.stock < qty:
+                raise InsufficientStockError(
+                    self._stock_message(product, product.stock, qty)
+                )
+
+            if expected_prices and expected_prices.get(product_id, product.price_clp) != product.price_clp:
+                changed[product_id] = product
+
+            line_total = int(round(float(product.price_clp) * float(qty)))
+            lines.append((product, qty, line_total))
+            total += line_total
+
+        if changed:
+            raise PriceChangedError(
+                "Precio actualizado para "
+                + ", ".join(product.name for product in changed.values())
+                + ". Revisa el total antes de cobrar.",
+                {product_id: product.price_clp for product_id, product in changed.items()},
+            )
+        return lines, total
+
+    def _decrement_stock(self, lines, branch_id=None):
+        """Descuenta stock (total y de la sucursal) con UPDATE condicionales (ver stock.py)."""
+        try:
+            decrement_stock((product, qty) for product, qty, _ in lines)
+            if branch_id:
+                decrement_branch_stock(branch_id, ((product, qty) for product, qty, _ in lines))
+        except StockConflict as e:
+            raise InsufficientStockError(
+                self._stock_message(e.product, e.available, e.required)
+            )
+
+    @staticmethod
+    def _stock_message(product, available, qty):
+        return (
+            f"Stock insuficiente para {product.name}: "
+            f"disponible {available}, requerido {qty}"
+        )
+
     @transaction.atomic
     def void_sale(self, order, voided_by, reason=''):
         """
-        Anula una venta y devuelve stock.
+        Anula una venta y devuelve stock (al producto y a los lotes de los que
+        salió).
 
         Args:
             order: Order to void
             voided_by: User who authorizes void
             reason: Reason for void
         """
-        if order.is_voided:
+        # Claim the void first: a conditional UPDATE takes the row lock, so a
+        # concurrent void of the same order waits here and then matches 0 rows
+        # instead of applying every reversal a second time.
+        claimed = Order.all_objects.filter(
+            pk=order.pk, tenant_id=self.tenant.id, is_voided=False,
+        ).update(
+            is_voided=True, voided_by=voided_by, void_reason=reason,
+            modified_at=timezone.now(),
+        )
+        if not claimed:
             raise SalesError("Esta venta ya fue anulada.")
 
-        # Restore stock
-        for item in order.items.select_related('product'):
-            item.product.stock += item.quantity
-            item.product.save()
+        # Restore stock (atomic F() increments, rows locked in id order)
+        items = list(order.items.values_list(
+            'product_id', 'quantity', 'line_total_clp', 'cost_at_sale',
+        ))
+        lock_products([item[0] for item in items], tenant_id=self.tenant.id)
+        increment_stock((product_id, qty) for product_id, qty, _, _ in items)
+        stock_branch_id = order.branch_id or main_branch_id(self.tenant.id)
+        if stock_branch_id:
+            add_branch_stock(self.tenant.id, stock_branch_id, (
+                (product_id, qty) for product_id, qty, _, _ in items
+            ))
+        release_batches(order)
+        record_movements(
+            self.tenant.id, StockMovement.VOID,
+            [(product_id, qty) for product_id, qty, _, _ in items],
+            reference=f"Anulación venta #{order.pk}", user=voided_by, branch_id=stock_branch_id,
+        )
+
+        if order.is_paid:
+            method = order.payments.order_by('id').values_list('method', flat=True).first()
+            schedule_order(self.tenant, order, items, method, sign=-1)
+            if order.shift_id:
+                Shift.all_objects.filter(pk=order.shift_id).update(**shift_counter_updates(
+                    order, method, len(items), sum(item[1] for item in items), sign=-1,
+                ))
+            transaction.on_commit(partial(invalidate_dashboard, self.tenant.id))
 
         order.is_voided = True
         order.voided_by = voided_by
         order.void_reason = reason
-        order.save()
 
         return order
 
 
+# --- Shift summary ---
+
+def shift_counter_updates(order, payment_method, item_lines, item_units, sign=1):
+    """
+    Asignaciones F() para los contadores de Shift por una venta
+    (sign=-1: anulación, que además suma a voided_count/voided_clp).
+    """
+    deltas = {
+        'orders_count': sign,
+        'gross_clp': sign * order.total_clp,
+        'net_clp': sign * order.net_amount,
+        'iva_clp': sign * order.iva_amount,
+        'item_lines': sign * item_lines,
+        'item_units': sign * item_units,
+    }
+    method_fields = Shift.METHOD_COUNTERS.get(payment_method)
+    if method_fields:
+        amount_field, orders_field = method_fields
+        deltas[amount_field] = sign * order.total_clp
+        deltas[orders_field] = sign
+    if sign < 0:
+        deltas['voided_count'] = 1
+        deltas['voided_clp'] = order.total_clp
+    return {field: F(field) + value for field, value in deltas.items()}
+
+
+class ShiftSummary:
+    """
+    Resumen de un turno para el formulario de cierre y el comprobante.
+
+    from_shift(): O(1), desde los contadores del propio Shift.
+    from_rows(): desde las filas agregadas de ShiftService.shift_summary()
+    (recalculo desde las órdenes; lo usa la conciliación de contadores).
+    """
+
+    METHOD_LABELS = dict(Payment.METHOD_CHOICES)
+
+    def __init__(self, shift, closing_cash=None, total_orders=0, total_sales=0,
+                 net_amount=0, iva_amount=0, item_lines=0, item_units=Decimal('0'),
+                 voided_orders=0, voided_total=0, by_method=()):
+        self.shift = shift
+        self.closing_cash = closing_cash or 0
+        self.total_orders = total_orders
+        self.total_sales = total_sales
+        self.net_amount = net_amount
+        self.iva_amount = iva_amount
+        self.item_lines = item_lines
+        self.item_units = item_units
+        self.voided_orders = voided_orders
+        self.voided_total = voided_total
+        # [{'method', 'label', 'orders', 'total'}]
+        self.by_method = sorted(by_method, key=lambda m: -m['total'])
+
+        self.total_cash_received = sum(
+            m['total'] for m in self.by_method if m['method'] == 'CASH'
+        )
+        self.expected_cash = shift.opening_cash + self.total_cash_received
+        self.difference = self.closing_cash - self.expected_cash
+
+    @classmethod
+    def _method(cls, method, orders, total):
+        return {
+            'method': method,
+            'label': cls.METHOD_LABELS.get(method, method or 'Sin pago'),
+            'orders': orders,
+            'total': total,
+        }
+
+    @classmethod
+    def from_shift(cls, shift, closing_cash=None):
+        return cls(
+            shift, closing_cash,
+            total_orders=shift.orders_count,
+            total_sales=shift.gross_clp,
+            net_amount=shift.net_clp,
+            iva_amount=shift.iva_clp,
+            item_lines=shift.item_lines,
+            item_units=shift.item_units,
+            voided_orders=shift.voided_count,
+            voided_total=shift.voided_clp,
+            by_method=[
+                cls._method(method, getattr(shift, orders_field), getattr(shift, amount_field))
+                for method, (amount_field, orders_field) in Shift.METHOD_COUNTERS.items()
+                if getattr(shift, orders_field) or getattr(shift, amount_field)
+            ],
+        )
+
+    @classmethod
+    def from_rows(cls, shift, rows, closing_cash=None):
+        """rows: [{'method', 'is_voided', 'orders', 'total', 'net', 'iva', 'lines', 'units'}]"""
+        values = {
+            'total_orders': 0, 'total_sales': 0, 'net_amount': 0, 'iva_amount': 0,
+            'item_lines': 0, 'item_units': Decimal('0'),
+            'voided_orders': 0, 'voided_total': 0,
+        }
+        methods = {}
+        for row in rows:
+            if row['is_voided']:
+                values['voided_orders'] += row['orders']
+                values['voided_total'] += row['total'] or 0
+                continue
+            values['total_orders'] += row['orders']
+            values['total_sales'] += row['total'] or 0
+            values['net_amount'] += row['net'] or 0
+            values['iva_amount'] += row['iva'] or 0
+            values['item_lines'] += row['lines'] or 0
+            values['item_units'] += row['units'] or 0
+            orders, total = methods.get(row['method'], (0, 0))
+            methods[row['method']] = (orders + row['orders'], total + (row['total'] or 0))
+        return cls(
+            shift, closing_cash,
+            by_method=[cls._method(m, orders, total) for m, (orders, total) in methods.items()],
+            **values,
+        )
+
+    def counters(self):
+        """Valores que deberían tener los contadores del Shift."""
+        values = {
+            'orders_count': self.total_orders,
+            'voided_count': self.voided_orders,
+            'gross_clp': self.total_sales,
+            'net_clp': self.net_amount,
+            'iva_clp': self.iva_amount,
+            'voided_clp': self.voided_total,
+            'item_lines': self.item_lines,
+            'item_units': self.item_units,
+        }
+        for amount_field, orders_field in Shift.METHOD_COUNTERS.values():
+            values[amount_field] = values[orders_field] = 0
+        for entry in self.by_method:
+            fields = Shift.METHOD_COUNTERS.get(entry['method'])
+            if fields:
+                values[fields[0]] += entry['total']
+                values[fields[1]] += entry['orders']
+        return values
+
+
 # --- ShiftService ---
 
 class ShiftService:
@@ -196,44 +498,50 @@ class ShiftService:
     @transaction.atomic
     def close_shift(self, shift, closing_cash=None, notes=''):
         """
-        Cerrar un turno. Calcula diferencias de caja.
+        Cerrar un turno. Calcula diferencias de caja desde los contadores del
+        turno (bloquea la fila: espera a los cobros en curso).
 
-        Returns: dict with shift summary
+        Returns: ShiftSummary
         """
+        shift = Shift.all_objects.select_for_update().get(pk=shift.pk)
         if not shift.is_open:
             raise ShiftClosedError("Este turno ya fue cerrado.")
 
         shift.closed_at = timezone.now()
         shift.closing_cash = closing_cash
         shift.notes = notes
-        shift.save()
+        shift.save(update_fields=['closed_at', 'closing_cash', 'notes', 'modified_at'])
 
-        # Calculate shift summary
-        orders = Order.all_objects.filter(shift=shift, is_paid=True, is_voided=False)
-        total_sales = sum(o.total_clp for o in orders)
-        total_orders = orders.count()
-
-        # Cash payments only
-        cash_payments = Payment.all_objects.filter(
-            order__shift=shift,
-            order__is_paid=True,
-            order__is_voided=False,
-            method='CASH',
-        )
-        total_cash = sum(p.amount_clp for p in cash_payments)
+        return ShiftSummary.from_shift(shift, closing_cash)
 
-        expected_cash = shift.opening_cash + total_cash
-        difference = (closing_cash or 0) - expected_cash
+    def shift_summary(self, shift, closing_cash=None):
+        """
+        Resumen del turno recalculado desde las órdenes: una sola consulta
+        agrupada por medio de pago y anulación (ítems contados con
+        subconsultas por orden). Para el resumen O(1) usar
+        ShiftSummary.from_shift().
 
-        return {
-            'shift': shift,
-            'total_sales': total_sales,
-            'total_orders': total_orders,
-            'total_cash_received': total_cash,
-            'expected_cash': expected_cash,
-            'closing_cash': closing_cash or 0,
-            'difference': difference,
-        }
+        Returns: ShiftSummary
+        """
+        items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        line_count = items.annotate(n=Count('id')).values('n')
+        unit_count = items.annotate(q=Sum('quantity')).values('q')
+
+        rows = Order.all_objects.filter(
+            tenant=self.tenant, shift=shift, is_paid=True,
+        ).annotate(
+            method=payment_method_of(OuterRef('pk')),
+            line_count=Coalesce(Subquery(line_count), 0),
+            unit_count=Subquery(unit_count, output_field=DecimalField(max_digits=14, decimal_places=3)),
+        ).values('method', 'is_voided').annotate(
+            orders=Count('id'),
+            total=Sum('total_clp'),
+            net=Sum('net_amount'),
+            iva=Sum('iva_amount'),
+            lines=Sum('line_count'),
+            units=Sum('unit_count'),
+        ).order_by()
+        return ShiftSummary.from_rows(shift, rows, closing_cash)
 
     def get_active_registers(self, branch=None):
         """Get all active cash registers, optionally filtered by branch."""
@@ -0,0 +1,334 @@
+"""
+Stock reservation layer.
+
+Bloquea las filas de Product en orden determinista (por id) para que dos cajas
+que venden los mismos SKUs nunca se bloqueen mutuamente, y aplica los
+descuentos/devoluciones como UPDATE atómicos con F() en vez de sobrescribir
+el stock leído en Python. Las ventas descuentan también el stock de la
+sucursal que vende (BranchStock) y se imputan a los lotes (Batch) del
+producto en orden FEFO (primero el que vence antes). También mide cuánto
+esperó cada checkout por los locks para detectar SKUs "calientes".
+"""
+import logging
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Sum, When
+from django.utils import timezone
+
+from apps.inventory.branches import main_branch_id
+from apps.inventory.models import Batch, BranchStock, Product
+
+from .models import OrderItemBatch
+
+logger = logging.getLogger(__name__)
+
+STOCK_FIELD = DecimalField(max_digits=10, decimal_places=3)
+
+
+class StockConflict(Exception):
+    """Alguna fila no tenía stock suficiente al momento del UPDATE."""
+
+    def __init__(self, product, available, required):
+        self.product = product
+        self.available = available
+        self.required = required
+        super().__init__(product.name)
+
+
+# --- Contention metrics ---
+
+class LockWaitStats:
+    """
+    Acumulador en memoria (por proceso) de esperas por locks de stock.
+
+    Cada checkout registra cuánto esperó y qué productos bloqueó; las esperas
+    sobre POS_LOCK_WAIT_WARN_MS se registran además en el log
+    'apps.sales.stock' para poder agregarlas entre procesos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_product = {}
+        self.checkouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def record(self, tenant_id, product_ids, wait_ms):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            for product_id in product_ids:
+                entry = self._by_product.setdefault(
+                    (tenant_id, product_id),
+                    {'locks': 0, 'wait_ms': 0.0, 'max_wait_ms': 0.0},
+                )
+                entry['locks'] += 1
+                entry['wait_ms'] += wait_ms
+                entry['max_wait_ms'] = max(entry['max_wait_ms'], wait_ms)
+
+        threshold = getattr(settings, 'POS_LOCK_WAIT_WARN_MS', 50)
+        if wait_ms >= threshold:
+            logger.warning(
+                "Stock lock wait %.1f ms (tenant=%s, products=%s)",
+                wait_ms, tenant_id, sorted(product_ids),
+            )
+
+    def hot_products(self, tenant_id=None, limit=10):
+        """Productos con mayor espera acumulada: [(tenant_id, product_id, stats)]."""
+        with self._lock:
+            rows = [
+                (t_id, p_id, dict(stats))
+                for (t_id, p_id), stats in self._by_product.items()
+                if tenant_id is None or t_id == tenant_id
+            ]
+        rows.sort(key=lambda row: row[2]['wait_ms'], reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._by_product.clear()
+            self.checkouts = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+
+
+lock_stats = LockWaitStats()
+
+
+# --- Reservation ---
+
+def lock_products(product_ids, tenant_id=None):
+    """
+    Carga y bloquea (SELECT ... FOR UPDATE) los productos indicados, en orden
+    ascendente de id. Debe llamarse dentro de transaction.atomic().
+
+    Con tenant_id sólo carga productos de ese tenant (los demás no aparecen
+    en el resultado); el tenant también etiqueta las métricas de espera.
+
+    Returns: dict {product_id: Product}
+    """
+    ids = sorted({int(product_id) for product_id in product_ids})
+    rows = Product.all_objects.select_for_update().filter(id__in=ids)
+    if tenant_id is not None:
+        rows = rows.filter(tenant_id=tenant_id)
+    started = time.perf_counter()
+    products = {product.id: product for product in rows.order_by('id')}
+    wait_ms = (time.perf_counter() - started) * 1000
+    lock_stats.record(tenant_id, ids, wait_ms)
+    return products
+
+
+def decrement_stock(lines):
+    """
+    Descuenta stock de todas las líneas con un único UPDATE condicional
+    (stock >= qty por fila). Si alguna fila queda corta se deshace el UPDATE
+    parcial y se lanza StockConflict con el stock real.
+
+    Args:
+        lines: iterable de (product, qty)
+    """
+    lines = [(product, Decimal(qty)) for product, qty in lines]
+    if not lines:
+        return
+
+    guard = Q()
+    stock_case = []
+    for product, qty in lines:
+        guard |= Q(id=product.id, stock__gte=qty)
+        stock_case.append(When(id=product.id, then=F('stock') - qty))
+
+    try:
+        with transaction.atomic():
+            updated = Product.all_objects.filter(guard).update(
+                stock=Case(*stock_case, output_field=STOCK_FIELD),
+                modified_at=timezone.now(),
+            )
+            if updated != len(lines):
+                raise StockConflict(lines[0][0], None, lines[0][1])
+    except StockConflict:
+        current = dict(Product.all_objects.filter(
+            id__in=[product.id for product, _ in lines],
+        ).values_list('id', 'stock'))
+        for product, qty in lines:
+            available = current.get(product.id, Decimal('0'))
+            if available < qty:
+                raise StockConflict(product, available, qty)
+        raise
+
+
+def decrement_branch_stock(branch_id, lines, backfill=True):
+    """
+    Igual que decrement_stock() pero sobre el stock de la sucursal que vende
+    (BranchStock): un único UPDATE condicional. Un producto sin fila en
+    ninguna sucursal (stock cargado fuera de los servicios de inventario) se
+    asigna completo a la sucursal principal la primera vez que se vende desde
+    ella; en los demás casos la fila faltante cuenta como stock 0.
+
+    Args:
+        lines: iterable de (product, qty), con los productos bloqueados por
+            lock_products() (su stock es el total previo a la venta)
+    """
+    lines = [(product, Decimal(qty)) for product, qty in lines]
+    if not lines:
+        return
+
+    guard = Q()
+    stock_case = []
+    for product, qty in lines:
+        guard |= Q(product_id=product.id, stock__gte=qty)
+        stock_case.append(When(product_id=product.id, then=F('stock') - qty))
+
+    try:
+        with transaction.atomic():
+            updated = BranchStock.all_objects.filter(guard, branch_id=branch_id).update(
+                stock=Case(*stock_case, output_field=STOCK_FIELD),
+            )
+            if updated != len(lines):
+                raise StockConflict(lines[0][0], None, lines[0][1])
+    except StockConflict:
+        current = dict(BranchStock.all_objects.filter(
+            branch_id=branch_id, product_id__in=[product.id for product, _ in lines],
+        ).values_list('product_id', 'stock'))
+        unsplit = [product for product, _ in lines if product.id not in current]
+        if backfill and backfill_main_branch(branch_id, unsplit):
+            return decrement_branch_stock(branch_id, lines, backfill=False)
+        for product, qty in lines:
+            available = current.get(product.id, Decimal('0'))
+            if available < qty:
+                raise StockConflict(product, available, qty)
+        raise
+
+
+def backfill_main_branch(branch_id, products):
+    """
+    Crea en la sucursal principal la fila de BranchStock de los productos que
+    no tienen fila en ninguna sucursal, con todo su stock. Sólo actúa si
+    branch_id es la principal.
+
+    Returns: número de filas creadas
+    """
+    if not products or branch_id != main_branch_id(products[0].tenant_id):
+        return 0
+    split = set(BranchStock.all_objects.filter(
+        product_id__in=[product.id for product in products],
+    ).values_list('product_id', flat=True))
+    rows = [
+        BranchStock(tenant_id=product.tenant_id, branch_id=branch_id, product_id=product.id, stock=product.stock)
+        for product in products
+        if product.id not in split and product.stock > 0
+    ]
+    if rows:
+        BranchStock.all_objects.bulk_create(rows, ignore_conflicts=True)
+        logger.warning(
+            "BranchStock backfilled in main branch %s for products %s",
+            branch_id, [row.product_id for row in rows],
+        )
+    return len(rows)
+
+
+def increment_stock(lines):
+    """
+    Devuelve stock (anulaciones) con un único UPDATE atómico F('stock') + qty.
+
+    Args:
+        lines: iterable de (product_id, qty)
+    """
+    totals = {}
+    for product_id, qty in lines:
+        totals[product_id] = totals.get(product_id, Decimal('0')) + Decimal(qty)
+    if not totals:
+        return
+
+    Product.all_objects.filter(id__in=list(totals)).update(
+        stock=Case(
+            *[When(id=product_id, then=F('stock') + qty)
+              for product_id, qty in totals.items()],
+            output_field=STOCK_FIELD,
+        ),
+        modified_at=timezone.now(),
+    )
+
+
+# --- Batches (FEFO) ---
+
+def allocate_batches(tenant_id, items):
+    """
+    Descuenta las líneas vendidas de los lotes con saldo, primero el que vence
+    antes (FEFO), y registra cada asignación en OrderItemBatch.
+
+    Los lotes de toda la canasta se leen en una sola consulta ordenada; los
+    descuentos se aplican con un único UPDATE (F() - qty) y las asignaciones
+    con un único INSERT. Las filas de Product ya están bloqueadas por
+    lock_products(), lo que serializa a las ventas que tocan los mismos lotes.
+    La cantidad que no cubren los lotes (productos sin control de lotes) queda
+    sin asignar.
+
+    Args:
+        items: iterable de OrderItem ya guardados (con pk)
+    """
+    items = [item for item in items if item.quantity > 0]
+    if not items:
+        return []
+
+    batches = {}
+    for batch_id, product_id, available in Batch.all_objects.filter(
+        tenant_id=tenant_id,
+        product_id__in={item.product_id for item in items},
+        current_quantity__gt=0,
+    ).order_by('product_id', 'expiration_date', 'id').values_list(
+        'id', 'product_id', 'current_quantity',
+    ):
+        batches.setdefault(product_id, []).append([batch_id, available])
+
+    allocations = []
+    taken = {}
+    for item in items:
+        pending = Decimal(item.quantity)
+        for batch in batches.get(item.product_id, ()):
+            if pending <= 0:
+                break
+            batch_id, available = batch
+            qty = min(available, pending)
+            if qty <= 0:
+                continue
+            batch[1] -= qty
+            pending -= qty
+            taken[batch_id] = taken.get(batch_id, Decimal('0')) + qty
+            allocations.append(OrderItemBatch(order_item=item, batch_id=batch_id, quantity=qty))
+
+    if allocations:
+        _shift_batches(taken, sign=-1)
+        OrderItemBatch.objects.bulk_create(allocations)
+    return allocations
+
+
+def release_batches(order):
+    """
+    Devuelve a sus lotes lo asignado a las líneas de la orden (anulaciones):
+    una lectura agrupada y un único UPDATE. Las asignaciones se conservan
+    como historial.
+    """
+    returned = dict(
+        OrderItemBatch.objects.filter(order_item__order=order)
+        .values('batch_id').annotate(total=Sum('quantity'))
+        .values_list('batch_id', 'total').order_by()
+    )
+    if returned:
+        _shift_batches(returned, sign=1)
+    return returned
+
+
+def _shift_batches(quantities, sign):
+    """current_quantity += sign * qty para {batch_id: qty}, en un UPDATE."""
+    Batch.all_objects.filter(id__in=list(quantities)).update(
+        current_quantity=Case(
+            *[When(id=batch_id, then=F('current_quantity') + sign * qty)
+              for batch_id, qty in quantities.items()],
+            output_field=STOCK_FIELD,
+        ),
+    )
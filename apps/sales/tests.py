@@ -1,3 +1,408 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.cache import SessionStore
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+
+from apps.dashboard.services import MetricsService
+from apps.inventory.models import Batch, BranchStock, Category, Product
+from apps.tenants.models import Branch, Tenant
+
+from .barcodes import barcode_index
+from .cart import Cart, MemoryCartStore, SessionCartStore
+from .models import CashRegister, DailySalesRollup, Order, OrderItem, Shift
+from .query_plans import disable_seqscan, hot_query_checks, query_plans
+from .rollups import rebuild
+from .services import CheckoutService, InsufficientStockError, ShiftService, ShiftSummary
+
+
+class CheckoutTestCase(TestCase):
+    """Tenant con sucursal principal, caja, turno abierto y productos con stock."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Tienda Test', rut_empresa='11111111-1', subdomain='test')
+        cls.branch = Branch.objects.create(tenant=cls.tenant, name='Principal', is_main=True)
+        cls.user = get_user_model().objects.create(username='cajero')
+        cls.register = CashRegister.objects.create(tenant=cls.tenant, branch=cls.branch, name='Caja 1')
+        cls.shift = Shift.objects.create(tenant=cls.tenant, register=cls.register, cashier=cls.user)
+        category = Category.objects.create(tenant=cls.tenant, name='Alimentos')
+        cls.products = [
+            Product.all_objects.create(
+                tenant=cls.tenant, sku=f'SKU-{i}', name=f'Producto {i}',
+                price_clp=1000 * (i + 1), cost_clp=500 * (i + 1), stock=10, category=category,
+            )
+            for i in range(5)
+        ]
+        BranchStock.all_objects.bulk_create([
+            BranchStock(tenant=cls.tenant, branch=cls.branch, product=product, stock=10)
+            for product in cls.products
+        ])
+
+    def service(self, with_shift=True):
+        return CheckoutService(self.tenant, self.shift if with_shift else None, self.user)
+
+    def snapshot(self):
+        """Stock total, de sucursal y de lotes, para comparar antes/después."""
+        ids = [product.id for product in self.products]
+        return (
+            dict(Product.all_objects.filter(id__in=ids).values_list('id', 'stock')),
+            dict(BranchStock.all_objects.filter(product_id__in=ids).values_list('product_id', 'stock')),
+            dict(Batch.all_objects.filter(product_id__in=ids).values_list('id', 'current_quantity')),
+        )
+
+
+class ProcessSaleQueriesTest(CheckoutTestCase):
+    """El número de consultas del checkout no depende del número de líneas."""
+
+    def assertSaleQueries(self, count, lines, with_shift):
+        cart = {product.id: '1' for product in self.products[:lines]}
+        with self.assertNumQueries(count):
+            order = self.service(with_shift).process_sale(cart)
+        self.assertEqual(order.items.count(), lines)
+
+    def test_with_shift(self):
+        self.assertSaleQueries(15, lines=1, with_shift=True)
+        self.assertSaleQueries(15, lines=5, with_shift=True)
+
+    def test_without_shift(self):
+        self.assertSaleQueries(15, lines=1, with_shift=False)
+        self.assertSaleQueries(15, lines=5, with_shift=False)
+
+    def test_with_batches(self):
+        Batch.all_objects.bulk_create([
+            Batch(tenant=self.tenant, product=product, batch_number='L1',
+                  expiration_date=date.today() + timedelta(days=30),
+                  quantity=10, current_quantity=10)
+            for product in self.products
+        ])
+        self.assertSaleQueries(17, lines=1, with_shift=True)
+        self.assertSaleQueries(17, lines=5, with_shift=True)
+
+
+class IdempotencyTest(CheckoutTestCase):
+
+    def test_retry_returns_existing_order(self):
+        service = self.service()
+        order = service.process_sale({self.products[0].id: '2'}, idempotency_key='abc')
+        with self.assertNumQueries(1):
+            retry = service.process_sale({self.products[0].id: '2'}, idempotency_key='abc')
+        self.assertEqual(retry.pk, order.pk)
+        self.assertEqual(Order.all_objects.filter(tenant=self.tenant).count(), 1)
+
+    def test_concurrent_retry_falls_back_to_committed_order(self):
+        """
+        La otra petición confirmó entre la lectura inicial y el INSERT: el
+        índice único lanza IntegrityError, se deshace esta venta y se devuelve
+        la que ya existe.
+        """
+        service = self.service()
+        order = service.process_sale({self.products[0].id: '2'}, idempotency_key='abc')
+        before = self.snapshot()
+
+        real_lookup = CheckoutService.find_by_idempotency_key
+        with mock.patch.object(
+            CheckoutService, 'find_by_idempotency_key', side_effect=[None, real_lookup(self.tenant, 'abc')],
+        ) as lookup:
+            retry = service.process_sale({self.products[0].id: '2'}, idempotency_key='abc')
+
+        self.assertEqual(lookup.call_count, 2)
+        self.assertEqual(retry.pk, order.pk)
+        self.assertEqual(Order.all_objects.filter(tenant=self.tenant).count(), 1)
+        self.assertEqual(self.snapshot(), before)
+
+
+class InsufficientStockTest(CheckoutTestCase):
+    """Una venta rechazada por stock no deja descuentos a medias."""
+
+    def setUp(self):
+        Batch.all_objects.bulk_create([
+            Batch(tenant=self.tenant, product=product, batch_number='L1',
+                  expiration_date=date.today() + timedelta(days=30),
+                  quantity=10, current_quantity=10)
+            for product in self.products
+        ])
+
+    def assertRejectedWithoutChanges(self, cart):
+        before = self.snapshot()
+        with self.assertRaises(InsufficientStockError):
+            self.service().process_sale(cart)
+        self.assertEqual(self.snapshot(), before)
+        self.assertFalse(Order.all_objects.filter(tenant=self.tenant).exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.orders_count, 0)
+
+    def test_product_stock_short(self):
+        self.assertRejectedWithoutChanges({
+            self.products[0].id: '3',
+            self.products[1].id: '11',
+        })
+
+    def test_branch_stock_short_after_total_decrement(self):
+        """El total alcanza pero la sucursal no: el UPDATE del total se revierte."""
+        BranchStock.all_objects.filter(product=self.products[1]).update(stock=Decimal('2'))
+        self.assertRejectedWithoutChanges({
+            self.products[0].id: '3',
+            self.products[1].id: '5',
+        })
+
+
+class BranchStockBackfillTest(CheckoutTestCase):
+
+    def test_product_without_branch_rows_is_backfilled_in_main_branch(self):
+        """Stock cargado sin BranchStock: la sucursal principal lo recibe completo y vende."""
+        BranchStock.all_objects.filter(product=self.products[2]).delete()
+        self.service().process_sale({self.products[2].id: '4'})
+        self.assertEqual(
+            BranchStock.all_objects.get(product=self.products[2], branch=self.branch).stock, Decimal('6'),
+        )
+
+
+class TenantIsolationTest(CheckoutTestCase):
+
+    def test_product_of_another_tenant_is_not_sold(self):
+        other = Tenant.objects.create(name='Otra Tienda', rut_empresa='22222222-2', subdomain='otra')
+        product = Product.all_objects.create(
+            tenant=other, sku='SKU-X', name='Ajeno', price_clp=1000, cost_clp=500, stock=10,
+            category=Category.objects.create(tenant=other, name='Alimentos'),
+        )
+        with self.assertRaises(Product.DoesNotExist):
+            self.service().process_sale({product.id: '1'})
+        product.refresh_from_db()
+        self.assertEqual(product.stock, Decimal('10'))
+
+
+class ShiftCountersTest(CheckoutTestCase):
+
+    def test_counters_match_orders_after_sales_and_voids(self):
+        service = self.service()
+        orders = [
+            service.process_sale({self.products[0].id: '1'}, payment_method='CASH'),
+            service.process_sale({self.products[1].id: '2'}, payment_method='CASH'),
+            service.process_sale({self.products[2].id: '1', self.products[3].id: '1'}, payment_method='CARD'),
+            service.process_sale({self.products[4].id: '0.5'}, payment_method='TRANSFER'),
+        ]
+        service.void_sale(orders[1], self.user, 'Error de digitación')
+        self.shift.refresh_from_db()
+
+        counted = ShiftSummary.from_shift(self.shift)
+        self.assertEqual(counted.counters(), ShiftService(self.tenant).shift_summary(self.shift).counters())
+        self.assertEqual(
+            {row['method']: (row['orders'], row['total']) for row in counted.by_method},
+            {'CASH': (1, 1000), 'CARD': (1, 7000), 'TRANSFER': (1, 2500)},
+        )
+        self.assertEqual((counted.voided_orders, counted.voided_total), (1, 4000))
+
+
+class BarcodeIndexTest(CheckoutTestCase):
+
+    def test_product_save_invalidates_on_commit(self):
+        product = self.products[0]
+        self.assertEqual(barcode_index.lookup(self.tenant.id, product.sku)['price_clp'], 1000)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.price_clp = 1500
+            product.save()
+            # Before commit other processes must keep the old version
+            self.assertTrue(barcode_index.is_warm(self.tenant.id))
+        self.assertFalse(barcode_index.is_warm(self.tenant.id))
+        self.assertEqual(barcode_index.lookup(self.tenant.id, product.sku)['price_clp'], 1500)
+
+
+class CartScenarios:
+    """Mismos escenarios para cada store del carrito."""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+        self.session = SessionStore()
+        self.cart = Cart(self.session, self.store)
+
+    def bulk_snapshot(self, price=2990, stock='1.2'):
+        return {'name': 'Alimento a granel', 'sku': 'GRANEL', 'price_clp': price,
+                'is_bulk': True, 'stock': int(Decimal(stock) * 1000)}
+
+    def assertTotalMatchesLines(self):
+        totals = self.cart.totals()
+        self.assertEqual(totals['total_gross'], sum(item['line_total'] for item in totals['items']))
+        return totals
+
+    def test_incremental_totals(self):
+        first, second = self.products[:2]
+        self.assertTrue(self.cart.add(first))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.cart.add(product_id=first.id))
+            self.assertTrue(self.cart.add(second))
+            for _ in range(2):
+                self.assertTrue(self.cart.add(product_id=99, snapshot=self.bulk_snapshot()))
+            totals = self.assertTotalMatchesLines()
+        self.assertEqual(totals['total_gross'], 2000 + 2000 + 2990)
+        self.assertEqual(self.cart.quantities(), {
+            str(first.id): '2.000', str(second.id): '1.000', '99': '1.000',
+        })
+
+        self.cart.remove(second.id)
+        self.cart.remove(second.id)  # already gone: the total does not move
+        self.assertEqual(self.assertTotalMatchesLines()['total_gross'], 4990)
+        self.cart.clear()
+        self.assertEqual((self.cart.totals()['total_gross'], bool(self.cart)), (0, False))
+
+    def test_reprice_applies_line_deltas(self):
+        self.cart.add(self.products[0])
+        self.cart.add(self.products[0])
+        self.cart.add(product_id=99, snapshot=self.bulk_snapshot(price=2995))
+        self.assertEqual(self.cart.totals()['total_gross'], 2000 + 1498)
+
+        self.cart.reprice({self.products[0].id: 1200, 99: 3001, 12345: 500})
+        totals = self.assertTotalMatchesLines()
+        self.assertEqual(totals['total_gross'], 2400 + 1500)
+        self.assertEqual(self.cart.expected_prices(), {self.products[0].id: 1200, 99: 3001})
+
+    def test_stock_ceiling(self):
+        """A granel de a 0,5 kg con 1,2 kg disponibles: el tercer paso se rechaza."""
+        snapshot = self.bulk_snapshot(stock='1.2')
+        self.assertTrue(self.cart.add(product_id=99, snapshot=snapshot))
+        self.assertTrue(self.cart.add(product_id=99))
+        self.assertFalse(self.cart.add(product_id=99))
+        self.assertEqual(self.cart.quantities(), {'99': '1.000'})
+        self.assertEqual(self.cart.totals()['total_gross'], 2990)
+
+        self.assertFalse(self.cart.add(product_id=100))  # not in the cart and no snapshot
+
+
+class SessionCartTest(CartScenarios, CheckoutTestCase):
+
+    def make_store(self):
+        return SessionCartStore()
+
+
+class MemoryCartTest(CartScenarios, CheckoutTestCase):
+
+    def make_store(self):
+        return MemoryCartStore(max_carts=2, ttl=60)
+
+    def test_least_recently_used_cart_is_evicted(self):
+        carts = [Cart(SessionStore(), self.store) for _ in range(3)]
+        carts[0].add(self.products[0])
+        carts[1].add(self.products[1])
+        carts[0].totals()  # touches the first cart: the second is now the oldest
+        carts[2].add(self.products[2])
+        self.assertTrue(carts[0])
+        self.assertFalse(carts[1])
+        self.assertEqual(len(self.store._carts), 2)
+
+    def test_idle_cart_expires(self):
+        with mock.patch('apps.sales.cart.time.monotonic', return_value=1000):
+            self.cart.add(self.products[0])
+        with mock.patch('apps.sales.cart.time.monotonic', return_value=1059):
+            self.assertTrue(self.cart)
+        with mock.patch('apps.sales.cart.time.monotonic', return_value=1120):
+            self.assertFalse(self.cart)
+            self.assertEqual(self.cart.totals()['total_gross'], 0)
+
+
+class DailySalesRollupTest(CheckoutTestCase):
+    """El resumen diario da los mismos totales que las órdenes."""
+
+    def setUp(self):
+        service = self.service()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.orders = [
+                service.process_sale({self.products[0].id: '2'}, payment_method='CASH'),
+                service.process_sale({self.products[1].id: '1', self.products[2].id: '1'}, payment_method='CARD'),
+                service.process_sale({self.products[3].id: '1'}, payment_method='CASH'),
+                service.process_sale({self.products[4].id: '0.5', self.products[0].id: '1'}, payment_method='TRANSFER'),
+            ]
+            service.void_sale(self.orders[2], self.user, 'Error de digitación')
+
+    def rollup_rows(self):
+        # A void leaves its live rows at zero; rebuild simply has no row for them
+        return sorted(
+            (row for row in DailySalesRollup.all_objects.filter(tenant=self.tenant).values_list(
+                'branch_id', 'day', 'product_id', 'payment_method',
+                'orders', 'total_clp', 'quantity', 'revenue_clp', 'cost_clp',
+            ) if any(row[4:])),
+            key=lambda row: (row[1], row[2] or 0, row[3]),
+        )
+
+    def local(self, day, hour, minute=0):
+        return timezone.make_aware(datetime.combine(day, time(hour, minute)), self.tenant.tzinfo)
+
+    def move_orders(self, *moments):
+        """Fecha cada orden (en el orden de self.orders) y reconstruye el resumen."""
+        for order, moment in zip(self.orders, moments):
+            Order.all_objects.filter(pk=order.pk).update(date=moment)
+        rebuild(self.tenant)
+
+    def test_rebuild_matches_live_rows(self):
+        live = self.rollup_rows()
+        self.assertEqual(
+            [row[2:6] for row in live if row[2] is None],
+            [(None, 'CARD', 1, 5000), (None, 'CASH', 1, 2000), (None, 'TRANSFER', 1, 3500)],
+        )
+        rebuild(self.tenant)
+        self.assertEqual(self.rollup_rows(), live)
+
+    def test_rows_are_written_after_the_sale_commits(self):
+        """La fila de totales del día no se bloquea dentro del checkout."""
+        before = self.rollup_rows()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.service().process_sale({self.products[1].id: '1'}, payment_method='CASH')
+        self.assertEqual(self.rollup_rows(), before)
+
+        callbacks[0]()  # record_order is scheduled before the dashboard invalidation
+        totals = {row[3]: row[4:6] for row in self.rollup_rows() if row[2] is None}
+        self.assertEqual(totals['CASH'], (2, 4000))
+
+    def test_whole_days_match_orders(self):
+        metrics = MetricsService(self.tenant, use_cache=False)
+        today = metrics.today()
+        local = self.local
+        self.move_orders(
+            local(today - timedelta(days=2), 23, 59), local(today - timedelta(days=1), 0, 1),
+            local(today - timedelta(days=1), 12), local(today - timedelta(days=1), 18),
+        )
+        start, end = today - timedelta(days=3), today + timedelta(days=1)
+        for granularity in ('day', 'week', 'month'):
+            with self.subTest(granularity):
+                from_rollup = metrics.sales_series(start, end, granularity)
+                from_orders = metrics.sales_series(local(start, 0), local(end, 0), granularity)
+                self.assertEqual(from_rollup, from_orders)
+        by_day = {bucket['start']: (bucket['total'], bucket['count'])
+                  for bucket in metrics.sales_series(start, end)}
+        self.assertEqual(by_day[today - timedelta(days=2)], (2000, 1))
+        self.assertEqual(by_day[today - timedelta(days=1)], (8500, 2))  # the void is left out
+
+    def test_partial_day_reads_orders(self):
+        metrics = MetricsService(self.tenant, use_cache=False)
+        day = metrics.today() - timedelta(days=1)
+        self.move_orders(*(self.local(day, hour) for hour in (9, 11, 13, 15)))
+
+        morning = metrics.sales_series(self.local(day, 8), self.local(day, 12), 'hour')
+        self.assertEqual([(b['start'].hour, b['total']) for b in morning if b['count']], [(9, 2000), (11, 5000)])
+        afternoon = metrics.sales_series(self.local(day, 12), self.local(day, 16), 'day')
+        self.assertEqual([(b['total'], b['count']) for b in afternoon], [(3500, 1)])
+        whole = metrics.sales_series(day, day + timedelta(days=1))
+        self.assertEqual(whole[0]['total'], sum(b['total'] for b in morning) + afternoon[0]['total'])
+
+
+@skipUnless(connection.vendor == 'postgresql', "Los planes esperados son los de PostgreSQL")
+class HotQueryIndexTest(CheckoutTestCase):
+    """Las consultas calientes usan sus índices (ver query_plans.py)."""
 
-# Create your tests here.
+    def test_hot_queries_use_their_index(self):
+        disable_seqscan()
+        for label, index, run in hot_query_checks(self.tenant):
+            with self.subTest(label):
+                plans = query_plans(run)
+                self.assertTrue(
+                    any(index in plan for plan in plans),
+                    f"{label} no usa {index}:\n" + '\n'.join(plans),
+                )
@@ -5,6 +5,7 @@ urlpatterns = [
     # POS
     path('', views.pos_dashboard, name='pos_dashboard'),
     path('search/', views.search_products, name='search_products'),
+    path('scan/', views.scan_product, name='scan_product'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/remove/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('checkout/', views.checkout, name='checkout'),
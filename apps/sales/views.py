@@ -1,64 +1,27 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.views.decorators.http import require_POST, require_GET
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import HttpResponse
-from decimal import Decimal
+import uuid
 
-from .models import Order, OrderItem, Payment, CashRegister, Shift
+from .models import Order, CashRegister, Shift
 from .services import (
-    CheckoutService, ShiftService,
-    InsufficientStockError, ShiftClosedError,
+    CheckoutService, ShiftService, ShiftSummary,
+    InsufficientStockError, PriceChangedError, ShiftClosedError,
     ShiftAlreadyOpenError, NoOpenShiftError,
 )
+from .barcodes import barcode_index
+from .cart import Cart
 from apps.inventory.models import Product
-from apps.core.utils import format_clp
+from apps.inventory.search import ProductSearch
 
 
 # ──────────────────────── Cart helpers ────────────────────────
 
 def get_cart(request):
-    if 'cart' not in request.session:
-        request.session['cart'] = {}
-    return request.session['cart']
-
-
-def save_cart(request, cart):
-    request.session['cart'] = cart
-    request.session.modified = True
-
-
-def calculate_cart_totals(cart):
-    items = []
-    total_gross = 0
-
-    for product_id, quantity_str in cart.items():
-        try:
-            product = Product.all_objects.get(id=product_id)
-            quantity = Decimal(quantity_str)
-            line_total = int(round(product.price_clp * float(quantity)))
-
-            items.append({
-                'product': product,
-                'quantity': quantity,
-                'line_total': line_total,
-                'line_total_formatted': format_clp(line_total),
-            })
-            total_gross += line_total
-        except Product.DoesNotExist:
-            continue
-
-    total_net = int(total_gross / 1.19) if total_gross else 0
-    total_iva = total_gross - total_net
-
-    return {
-        'items': items,
-        'total_gross': total_gross,
-        'total_net': total_net,
-        'total_iva': total_iva,
-        'total_formatted': format_clp(total_gross),
-        'iva_formatted': format_clp(total_iva),
-    }
+    return Cart(request.session)
 
 
 # ──────────────────────── Shift helpers ────────────────────────
@@ -75,87 +38,119 @@ def _get_active_shift(request):
     return None
 
 
+def _get_idempotency_key(request):
+    """Client-supplied checkout key (form field or Idempotency-Key header)."""
+    key = request.POST.get('idempotency_key') or request.headers.get('Idempotency-Key', '')
+    return key.strip()[:64] or None
+
+
 # ──────────────────────── POS Views ────────────────────────
 
 @login_required
 def pos_dashboard(request):
     """Vista principal de caja."""
     shift = _get_active_shift(request)
-    cart_data = calculate_cart_totals(get_cart(request))
+    cart_data = get_cart(request).totals()
 
     return render(request, 'pos/dashboard.html', {
         'cart': cart_data,
         'active_shift': shift,
+        'checkout_key': uuid.uuid4().hex,
     })
 
 
+# Search/cart/scan endpoints are async: ORM reads use the async API, while
+# session/cart-store access and template rendering run via sync_to_async.
+
+def _render_cart(request, cart):
+    return render(request, 'pos/partials/cart_items.html', {'cart': cart.totals()})
+
+
 @login_required
 @require_GET
-def search_products(request):
+async def search_products(request):
     """Endpoint HTMX para búsqueda de productos."""
     query = request.GET.get('q', '').strip()
-    products = []
-    if len(query) >= 1:
-        products = Product.objects.filter(
-            name__icontains=query, stock__gt=0
-        ) | Product.objects.filter(
-            sku__icontains=query, stock__gt=0
-        ) | Product.objects.filter(
-            barcode__icontains=query, stock__gt=0
-        )
-        products = products.distinct()[:12]
+    products = await ProductSearch(getattr(request, 'tenant', None)).asearch(query)
 
-    return render(request, 'pos/partials/product_list.html', {'products': products})
+    return await sync_to_async(render)(
+        request, 'pos/partials/product_list.html', {'products': products},
+    )
 
 
 @require_POST
-def add_to_cart(request, product_id):
+async def add_to_cart(request, product_id):
     """Endpoint HTMX para agregar al carrito."""
     cart = get_cart(request)
-    product = get_object_or_404(Product, id=product_id)
 
-    quantity_to_add = Decimal('1.0')
-    if product.is_bulk:
-        quantity_to_add = Decimal('0.500')
+    if await sync_to_async(cart.get_line)(product_id) is not None:
+        # Already in the cart: the line snapshot is enough, no query
+        await sync_to_async(cart.add)(product_id=product_id)
+    else:
+        product = await aget_object_or_404(Product, id=product_id)
+        await sync_to_async(cart.add)(product)
 
-    current_qty = Decimal(cart.get(str(product_id), '0'))
-    new_qty = current_qty + quantity_to_add
+    return await sync_to_async(_render_cart)(request, cart)
 
-    if new_qty <= product.stock:
-        cart[str(product_id)] = str(new_qty)
-        save_cart(request, cart)
 
-    cart_data = calculate_cart_totals(cart)
-    return render(request, 'pos/partials/cart_items.html', {'cart': cart_data})
+@require_POST
+@login_required
+async def scan_product(request):
+    """
+    Endpoint HTMX del escáner: resuelve un código exacto y lo agrega al carrito.
 
+    Con el índice de códigos caliente no consulta la base de datos. Si el
+    código no existe responde con la búsqueda normal en #product-results.
+    """
+    tenant = getattr(request, 'tenant', None)
+    if tenant is None:
+        return HttpResponse("No se pudo identificar la tienda.", status=403)
 
-@require_POST
-def remove_from_cart(request, product_id):
+    code = request.POST.get('q', '').strip()
     cart = get_cart(request)
-    if str(product_id) in cart:
-        del cart[str(product_id)]
-        save_cart(request, cart)
 
-    cart_data = calculate_cart_totals(cart)
-    return render(request, 'pos/partials/cart_items.html', {'cart': cart_data})
+    snapshot = await barcode_index.alookup(tenant.id, code) if code else None
+    if snapshot is None:
+        products = await ProductSearch(tenant).asearch(code)
+        response = await sync_to_async(render)(
+            request, 'pos/partials/product_list.html', {'products': products},
+        )
+        response['HX-Retarget'] = '#product-results'
+        return response
+
+    await sync_to_async(cart.add)(product_id=snapshot['id'], snapshot=snapshot)
+    return await sync_to_async(_render_cart)(request, cart)
+
+
+@require_POST
+async def remove_from_cart(request, product_id):
+    cart = get_cart(request)
+    await sync_to_async(cart.remove)(product_id)
+    return await sync_to_async(_render_cart)(request, cart)
 
 
 @require_POST
 @login_required
 def checkout(request):
     """Procesar venta — funciona con o sin turno abierto."""
-    from django.db import transaction
+    tenant = getattr(request, 'tenant', None)
+    if not tenant:
+        messages.error(request, "No se pudo identificar la tienda.")
+        return redirect('pos_dashboard')
+
+    # Retry of an already committed sale: one indexed read, no new order
+    idempotency_key = _get_idempotency_key(request)
+    existing = CheckoutService.find_by_idempotency_key(tenant, idempotency_key)
+    if existing:
+        get_cart(request).clear()
+        messages.success(request, f"✅ Venta #{existing.id} registrada — ${existing.total_clp:,.0f}")
+        return redirect('pos_dashboard')
 
     cart = get_cart(request)
     if not cart:
         messages.warning(request, "El carrito está vacío.")
         return redirect('pos_dashboard')
 
-    tenant = getattr(request, 'tenant', None)
-    if not tenant:
-        messages.error(request, "No se pudo identificar la tienda.")
-        return redirect('pos_dashboard')
-
     shift = _get_active_shift(request)
 
     # Try to auto-create shift if we have registers
@@ -177,59 +172,22 @@ def checkout(request):
         payment_details['card_last_4'] = request.POST.get('card_last_4', '')
 
     try:
-        if shift:
-            # Use CheckoutService with shift
-            service = CheckoutService(tenant=tenant, shift=shift, cashier=request.user)
-            order = service.process_sale(
-                cart_items=cart,
-                customer=None,
-                payment_method=method,
-                payment_details=payment_details,
-            )
-        else:
-            # Direct order creation without shift
-            with transaction.atomic():
-                order = Order(tenant=tenant, cashier=request.user)
-                order.save()
-
-                total = 0
-                for product_id, quantity_str in cart.items():
-                    product = Product.all_objects.get(id=product_id)
-                    qty = Decimal(quantity_str)
-
-                    if product.stock < qty:
-                        raise InsufficientStockError(
-                            f"Stock insuficiente para {product.name}: "
-                            f"disponible {product.stock}, requerido {qty}"
-                        )
-
-                    line_total = int(round(product.price_clp * float(qty)))
-                    OrderItem.objects.create(
-                        order=order, product=product, quantity=qty,
-                        unit_price_clp=product.price_clp,
-                        cost_at_sale=product.cost_clp,
-                        line_total_clp=line_total,
-                    )
-                    product.stock -= qty
-                    product.save()
-                    total += line_total
-
-                order.total_clp = total
-                order.net_amount = int(total / 1.19)
-                order.iva_amount = total - order.net_amount
-                order.is_paid = True
-                order.save()
-
-                details = payment_details or {}
-                Payment(
-                    tenant=tenant, order=order, amount_clp=total,
-                    method=method,
-                    transaction_id=details.get('transaction_id'),
-                    card_last_4=details.get('card_last_4'),
-                ).save()
-
-        request.session['cart'] = {}
+        # Same pipeline with or without an open shift
+        service = CheckoutService(tenant=tenant, shift=shift, cashier=request.user)
+        order = service.process_sale(
+            cart_items=cart.quantities(),
+            customer=None,
+            payment_method=method,
+            payment_details=payment_details,
+            idempotency_key=idempotency_key,
+            expected_prices=cart.expected_prices(),
+        )
+
+        cart.clear()
         messages.success(request, f"✅ Venta #{order.id} registrada — ${order.total_clp:,.0f}")
+    except PriceChangedError as e:
+        cart.reprice(e.prices)
+        messages.warning(request, str(e))
     except InsufficientStockError as e:
         messages.error(request, str(e))
     except ShiftClosedError as e:
@@ -312,21 +270,16 @@ def shift_close(request):
         if 'active_shift_id' in request.session:
             del request.session['active_shift_id']
         # Clear cart
-        request.session['cart'] = {}
+        get_cart(request).clear()
 
         return render(request, 'pos/shift_summary.html', {
             'summary': summary,
         })
 
     # GET — show close form with live summary
-    orders = Order.all_objects.filter(shift=shift, is_paid=True, is_voided=False)
-    total_sales = sum(o.total_clp for o in orders)
-    total_orders = orders.count()
-
     return render(request, 'pos/shift_close.html', {
         'shift': shift,
-        'total_sales': total_sales,
-        'total_orders': total_orders,
+        'summary': ShiftSummary.from_shift(shift),
     })
 
 
@@ -1,7 +1,22 @@
 from django.apps import AppConfig
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+
+def _invalidate_tenant_cache(sender, **kwargs):
+    # On commit: a re-resolve before it would cache the old row under the new version
+    from apps.core.middleware import tenant_resolver
+    transaction.on_commit(tenant_resolver.invalidate)
 
 
 class TenantsConfig(AppConfig):
     name = 'apps.tenants'
     label = 'tenants'
     verbose_name = 'Tiendas'
+
+    def ready(self):
+        from .models import Tenant
+
+        # Saving also covers deactivation (is_active=False)
+        post_save.connect(_invalidate_tenant_cache, sender=Tenant, dispatch_uid='tenant_cache_save')
+        post_delete.connect(_invalidate_tenant_cache, sender=Tenant, dispatch_uid='tenant_cache_delete')
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_default_tenant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='timezone',
+            field=models.CharField(default='America/Santiago', help_text='Zona IANA usada para agrupar reportes por hora, día, semana o mes.', max_length=63, verbose_name='Zona Horaria'),
+        ),
+    ]
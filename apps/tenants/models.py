@@ -1,3 +1,5 @@
+import zoneinfo
+
 from django.db import models
 from apps.core.models import TimeStampedModel
 
@@ -22,6 +24,11 @@ class Tenant(TimeStampedModel):
         verbose_name="Tasa IVA (%)"
     )
     currency = models.CharField(max_length=3, default='CLP', verbose_name="Moneda")
+    timezone = models.CharField(
+        max_length=63, default='America/Santiago',
+        verbose_name="Zona Horaria",
+        help_text="Zona IANA usada para agrupar reportes por hora, día, semana o mes.",
+    )
 
     is_active = models.BooleanField(default=True, verbose_name="Activo")
 
@@ -33,6 +40,15 @@ class Tenant(TimeStampedModel):
     def __str__(self):
         return self.name
 
+    @property
+    def tzinfo(self):
+        """ZoneInfo de la tienda (zona por defecto del proyecto si es inválida)."""
+        try:
+            return zoneinfo.ZoneInfo(self.timezone)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            from django.utils import timezone
+            return timezone.get_default_timezone()
+
 
 class Branch(TimeStampedModel):
     """Sucursal de una tienda. Un tenant puede tener múltiples sucursales."""
@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.production')
 
 application = get_asgi_application()
+
+from apps.sales.barcodes import warm_on_startup  # noqa: E402  (needs apps loaded)
+
+warm_on_startup()
@@ -106,3 +106,22 @@ LOGIN_URL = '/accounts/login/'
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# POS — checkout stock locks: waits above this (ms) are logged as hot SKUs
+POS_LOCK_WAIT_WARN_MS = 50
+
+# POS — cart storage backend (apps.sales.cart): Session, Redis or Memory
+POS_CART_STORE = {
+    'BACKEND': 'apps.sales.cart.SessionCartStore',
+    'OPTIONS': {},
+}
+
+# POS — preload the per-tenant barcode → product map when the WSGI/ASGI app starts
+POS_BARCODE_WARM_ON_STARTUP = True
+
+# Tenant resolution cache in TenantMiddleware: TTL (seconds) and max cached (host, header) keys
+POS_TENANT_CACHE_TTL = 60
+POS_TENANT_CACHE_MAX_ENTRIES = 1024
+
+# Dashboard — TTL (seconds) of cached KPI blocks; checkout/void also invalidate them
+POS_DASHBOARD_CACHE_TTL = 60
@@ -32,3 +32,21 @@ STORAGES = {
         "BACKEND": "whitenoise.storage.CompressedStaticFilesStorage",
     },
 }
+
+# Carts in Redis (docker-compose `redis` service): per-line HINCRBY instead of
+# rewriting the PostgreSQL session row on every click
+POS_CART_STORE = {
+    'BACKEND': 'apps.sales.cart.RedisCartStore',
+    'OPTIONS': {
+        'url': os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+        'ttl': 60 * 60 * 12,
+    },
+}
+
+# Shared cache (Redis): cross-process invalidation of the in-memory POS indexes
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+    }
+}
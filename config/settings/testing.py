@@ -11,3 +11,8 @@ DATABASES = {
 }
 
 PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+POS_CART_STORE = {
+    'BACKEND': 'apps.sales.cart.MemoryCartStore',
+    'OPTIONS': {'max_carts': 100, 'ttl': 60 * 60},
+}
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.production')
 
 application = get_wsgi_application()
+
+from apps.sales.barcodes import warm_on_startup  # noqa: E402  (needs apps loaded)
+
+warm_on_startup()